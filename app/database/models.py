@@ -1,3 +1,4 @@
+from sqlalchemy import Column, Integer, String, Text
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -11,4 +12,15 @@ def to_dict(obj):
         if (val := getattr(obj, field))
     }
 
-# TODO: Define models here
+
+class PromptHistory(Base):
+    """
+    Finished prompts of the running server, see app.history_store.HistoryStore.
+    """
+    __tablename__ = "prompt_history"
+
+    # Insertion order, used for paging through the history
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    prompt_id = Column(String, nullable=False, unique=True)
+    # JSON encoded history entry
+    data = Column(Text, nullable=False)
@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import copy
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+
+class HistoryStore:
+    """
+    History of finished prompts.
+
+    Every entry is written to the prompt_history table of the database and only the most recent hot_size entries are
+    kept in memory, older entries are loaded back from the database when they are requested. When the database isn't
+    available (missing dependencies, in-memory database) all entries stay in memory like before.
+    The table only holds the history of the running server, it is cleared the first time the store is used.
+    """
+    def __init__(self, max_size, hot_size=256, session_factory=None):
+        self.max_size = max_size
+        self.hot_size = hot_size
+        self.session_factory = session_factory
+        self.use_database = None
+        self.mutex = threading.RLock()
+        self.hot = OrderedDict()
+        self.count = 0
+
+    def _database(self):
+        if self.use_database is None:
+            if self.session_factory is None:
+                self.session_factory = get_database_session_factory()
+            self.use_database = False
+            if self.session_factory is not None:
+                try:
+                    from app.database.models import PromptHistory
+                    with self.session_factory() as session:
+                        session.query(PromptHistory).delete()
+                        session.commit()
+                    self.use_database = True
+                except Exception as e:
+                    logging.warning(f"Prompt history is kept in memory, the database can't be used: {e}")
+        return self.use_database
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, prompt_id):
+        with self.mutex:
+            if prompt_id in self.hot:
+                return True
+            if not self._database():
+                return False
+            from app.database.models import PromptHistory
+            with self.session_factory() as session:
+                return session.query(PromptHistory.id).filter_by(prompt_id=prompt_id).first() is not None
+
+    def add(self, prompt_id, entry):
+        with self.mutex:
+            self.delete(prompt_id)
+            if self._database():
+                from app.database.models import PromptHistory
+                # Same as what /history would send, values that aren't JSON can't be returned by it anyway
+                data = json.dumps(entry, default=str)
+                with self.session_factory() as session:
+                    session.add(PromptHistory(prompt_id=prompt_id, data=data))
+                    if self.count >= self.max_size:
+                        oldest = session.query(PromptHistory.id).order_by(PromptHistory.id).limit(self.count - self.max_size + 1)
+                        session.query(PromptHistory).filter(PromptHistory.id.in_(oldest.scalar_subquery())).delete(synchronize_session=False)
+                        self.count = self.max_size - 1
+                    session.commit()
+                hot_size = self.hot_size
+            else:
+                if self.count >= self.max_size:
+                    self.hot.popitem(last=False)
+                    self.count -= 1
+                hot_size = self.max_size
+
+            self.hot[prompt_id] = entry
+            self.count += 1
+            while len(self.hot) > hot_size:
+                self.hot.popitem(last=False)
+
+    def get(self, prompt_id):
+        """Returns a copy of the entry of prompt_id, or None."""
+        with self.mutex:
+            entry = self.hot.get(prompt_id)
+            if entry is not None:
+                return copy.deepcopy(entry)
+            if not self._database():
+                return None
+            from app.database.models import PromptHistory
+            with self.session_factory() as session:
+                row = session.query(PromptHistory.data).filter_by(prompt_id=prompt_id).first()
+            if row is None:
+                return None
+            return json.loads(row.data)
+
+    def get_range(self, offset, max_items=None):
+        """
+        Returns (prompt_id, entry) pairs in the order they were added, starting at position offset.
+        Entries that come from memory are shared and must not be modified.
+        """
+        with self.mutex:
+            offset = max(offset, 0)
+            end = self.count if max_items is None else min(self.count, offset + max_items)
+            if offset >= end:
+                return []
+            hot_start = self.count - len(self.hot)
+            if offset >= hot_start:
+                # Entries are moved to the end when they are replaced, so the hot window is always the newest entries
+                hot_items = list(self.hot.items())
+                return hot_items[offset - hot_start:end - hot_start]
+
+            from app.database.models import PromptHistory
+            with self.session_factory() as session:
+                rows = session.query(PromptHistory.prompt_id, PromptHistory.data).order_by(PromptHistory.id).offset(offset).limit(end - offset).all()
+            return [(row.prompt_id, self.hot.get(row.prompt_id) or json.loads(row.data)) for row in rows]
+
+    def delete(self, prompt_id):
+        with self.mutex:
+            deleted = self.hot.pop(prompt_id, None) is not None
+            if self._database():
+                from app.database.models import PromptHistory
+                with self.session_factory() as session:
+                    deleted = session.query(PromptHistory).filter_by(prompt_id=prompt_id).delete() > 0
+                    session.commit()
+            if deleted:
+                self.count -= 1
+
+    def clear(self):
+        with self.mutex:
+            self.hot.clear()
+            self.count = 0
+            if self._database():
+                from app.database.models import PromptHistory
+                with self.session_factory() as session:
+                    session.query(PromptHistory).delete()
+                    session.commit()
+
+
+def get_database_session_factory():
+    try:
+        from app.database import db
+        if not db.can_create_session() or db.get_db_path() == ":memory:":
+            # Every thread gets its own in-memory database, the worker and the server wouldn't see the same history
+            return None
+        return db.create_session
+    except Exception:
+        return None
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import json
+import logging
+import traceback
+import uuid
+
+import folder_paths
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Whether an If-None-Match header matches etag, with the weak comparison HTTP uses for it: W/ prefixes are ignored and
+    the header can be a comma separated list of tags or "*".
+    """
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+class NodeInfoEntry:
+    def __init__(self, class_def, info, encoded, dependencies, version):
+        self.class_def = class_def
+        self.info = info
+        # "name": info pair of the /object_info response
+        self.encoded = encoded
+        self.dependencies = dependencies
+        self.version = version
+
+
+class ObjectInfoCache:
+    """
+    Keeps the /object_info data of every node between requests.
+
+    While the info of a node is generated, the model folders and directories its INPUT_TYPES looks at through
+    folder_paths are recorded. The info is only generated again when one of them changed, when the node class was
+    replaced, or when generating it failed before. Nodes that list files without going through folder_paths are
+    considered static.
+    Every change bumps the version, which is used as the ETag of the response and to send clients only the nodes
+    that changed since the version they have.
+    """
+    def __init__(self, node_info):
+        self.node_info = node_info
+        # Unique per server run so versions from a previous run are never mistaken for current ones
+        self.run_id = uuid.uuid4().hex[:8]
+        self.version = 0
+        self.entries: dict[str, NodeInfoEntry] = {}
+        # node_class -> version it was removed in
+        self.removed: dict[str, int] = {}
+        self.body = None
+
+    @property
+    def etag(self):
+        return "{}-{}".format(self.run_id, self.version)
+
+    def parse_etag(self, etag):
+        """Returns the version of an ETag from this run, or None."""
+        if etag is None:
+            return None
+        etag = etag.strip()
+        if etag.startswith("W/"):
+            etag = etag[2:]
+        run_id, _, version = etag.strip('"').rpartition("-")
+        if run_id != self.run_id:
+            return None
+        try:
+            return int(version)
+        except ValueError:
+            return None
+
+    def _generate(self, node_class):
+        with folder_paths.record_dependencies() as dependencies:
+            try:
+                info = self.node_info(node_class)
+                encoded = json.dumps(node_class) + ": " + json.dumps(info)
+            except Exception:
+                logging.error(f"[ERROR] An error occurred while retrieving information for the '{node_class}' node.")
+                logging.error(traceback.format_exc())
+                return None
+        return info, encoded, dependencies
+
+    def _remove(self, node_class):
+        del self.entries[node_class]
+        self.version += 1
+        self.removed[node_class] = self.version
+
+    def _update_node(self, node_class, class_def, checked):
+        """Returns True if the info of the node changed."""
+        entry = self.entries.get(node_class)
+        if entry is not None and entry.class_def is class_def and not folder_paths.dependencies_changed(entry.dependencies, checked):
+            return False
+
+        result = self._generate(node_class)
+        if result is None:
+            # Not kept so it gets retried by the next request
+            if entry is not None:
+                self._remove(node_class)
+                return True
+            return False
+        info, encoded, dependencies = result
+        if entry is not None and entry.info == info:
+            entry.class_def = class_def
+            entry.dependencies = dependencies
+            return False
+        self.version += 1
+        self.entries[node_class] = NodeInfoEntry(class_def, info, encoded, dependencies, self.version)
+        self.removed.pop(node_class, None)
+        return True
+
+    def refresh(self, node_classes):
+        """Brings every node up to date with node_classes (nodes.NODE_CLASS_MAPPINGS)."""
+        changed = False
+        checked = {}
+        with folder_paths.cache_helper:
+            for node_class, class_def in node_classes.items():
+                if self._update_node(node_class, class_def, checked):
+                    changed = True
+        for node_class in [x for x in self.entries if x not in node_classes]:
+            self._remove(node_class)
+            changed = True
+        if changed:
+            self.body = None
+
+    def get_body(self, node_classes):
+        """Returns the encoded /object_info response."""
+        self.refresh(node_classes)
+        if self.body is None:
+            self.body = "{" + ", ".join(self.entries[x].encoded for x in node_classes if x in self.entries) + "}"
+        return self.body
+
+    def get_node(self, node_class, node_classes):
+        if node_class not in node_classes:
+            return None
+        with folder_paths.cache_helper:
+            if self._update_node(node_class, node_classes[node_class], {}):
+                self.body = None
+        entry = self.entries.get(node_class)
+        return None if entry is None else entry.info
+
+    def get_diff(self, since, node_classes):
+        """
+        Returns the nodes that changed after version since and the ones that were removed. When since isn't a
+        version of this run every node is returned and full is set.
+        """
+        self.refresh(node_classes)
+        if since is None or since > self.version:
+            nodes = {x: self.entries[x].info for x in node_classes if x in self.entries}
+            return {"version": self.etag, "full": True, "nodes": nodes, "removed": []}
+        return {
+            "version": self.etag,
+            "full": False,
+            "nodes": {x: e.info for x, e in self.entries.items() if e.version > since},
+            "removed": [x for x, version in self.removed.items() if version > since],
+        }
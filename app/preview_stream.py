@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import struct
+from io import BytesIO
+
+import aiohttp
+from PIL import Image, ImageOps
+
+from protocol import BinaryEventTypes
+
+# JPEG quality used for a client, lowered one step at a time while its socket can't keep up
+QUALITY_LEVELS = (95, 85, 75, 60)
+# Average time a send may take before the client is considered backlogged, or fast enough to raise the quality again
+SLOW_SEND_TIME = 0.1
+FAST_SEND_TIME = 0.02
+# The wait between two frames of a client is this many times its average send time
+BACKLOG_INTERVAL_FACTOR = 4.0
+MAX_FRAME_INTERVAL = 1.0
+
+
+def resize_preview(image_data):
+    image_type, image, max_size = image_data[0], image_data[1], image_data[2]
+    if max_size is not None:
+        if hasattr(Image, 'Resampling'):
+            resampling = Image.Resampling.BILINEAR
+        else:
+            resampling = Image.Resampling.LANCZOS
+
+        image = ImageOps.contain(image, (max_size, max_size), resampling)
+    return image_type, image
+
+
+def encode_preview_image(image_data, quality=95):
+    """PREVIEW_IMAGE payload of a (image_type, PIL image, max_size) preview."""
+    image_type, image = resize_preview(image_data)
+    type_num = 1
+    if image_type == "JPEG":
+        type_num = 1
+    elif image_type == "PNG":
+        type_num = 2
+
+    bytesIO = BytesIO()
+    header = struct.pack(">I", type_num)
+    bytesIO.write(header)
+    image.save(bytesIO, format=image_type, quality=quality, compress_level=1)
+    return bytesIO.getvalue()
+
+
+def encode_preview_image_with_metadata(image_data, metadata=None, quality=95):
+    """PREVIEW_IMAGE_WITH_METADATA payload of a (image_type, PIL image, max_size) preview."""
+    image_type, image = resize_preview(image_data)
+    mimetype = "image/png" if image_type == "PNG" else "image/jpeg"
+
+    # Prepare metadata
+    if metadata is None:
+        metadata = {}
+    metadata["image_type"] = mimetype
+
+    # Serialize metadata as JSON
+    metadata_json = json.dumps(metadata).encode('utf-8')
+    metadata_length = len(metadata_json)
+
+    # Prepare image data
+    bytesIO = BytesIO()
+    image.save(bytesIO, format=image_type, quality=quality, compress_level=1)
+    image_bytes = bytesIO.getvalue()
+
+    # Combine metadata and image
+    combined_data = bytearray()
+    combined_data.extend(struct.pack(">I", metadata_length))
+    combined_data.extend(metadata_json)
+    combined_data.extend(image_bytes)
+    return combined_data
+
+
+class PreviewFrame:
+    """
+    One preview image sent to one or more clients. It is encoded once per quality level in a worker thread, clients
+    that get the same frame at the same quality share the encoded message.
+    """
+    def __init__(self, event, data, encode_bytes):
+        self.event = event
+        self.data = data
+        self.encode_bytes = encode_bytes
+        # quality -> future of the encoded message
+        self.encoded: dict[int, asyncio.Future] = {}
+
+    def _encode(self, quality):
+        if self.event == BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA:
+            image_data, metadata = self.data
+            # Copied since several encodes may add the image type at the same time
+            payload = encode_preview_image_with_metadata(image_data, dict(metadata or {}), quality=quality)
+        else:
+            payload = encode_preview_image(self.data, quality=quality)
+            # The unencoded preview is sent as an encoded PREVIEW_IMAGE
+            return self.encode_bytes(BinaryEventTypes.PREVIEW_IMAGE, payload)
+        return self.encode_bytes(self.event, payload)
+
+    async def encode(self, quality):
+        future = self.encoded.get(quality)
+        if future is None:
+            future = asyncio.ensure_future(asyncio.to_thread(self._encode, quality))
+            self.encoded[quality] = future
+        return await future
+
+
+class ClientPreviewState:
+    def __init__(self):
+        # Only the latest frame is kept, a newer one replaces a frame that wasn't sent yet
+        self.frame: PreviewFrame | None = None
+        # Bumped when the pending frames are dropped, a frame that was being encoded at that point isn't sent either
+        self.generation = 0
+        self.ready = asyncio.Event()
+        self.task: asyncio.Task | None = None
+        self.send_time = 0.0
+        self.level = 0
+        self.next_send = 0.0
+
+
+class PreviewStream:
+    """
+    Sends sampling previews to the websocket clients without letting them queue up.
+
+    Every client has its own sender task that only holds the latest preview submitted for it, older ones that weren't
+    sent yet are dropped. Frames are encoded off the event loop and once per quality, so a preview broadcast to all
+    clients is only encoded once. The time each send takes reflects the backlog of the socket: a client whose sends
+    slow down gets fewer frames and a lower JPEG quality until it catches up.
+    """
+    def __init__(self, server, max_fps=30.0):
+        self.server = server
+        self.min_interval = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.clients: dict[str, ClientPreviewState] = {}
+
+    def submit(self, event, data, sid=None):
+        """Queues the preview for sid, or for all connected clients if sid is None."""
+        frame = PreviewFrame(event, data, self.server.encode_bytes)
+        sids = list(self.server.sockets) if sid is None else [sid]
+        for sid in sids:
+            if sid not in self.server.sockets:
+                continue
+            state = self.clients.get(sid)
+            if state is None:
+                state = ClientPreviewState()
+                self.clients[sid] = state
+            if state.task is None or state.task.done():
+                state.task = asyncio.create_task(self._run(sid, state))
+            state.frame = frame
+            state.ready.set()
+
+    def drop(self, sid=None):
+        """
+        Drops the frames of sid, or of all clients if sid is None, that weren't sent yet. Called when a node starts or
+        finishes: legacy previews don't say which node they belong to, a late one would show up on the next node.
+        """
+        states = list(self.clients.values()) if sid is None else [self.clients.get(sid)]
+        for state in states:
+            if state is not None:
+                state.frame = None
+                state.generation += 1
+
+    def remove(self, sid):
+        state = self.clients.pop(sid, None)
+        if state is not None and state.task is not None:
+            state.task.cancel()
+
+    def _adapt(self, state, elapsed, now):
+        state.send_time = elapsed if state.send_time == 0.0 else 0.7 * state.send_time + 0.3 * elapsed
+        if state.send_time > SLOW_SEND_TIME and state.level < len(QUALITY_LEVELS) - 1:
+            state.level += 1
+        elif state.send_time < FAST_SEND_TIME and state.level > 0:
+            state.level -= 1
+        interval = min(max(self.min_interval, state.send_time * BACKLOG_INTERVAL_FACTOR), MAX_FRAME_INTERVAL)
+        state.next_send = now + interval
+
+    async def _run(self, sid, state):
+        loop = asyncio.get_running_loop()
+        while True:
+            await state.ready.wait()
+            state.ready.clear()
+
+            # Frames submitted while waiting replace the one that was there
+            delay = state.next_send - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            frame = state.frame
+            state.frame = None
+            if frame is None:
+                continue
+            generation = state.generation
+
+            try:
+                message = await frame.encode(QUALITY_LEVELS[state.level])
+            except Exception as e:
+                logging.warning("Failed to encode the preview image: {}".format(e))
+                continue
+            if state.generation != generation:
+                continue
+
+            ws = self.server.sockets.get(sid)
+            if ws is None:
+                if self.clients.get(sid) is state:
+                    del self.clients[sid]
+                return
+
+            start = loop.time()
+            try:
+                await ws.send_bytes(message)
+            except (aiohttp.ClientError, aiohttp.ClientPayloadError, ConnectionResetError, BrokenPipeError, ConnectionError) as err:
+                logging.warning("send error: {}".format(err))
+            now = loop.time()
+            self._adapt(state, now - start, now)
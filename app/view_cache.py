@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+import folder_paths
+
+
+def render_derivative(file, target, kind, image_format="webp", quality=90, channel=""):
+    """
+    Writes the derivative of the image file that /view returns to target.
+    kind is "preview" for a resized format conversion, "rgb" or "a" for the channel extracts.
+    """
+    with Image.open(file) as img:
+        if kind == "preview":
+            if image_format in ['jpeg'] or channel == 'rgb':
+                img = img.convert("RGB")
+            img.save(target, format=image_format, quality=quality)
+        elif kind == "rgb":
+            if img.mode == "RGBA":
+                r, g, b, a = img.split()
+                new_img = Image.merge('RGB', (r, g, b))
+            else:
+                new_img = img.convert("RGB")
+            new_img.save(target, format='PNG')
+        else:
+            if img.mode == "RGBA":
+                _, _, _, a = img.split()
+            else:
+                a = Image.new('L', img.size, 255)
+
+            # alpha img
+            alpha_img = Image.new('RGBA', img.size)
+            alpha_img.putalpha(a)
+            alpha_img.save(target, format='PNG')
+
+
+class ViewCache:
+    """
+    Files of the previews and channel extracts returned by /view.
+
+    Derivatives are keyed by the path, mtime and size of the source image and the requested format, quality and
+    channel, so a changed source is rendered again. They are rendered on a thread pool, requests for a derivative that
+    is being rendered wait for the same render. The files are kept in the temp directory and the least recently used
+    ones are removed when they take more than max_size bytes.
+    The mtime of a derivative is set to the one of its source, which keeps the ETag aiohttp derives from it stable
+    when a derivative is rendered again after it was removed.
+    """
+    def __init__(self, max_size, max_workers=None):
+        self.max_size = max_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or min(4, os.cpu_count() or 1), thread_name_prefix="view_cache")
+        self.mutex = threading.Lock()
+        # file name -> size in bytes, least recently used first
+        self.entries: OrderedDict[str, int] = OrderedDict()
+        self.total_size = 0
+        self.pending: dict[str, asyncio.Future] = {}
+
+    @property
+    def directory(self):
+        # Resolved every time since the temp directory can be changed after the server was created
+        return os.path.join(folder_paths.get_temp_directory(), "view_cache")
+
+    def key(self, file, stat, kind, image_format, quality, channel):
+        ext = image_format if kind == "preview" else "png"
+        source = "\0".join(str(x) for x in (os.path.abspath(file), stat.st_mtime_ns, stat.st_size, kind, image_format, quality, channel))
+        return "{}.{}".format(hashlib.sha256(source.encode("utf-8")).hexdigest()[:40], ext)
+
+    def _lookup(self, name):
+        path = os.path.join(self.directory, name)
+        with self.mutex:
+            if name in self.entries:
+                if os.path.isfile(path):
+                    self.entries.move_to_end(name)
+                    return path
+                self.total_size -= self.entries.pop(name)
+        return None
+
+    def _render(self, file, stat, name, kind, image_format, quality, channel):
+        directory = self.directory
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        temp_path = "{}.{}.tmp".format(path, uuid.uuid4().hex[:8])
+        try:
+            with open(temp_path, "wb") as f:
+                render_derivative(file, f, kind, image_format=image_format, quality=quality, channel=channel)
+            os.utime(temp_path, ns=(stat.st_mtime_ns, stat.st_mtime_ns))
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        size = os.path.getsize(path)
+        removed = []
+        with self.mutex:
+            self.entries[name] = size
+            self.total_size += size
+            while self.total_size > self.max_size and len(self.entries) > 1:
+                old_name, old_size = self.entries.popitem(last=False)
+                self.total_size -= old_size
+                removed.append(old_name)
+
+        for old_name in removed:
+            try:
+                os.remove(os.path.join(directory, old_name))
+            except OSError as e:
+                logging.debug("Failed to remove the cached view file {}: {}".format(old_name, e))
+        return path
+
+    async def get(self, file, kind, image_format="webp", quality=90, channel=""):
+        """Path of the derivative of file, rendered if it isn't cached yet."""
+        stat = os.stat(file)
+        name = self.key(file, stat, kind, image_format, quality, channel)
+        path = self._lookup(name)
+        if path is not None:
+            return path
+
+        future = self.pending.get(name)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, self._render, file, stat, name, kind, image_format, quality, channel)
+            self.pending[name] = future
+            future.add_done_callback(lambda _: self.pending.pop(name, None))
+        return await asyncio.shield(future)
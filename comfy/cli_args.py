@@ -100,12 +100,23 @@ class LatentPreviewMethod(enum.Enum):
 parser.add_argument("--preview-method", type=LatentPreviewMethod, default=LatentPreviewMethod.NoPreviews, help="Default preview method for sampler nodes.", action=EnumAction)
 
 parser.add_argument("--preview-size", type=int, default=512, help="Sets the maximum preview size for sampler nodes.")
+parser.add_argument("--preview-max-fps", type=float, default=30.0, help="Maximum number of sampling previews sent to a client per second. Fewer are sent to clients whose connection can't keep up, 0 for no limit.")
+parser.add_argument("--view-cache-size", type=float, default=1024, metavar="MB", help="Maximum size of the previews and channel extracts of /view that are kept in the temp directory to be served again. The least recently used ones are removed past this size.")
 
 cache_group = parser.add_mutually_exclusive_group()
 cache_group.add_argument("--cache-classic", action="store_true", help="Use the old style (aggressive) caching.")
 cache_group.add_argument("--cache-lru", type=int, default=0, help="Use LRU caching with a maximum of N node results cached. May use more RAM/VRAM.")
 cache_group.add_argument("--cache-none", action="store_true", help="Reduced RAM/VRAM usage at the expense of executing every node for each run.")
 cache_group.add_argument("--cache-ram", nargs='?', const=4.0, type=float, default=0, help="Use RAM pressure caching with the specified headroom threshold. If available RAM drops below the threhold the cache remove large items to free RAM. Default 4GB")
+parser.add_argument("--cache-disk", type=str, default=None, metavar="PATH", help="Also keep the outputs of nodes that support it (text encodes, VAE encodes, ...) in this directory so they survive restarts. The directory can be shared by several ComfyUI instances.")
+parser.add_argument("--cache-disk-size", type=float, default=10.0, metavar="GB", help="Maximum size of the --cache-disk directory in GB. The least recently used entries are removed past this size.")
+
+parser.add_argument("--index-model-folders", nargs='?', const="auto", type=str, default=None, choices=["auto", "inotify", "poll"], help="Keep an in-memory index of the model folders that is updated when files change instead of checking every folder each time a list of models is needed. auto uses inotify when available and polls otherwise. inotify doesn't see changes made by other machines on network filesystems, use poll for those.")
+parser.add_argument("--index-poll-interval", type=float, default=5.0, metavar="SECONDS", help="How often the model folders are checked for changes when --index-model-folders polls them.")
+
+parser.add_argument("--parallel-execution", nargs='?', const=4, type=int, default=0, metavar="NUM_THREADS", help="Execute independent branches of a workflow concurrently. Nodes that only work on images, masks and primitives run on a pool of NUM_THREADS threads (default 4) while nodes that use models are serialized on the device.")
+parser.add_argument("--prompt-workers", type=int, default=1, metavar="NUM_WORKERS", help="Execute up to NUM_WORKERS prompts from the queue at the same time. Each worker gets its own GPU, NUM_WORKERS is capped to the number of visible GPUs since workers sharing one would unload each other's models. With --cpu all workers share the cpu. Each worker has its own cache, queued prompts are preferably picked by the worker that last used the same models.")
+parser.add_argument("--prefetch-models", nargs='?', const=2, type=int, default=0, metavar="NUM_PROMPTS", help="Read the model files of the next NUM_PROMPTS queued prompts (default 2) into the OS file cache while the current prompt executes, so their loaders don't wait on the disk.")
 
 attn_group = parser.add_mutually_exclusive_group()
 attn_group.add_argument("--use-split-cross-attention", action="store_true", help="Use the split cross attention optimization. Ignored when xformers is used.")
@@ -153,6 +164,10 @@ parser.add_argument("--disable-pinned-memory", action="store_true", help="Disabl
 
 parser.add_argument("--mmap-torch-files", action="store_true", help="Use mmap when loading ckpt/pt files.")
 parser.add_argument("--disable-mmap", action="store_true", help="Don't use mmap when loading safetensors.")
+parser.add_argument("--parallel-load", nargs='?', const=8, type=int, default=0, metavar="NUM_THREADS", help="Load safetensors files by reading their tensors on NUM_THREADS threads (default 8) straight into memory instead of mmaping them. Unlike --disable-mmap it doesn't need a second copy. Whether it loads faster depends on the disk and the page cache, measure with tests/benchmarks/safetensors_load.py.")
+parser.add_argument("--runtime-lora", action="store_true", help="Apply regular LoRAs as low rank side branches of the linear and conv layers when the model runs instead of merging them into the weights. Switching LoRAs or their strengths then doesn't reload the model, at the cost of a bit of extra compute per step. LoRA types that can't run as a branch (LoHa, LoKr, DoRA, ...) are still merged.")
+parser.add_argument("--lowvram-patch-cache-size", type=float, default=0, metavar="MB", help="Maximum size of the LoRA patched weights of offloaded layers that are kept in RAM so they don't have to be patched again every step. Disabled by default.")
+parser.add_argument("--text-encoder-cache-size", type=float, default=256, metavar="MB", help="Maximum size of the text encoder outputs of prompt chunks that are kept to be reused by other prompts containing the same chunks. 0 disables it.")
 
 parser.add_argument("--dont-print-server", action="store_true", help="Don't print server output.")
 parser.add_argument("--quick-test-for-ci", action="store_true", help="Quick test for CI.")
@@ -212,6 +227,8 @@ parser.add_argument(
     default="https://api.comfy.org",
     help="Set the base URL for the ComfyUI API.  (default: https://api.comfy.org)",
 )
+parser.add_argument("--api-nodes-max-connections", type=int, default=100, help="Maximum number of open connections API nodes share for their requests, uploads and downloads. Idle connections are kept open and reused.")
+parser.add_argument("--api-nodes-max-connections-per-host", type=int, default=0, help="Maximum number of open API node connections to a single host, 0 for no limit.")
 
 database_default_path = os.path.abspath(
     os.path.join(os.path.dirname(__file__), "..", "user", "comfyui.db")
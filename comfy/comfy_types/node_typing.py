@@ -276,6 +276,12 @@ class ComfyNodeABC(ABC):
 
     Comfy Docs: https://docs.comfy.org/custom-nodes/backend/lists#list-processing
     """
+    PERSISTENT_CACHE: bool
+    """Allows the outputs of this node to be stored in the persistent disk cache (``--cache-disk``), so they survive restarts.
+
+    Only set this if the outputs are fully determined by the node inputs and only contain tensors, primitives, lists, tuples and dicts with string keys.
+    Outputs containing anything else are never written to disk.
+    """
     OUTPUT_IS_LIST: tuple[bool, ...]
     """A tuple indicating which node outputs are lists, but will be connected to nodes that expect individual items.
 
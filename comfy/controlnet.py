@@ -22,6 +22,8 @@ from enum import Enum
 import math
 import os
 import logging
+import weakref
+from collections import OrderedDict
 import comfy.utils
 import comfy.model_management
 import comfy.model_detection
@@ -60,6 +62,68 @@ def broadcast_image_to(tensor, target_batch_size, batched_number):
     else:
         return torch.cat([tensor] * batched_number, dim=0)
 
+def object_refs(objects):
+    return [weakref.ref(o) if o is not None else None for o in objects]
+
+def same_objects(refs, objects):
+    if len(refs) != len(objects):
+        return False
+    for r, o in zip(refs, objects):
+        if (r() if r is not None else None) is not o:
+            return False
+    return True
+
+class HintCache:
+    """
+    Processed ControlNet hints (upscaled, preprocessed and VAE encoded), kept across prompts.
+
+    An entry is only used while the objects it was made from (hint image, VAE, ...) are still alive and are the same
+    objects, so a new image that got the id of a freed one is never mistaken for it.
+    """
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key, sources):
+        entry = self.entries.get(key, None)
+        if entry is None:
+            return None
+        if not same_objects(entry[0], sources):
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, sources, hint):
+        self.entries[key] = (object_refs(sources), hint)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+HINT_CACHE = HintCache()
+
+def hint_source(image):
+    """The tensor image is a view of, or image itself. Views like image.movedim(-1, 1) are new objects every run."""
+    return image if image._base is None else image._base
+
+def hint_layout(image):
+    return (image._version, tuple(image.shape), image.stride(), image.storage_offset(), image.dtype)
+
+# Mask added to the extra concat of ControlNets with concat_mask, shared so their hints stay cacheable
+CONCAT_MASK = torch.tensor([[[[1.0]]]])
+
+# The ControlNets stacked on a cond run one after another on the same inputs every step, the inputs of their control
+# models are converted for the first one and reused by the others: name -> (source refs, converted input)
+SHARED_INPUTS = {}
+
+def shared_input(key, sources, convert):
+    entry = SHARED_INPUTS.get(key, None)
+    if entry is not None and same_objects(entry[0], sources):
+        return entry[1]
+    out = convert()
+    SHARED_INPUTS[key] = (object_refs(sources), out)
+    return out
+
 class StrengthType(Enum):
     CONSTANT = 1
     LINEAR_UP = 2
@@ -96,7 +160,7 @@ class ControlBase:
             self.vae = vae
         self.extra_concat_orig = extra_concat.copy()
         if self.concat_mask and len(self.extra_concat_orig) == 0:
-            self.extra_concat_orig.append(torch.tensor([[[[1.0]]]]))
+            self.extra_concat_orig.append(CONCAT_MASK)
         return self
 
     def pre_run(self, model, percent_to_timestep_function):
@@ -241,42 +305,65 @@ class ControlNet(ControlBase):
             else:
                 if self.latent_format is not None:
                     raise ValueError("This Controlnet needs a VAE but none was provided, please use a ControlNetApply node with a VAE input and connect it.")
-            self.cond_hint = comfy.utils.common_upscale(self.cond_hint_original, x_noisy.shape[-1] * compression_ratio, x_noisy.shape[-2] * compression_ratio, self.upscale_algorithm, "center")
-            self.cond_hint = self.preprocess_image(self.cond_hint)
-            if self.vae is not None:
-                loaded_models = comfy.model_management.loaded_models(only_currently_used=True)
-                self.cond_hint = self.vae.encode(self.cond_hint.movedim(1, -1))
-                comfy.model_management.load_models_gpu(loaded_models)
-            if self.latent_format is not None:
-                self.cond_hint = self.latent_format.process_in(self.cond_hint)
-            if len(self.extra_concat_orig) > 0:
-                to_concat = []
-                for c in self.extra_concat_orig:
-                    c = c.to(self.cond_hint.device)
-                    c = comfy.utils.common_upscale(c, self.cond_hint.shape[-1], self.cond_hint.shape[-2], self.upscale_algorithm, "center")
-                    if c.ndim < self.cond_hint.ndim:
-                        c = c.unsqueeze(2)
-                        c = comfy.utils.repeat_to_batch_size(c, self.cond_hint.shape[2], dim=2)
-                    to_concat.append(comfy.utils.repeat_to_batch_size(c, self.cond_hint.shape[0]))
-                self.cond_hint = torch.cat([self.cond_hint] + to_concat, dim=1)
-
-            self.cond_hint = self.cond_hint.to(device=x_noisy.device, dtype=dtype)
+
+            width = x_noisy.shape[-1] * compression_ratio
+            height = x_noisy.shape[-2] * compression_ratio
+            key, sources = self.hint_cache_key(width, height)
+            cond_hint = HINT_CACHE.get(key, sources)
+            if cond_hint is None:
+                cond_hint = self.process_cond_hint(width, height)
+                HINT_CACHE.put(key, sources, cond_hint)
+            self.cond_hint = cond_hint.to(device=x_noisy.device, dtype=dtype)
         if x_noisy.shape[0] != self.cond_hint.shape[0]:
             self.cond_hint = broadcast_image_to(self.cond_hint, x_noisy.shape[0], batched_number)
 
+        device = x_noisy.device
         context = cond.get('crossattn_controlnet', cond['c_crossattn'])
         extra = self.extra_args.copy()
         for c in self.extra_conds:
             temp = cond.get(c, None)
             if temp is not None:
-                extra[c] = comfy.model_base.convert_tensor(temp, dtype, x_noisy.device)
+                extra[c] = shared_input((c, device, dtype), [temp], lambda: comfy.model_base.convert_tensor(temp, dtype, device))
 
-        timestep = self.model_sampling_current.timestep(t)
-        x_noisy = self.model_sampling_current.calculate_input(t, x_noisy)
+        model_sampling = self.model_sampling_current
+        timestep = shared_input(("timestep", device, dtype), [t, model_sampling], lambda: model_sampling.timestep(t).to(dtype))
+        x_noisy = shared_input(("x", device, dtype), [x_noisy, t, model_sampling], lambda: model_sampling.calculate_input(t, x_noisy).to(dtype))
+        context = shared_input(("context", device, dtype), [context], lambda: comfy.model_management.cast_to_device(context, device, dtype))
 
-        control = self.control_model(x=x_noisy.to(dtype), hint=self.cond_hint, timesteps=timestep.to(dtype), context=comfy.model_management.cast_to_device(context, x_noisy.device, dtype), **extra)
+        control = self.control_model(x=x_noisy, hint=self.cond_hint, timesteps=timestep, context=context, **extra)
         return self.control_merge(control, control_prev, output_dtype=None)
 
+    def hint_cache_key(self, width, height):
+        """
+        Key and source objects of the processed hint in HINT_CACHE. The apply nodes pass a new view of their IMAGE every
+        run, so hints are keyed on the tensors the views were made from and on the layout of the views.
+        """
+        hints = [self.cond_hint_original] + self.extra_concat_orig
+        sources = [hint_source(h) for h in hints] + [self.vae, self.preprocess_image, self.latent_format]
+        key = tuple(id(o) for o in sources) + (tuple(hint_layout(h) for h in hints), width, height, self.upscale_algorithm)
+        return key, sources
+
+    def process_cond_hint(self, width, height):
+        cond_hint = comfy.utils.common_upscale(self.cond_hint_original, width, height, self.upscale_algorithm, "center")
+        cond_hint = self.preprocess_image(cond_hint)
+        if self.vae is not None:
+            loaded_models = comfy.model_management.loaded_models(only_currently_used=True)
+            cond_hint = self.vae.encode(cond_hint.movedim(1, -1))
+            comfy.model_management.load_models_gpu(loaded_models)
+        if self.latent_format is not None:
+            cond_hint = self.latent_format.process_in(cond_hint)
+        if len(self.extra_concat_orig) > 0:
+            to_concat = []
+            for c in self.extra_concat_orig:
+                c = c.to(cond_hint.device)
+                c = comfy.utils.common_upscale(c, cond_hint.shape[-1], cond_hint.shape[-2], self.upscale_algorithm, "center")
+                if c.ndim < cond_hint.ndim:
+                    c = c.unsqueeze(2)
+                    c = comfy.utils.repeat_to_batch_size(c, cond_hint.shape[2], dim=2)
+                to_concat.append(comfy.utils.repeat_to_batch_size(c, cond_hint.shape[0]))
+            cond_hint = torch.cat([cond_hint] + to_concat, dim=1)
+        return cond_hint
+
     def copy(self):
         c = ControlNet(None, global_average_pooling=self.global_average_pooling, load_device=self.load_device, manual_cast_dtype=self.manual_cast_dtype)
         c.control_model = self.control_model
@@ -295,6 +382,7 @@ class ControlNet(ControlBase):
 
     def cleanup(self):
         self.model_sampling_current = None
+        SHARED_INPUTS.clear()
         super().cleanup()
 
 class ControlLoraOps:
@@ -26,6 +26,9 @@ import importlib
 import platform
 import weakref
 import gc
+import functools
+import threading
+import contextvars
 
 class VRAMState(Enum):
     DISABLED = 0    #No vram present: no need to move models to vram
@@ -187,6 +190,39 @@ def get_torch_device():
         else:
             return torch.device(torch.cuda.current_device())
 
+def get_all_torch_devices():
+    """Every device prompt workers can run on, the default device comes first."""
+    default_device = get_torch_device()
+    if directml_enabled or cpu_state != CPUState.GPU:
+        return [default_device]
+    if is_intel_xpu():
+        count = torch.xpu.device_count()
+    elif is_ascend_npu():
+        count = torch.npu.device_count()
+    elif is_mlu():
+        count = torch.mlu.device_count()
+    else:
+        count = torch.cuda.device_count()
+    devices = [default_device]
+    for i in range(count):
+        device = torch.device(default_device.type, i)
+        if device != default_device:
+            devices.append(device)
+    return devices
+
+def set_torch_device(device):
+    """Make device the one returned by get_torch_device() for the calling thread."""
+    if device is None or not hasattr(device, 'type'):
+        return
+    if device.type == "cuda":
+        torch.cuda.set_device(device)
+    elif device.type == "xpu":
+        torch.xpu.set_device(device)
+    elif device.type == "npu":
+        torch.npu.set_device(device)
+    elif device.type == "mlu":
+        torch.mlu.set_device(device)
+
 def get_total_memory(dev=None, torch_total_too=False):
     global directml_enabled
     if dev is None:
@@ -447,6 +483,15 @@ except:
 
 
 current_loaded_models = []
+# Prompt workers load and unload models from their own threads, every change to current_loaded_models goes through this lock.
+models_mutex = threading.RLock()
+
+def models_locked(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with models_mutex:
+            return func(*args, **kwargs)
+    return wrapper
 
 def module_size(module):
     module_mem = 0
@@ -578,6 +623,7 @@ def extra_reserved_memory():
 def minimum_inference_memory():
     return (1024 * 1024 * 1024) * 0.8 + extra_reserved_memory()
 
+@models_locked
 def free_memory(memory_required, device, keep_loaded=[]):
     cleanup_models_gc()
     unloaded_model = []
@@ -615,6 +661,7 @@ def free_memory(memory_required, device, keep_loaded=[]):
                 soft_empty_cache()
     return unloaded_models
 
+@models_locked
 def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimum_memory_required=None, force_full_load=False):
     cleanup_models_gc()
     global vram_state
@@ -705,6 +752,7 @@ def load_models_gpu(models, memory_required=0, force_patch_weights=False, minimu
 def load_model_gpu(model):
     return load_models_gpu([model])
 
+@models_locked
 def loaded_models(only_currently_used=False):
     output = []
     for m in current_loaded_models:
@@ -716,6 +764,7 @@ def loaded_models(only_currently_used=False):
     return output
 
 
+@models_locked
 def cleanup_models_gc():
     do_gc = False
     for i in range(len(current_loaded_models)):
@@ -736,6 +785,7 @@ def cleanup_models_gc():
 
 
 
+@models_locked
 def cleanup_models():
     to_delete = []
     for i in range(len(current_loaded_models)):
@@ -1123,12 +1173,12 @@ if not args.disable_pinned_memory:
 
 PINNING_ALLOWED_TYPES = set(["Parameter", "QuantizedTensor"])
 
-def pin_memory(tensor):
+def pin_memory(tensor, allowed_types=PINNING_ALLOWED_TYPES):
     global TOTAL_PINNED_MEMORY
     if MAX_PINNED_MEMORY <= 0:
         return False
 
-    if type(tensor).__name__ not in PINNING_ALLOWED_TYPES:
+    if type(tensor).__name__ not in allowed_types:
         return False
 
     if not is_device_cpu(tensor.device):
@@ -1506,8 +1556,12 @@ def soft_empty_cache(force=False):
         torch.cuda.empty_cache()
         torch.cuda.ipc_collect()
 
-def unload_all_models():
-    free_memory(1e30, get_torch_device())
+@models_locked
+def unload_all_models(device=None):
+    """Unloads the models on device, or on every device if it's None."""
+    devices = get_all_torch_devices() if device is None else [device]
+    for device in devices:
+        free_memory(1e30, device)
 
 
 #TODO: might be cleaner to put this somewhere else
@@ -1519,22 +1573,45 @@ class InterruptProcessingException(Exception):
 interrupt_processing_mutex = threading.RLock()
 
 interrupt_processing = False
-def interrupt_current_processing(value=True):
+# Prompt workers run several prompts at once: interrupts target a prompt, the prompt that is executing is context local
+current_prompt_id = contextvars.ContextVar("current_prompt_id", default=None)
+interrupted_prompts = set()
+
+def set_current_prompt(prompt_id):
+    current_prompt_id.set(prompt_id)
+
+def interrupt_current_processing(value=True, prompt_id=None):
+    """
+    Interrupts prompt_id, or the prompt executing in the calling context if it is None. Outside of a prompt this sets
+    the global flag that interrupts whatever checks it first.
+    """
     global interrupt_processing
     global interrupt_processing_mutex
+    if prompt_id is None:
+        prompt_id = current_prompt_id.get()
     with interrupt_processing_mutex:
-        interrupt_processing = value
+        if prompt_id is None:
+            interrupt_processing = value
+        elif value:
+            interrupted_prompts.add(prompt_id)
+        else:
+            interrupted_prompts.discard(prompt_id)
+            interrupt_processing = False
 
 def processing_interrupted():
     global interrupt_processing
     global interrupt_processing_mutex
     with interrupt_processing_mutex:
-        return interrupt_processing
+        return interrupt_processing or current_prompt_id.get() in interrupted_prompts
 
 def throw_exception_if_processing_interrupted():
     global interrupt_processing
     global interrupt_processing_mutex
+    prompt_id = current_prompt_id.get()
     with interrupt_processing_mutex:
+        if prompt_id in interrupted_prompts:
+            interrupted_prompts.discard(prompt_id)
+            raise InterruptProcessingException()
         if interrupt_processing:
             interrupt_processing = False
             raise InterruptProcessingException()
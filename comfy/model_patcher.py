@@ -23,7 +23,9 @@ import copy
 import inspect
 import logging
 import math
+import threading
 import uuid
+import weakref
 from typing import Callable, Optional
 
 import torch
@@ -34,6 +36,8 @@ import comfy.lora
 import comfy.model_management
 import comfy.patcher_extension
 import comfy.utils
+import comfy.weight_adapter
+from comfy.cli_args import args
 from comfy.comfy_types import UnetWrapperFunction
 from comfy.patcher_extension import CallbacksMP, PatcherInjection, WrappersMP
 
@@ -120,16 +124,111 @@ def move_weight_functions(m, device):
         for f in m.bias_function:
             if hasattr(f, "move_to"):
                 memory += f.move_to(device=device)
+
+    for f in getattr(m, "lora_branches", []):
+        memory += f.move_to(device=device)
     return memory
 
+class LowVramPatchCache:
+    """
+    Weights patched by LowVramPatch, kept in CPU memory so offloaded layers can stream the already patched weight
+    instead of redoing the patch math on every step. The copies are pinned through comfy.model_management so they
+    count against the same pinned memory limit as the model weights.
+
+    Entries are keyed by (patches_uuid, key, dtype). When the cache is full the entries of other patches_uuids are
+    removed, least recently used first. The entries of the current patches are never evicted for each other: the
+    offloaded layers run in the same order every step so LRU eviction would never hit, a stable subset of them is
+    cached instead. The entries of a model are dropped when it gets unloaded.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries: collections.OrderedDict[tuple, torch.Tensor] = collections.OrderedDict()
+        self.pinned = set()
+        self.total_size = 0
+        self.lock = threading.Lock()
+
+    def get(self, cache_key):
+        with self.lock:
+            weight = self.entries.get(cache_key, None)
+            if weight is not None:
+                self.entries.move_to_end(cache_key)
+            return weight
+
+    def _remove(self, cache_key):
+        weight = self.entries.pop(cache_key)
+        self.total_size -= weight.nbytes
+        if cache_key in self.pinned:
+            self.pinned.discard(cache_key)
+            comfy.model_management.unpin_memory(weight)
+
+    def put(self, cache_key, weight):
+        if type(weight) is not torch.Tensor:
+            return
+        size = weight.numel() * weight.element_size()
+        with self.lock:
+            if cache_key in self.entries:
+                return
+            if self.total_size + size > self.max_size:
+                for k in list(self.entries.keys()):
+                    if k[0] != cache_key[0]:
+                        self._remove(k)
+                        if self.total_size + size <= self.max_size:
+                            break
+                if self.total_size + size > self.max_size:
+                    return
+
+            cached = torch.empty(weight.shape, dtype=weight.dtype, device="cpu")
+            if not comfy.model_management.is_device_cpu(weight.device) and comfy.model_management.pin_memory(cached, allowed_types=("Tensor",)):
+                self.pinned.add(cache_key)
+            cached.copy_(weight)
+            self.entries[cache_key] = cached
+            self.total_size += size
+
+    def remove_patches(self, patches_uuid):
+        with self.lock:
+            for k in [k for k in self.entries if k[0] == patches_uuid]:
+                self._remove(k)
+
+    def clear(self):
+        with self.lock:
+            for k in list(self.entries.keys()):
+                self._remove(k)
+
+LOWVRAM_PATCH_CACHE_SIZE = args.lowvram_patch_cache_size * 1024 * 1024
+LOWVRAM_PATCH_CACHE = LowVramPatchCache(LOWVRAM_PATCH_CACHE_SIZE)
+
 class LowVramPatch:
-    def __init__(self, key, patches, convert_func=None, set_func=None):
+    def __init__(self, key, patches, convert_func=None, set_func=None, patcher=None):
         self.key = key
         self.patches = patches
         self.convert_func = convert_func
         self.set_func = set_func
+        # The patched weight is cached under the patches_uuid of the patcher that installed this
+        self.patcher = weakref.ref(patcher) if patcher is not None else None
+
+    def cache_key(self, dtype):
+        if self.patcher is None or dtype is None or LOWVRAM_PATCH_CACHE.max_size <= 0:
+            return None
+        patcher = self.patcher()
+        if patcher is None or len(patcher.hook_backup) > 0: #hooks patch the weights in place
+            return None
+        return (patcher.patches_uuid, self.key, dtype)
+
+    def cached_weight(self, dtype):
+        """The patched weight of this key in the compute dtype if it was cached, to use in place of the weight."""
+        cache_key = self.cache_key(dtype)
+        if cache_key is None:
+            return None
+        return LOWVRAM_PATCH_CACHE.get(cache_key)
 
     def __call__(self, weight):
+        out = self.patch(weight)
+        cache_key = self.cache_key(weight.dtype)
+        if cache_key is not None:
+            LOWVRAM_PATCH_CACHE.put(cache_key, out)
+        return out
+
+    def patch(self, weight):
         intermediate_dtype = weight.dtype
         if self.convert_func is not None:
             weight = self.convert_func(weight, inplace=False)
@@ -247,6 +346,11 @@ class ModelPatcher:
         self.patches_uuid = uuid.uuid4()
         self.parent = None
         self.pinned = set()
+        # Apply LoRAs as side branches of the layers at forward time instead of merging them into the weights
+        self.runtime_lora = args.runtime_lora
+        # weight key -> LoraBranch list, for the patches_uuid in lora_branches_uuid
+        self.lora_branches = {}
+        self.lora_branches_uuid = None
 
         self.attachments: dict[str] = {}
         self.additional_models: dict[str, list[ModelPatcher]] = {}
@@ -312,6 +416,7 @@ class ModelPatcher:
         n.pinned = self.pinned
 
         n.force_cast_weights = self.force_cast_weights
+        n.runtime_lora = self.runtime_lora
 
         # attachments
         n.attachments = {}
@@ -620,8 +725,72 @@ class ModelPatcher:
                         sd.pop(k)
             return sd
 
+    def get_lora_branches(self):
+        """
+        LoraBranch lists of the weights whose patches can all be applied at forward time. Weights with any other
+        patch, or that belong to a layer without runtime LoRA support, are merged as usual.
+        """
+        if not self.runtime_lora:
+            return {}
+        if self.lora_branches_uuid == self.patches_uuid:
+            return self.lora_branches
+
+        branches = {}
+        for key, patches in self.patches.items():
+            op_keys = key.rsplit('.', 1)
+            if len(op_keys) < 2 or op_keys[1] != "weight":
+                continue
+            m = comfy.utils.get_attr(self.model, op_keys[0])
+            if not getattr(m, "runtime_lora_support", False) or getattr(m, "groups", 1) != 1:
+                continue
+            key_branches = []
+            for strength_patch, v, strength_model, offset, function in patches:
+                if not isinstance(v, comfy.weight_adapter.LoRAAdapter) or strength_model != 1.0 or offset is not None or function is not None:
+                    break
+                branch = v.runtime_branch(m.weight, strength_patch)
+                if branch is None:
+                    break
+                key_branches.append(branch)
+            else:
+                branches[key] = key_branches
+
+        self.lora_branches = branches
+        self.lora_branches_uuid = self.patches_uuid
+        return branches
+
+    def has_merged_patches(self, key):
+        return key in self.patches and key not in self.get_lora_branches()
+
+    def remove_lora_branches(self):
+        for m in self.model.modules():
+            if "lora_branches" in m.__dict__:
+                del m.lora_branches
+
+    def swap_lora_branches(self, device_to):
+        """
+        Replaces the LoRA branches of another patcher of the same model by the ones of this patcher, if nothing else
+        has to change on the loaded model. Returns False if the weights have to be unpatched and loaded again.
+        """
+        if not self.runtime_lora or len(self.backup) > 0:
+            return False
+        branches = self.get_lora_branches()
+        if len(branches) != len(self.patches):
+            return False
+        for m in self.model.modules():
+            if len(getattr(m, "weight_function", [])) > 0 or len(getattr(m, "bias_function", [])) > 0:
+                return False
+
+        self.remove_lora_branches()
+        for key, key_branches in branches.items():
+            m = comfy.utils.get_attr(self.model, key.rsplit('.', 1)[0])
+            m.lora_branches = key_branches
+            move_weight_functions(m, device_to)
+        self.model.current_weight_patches_uuid = self.patches_uuid
+        logging.debug("Swapped the runtime LoRA branches of {} layers".format(len(branches)))
+        return True
+
     def patch_weight_to_device(self, key, device_to=None, inplace_update=False):
-        if key not in self.patches:
+        if not self.has_merged_patches(key):
             return
 
         weight, set_func, convert_func = get_key_weight(self.model, key)
@@ -679,9 +848,9 @@ class ModelPatcher:
                 if hasattr(m, "comfy_cast_weights"):
                     weight_key = "{}.weight".format(n)
                     bias_key = "{}.bias".format(n)
-                    if weight_key in self.patches:
+                    if self.has_merged_patches(weight_key):
                         module_offload_mem += low_vram_patch_estimate_vram(self.model, weight_key)
-                    if bias_key in self.patches:
+                    if self.has_merged_patches(bias_key):
                         module_offload_mem += low_vram_patch_estimate_vram(self.model, bias_key)
                 loading.append((module_offload_mem, module_mem, n, m, params))
         return loading
@@ -689,6 +858,7 @@ class ModelPatcher:
     def load(self, device_to=None, lowvram_model_memory=0, force_patch_weights=False, full_load=False):
         with self.use_ejected():
             self.unpatch_hooks()
+            lora_branches = self.get_lora_branches()
             mem_counter = 0
             patch_counter = 0
             lowvram_counter = 0
@@ -725,19 +895,19 @@ class ModelPatcher:
                         m.weight_function = []
                         m.bias_function = []
 
-                    if weight_key in self.patches:
+                    if self.has_merged_patches(weight_key):
                         if force_patch_weights:
                             self.patch_weight_to_device(weight_key)
                         else:
                             _, set_func, convert_func = get_key_weight(self.model, weight_key)
-                            m.weight_function = [LowVramPatch(weight_key, self.patches, convert_func, set_func)]
+                            m.weight_function = [LowVramPatch(weight_key, self.patches, convert_func, set_func, self)]
                             patch_counter += 1
-                    if bias_key in self.patches:
+                    if self.has_merged_patches(bias_key):
                         if force_patch_weights:
                             self.patch_weight_to_device(bias_key)
                         else:
                             _, set_func, convert_func = get_key_weight(self.model, bias_key)
-                            m.bias_function = [LowVramPatch(bias_key, self.patches, convert_func, set_func)]
+                            m.bias_function = [LowVramPatch(bias_key, self.patches, convert_func, set_func, self)]
                             patch_counter += 1
 
                     cast_weight = True
@@ -762,6 +932,11 @@ class ModelPatcher:
                 if bias_key in self.weight_wrapper_patches:
                     m.bias_function.extend(self.weight_wrapper_patches[bias_key])
 
+                if weight_key in lora_branches:
+                    m.lora_branches = lora_branches[weight_key]
+                elif "lora_branches" in m.__dict__:
+                    del m.lora_branches
+
                 mem_counter += move_weight_functions(m, device_to)
 
             load_completely.sort(reverse=True)
@@ -841,6 +1016,9 @@ class ModelPatcher:
                 self.model.model_lowvram = False
                 self.model.lowvram_patch_counter = 0
 
+            self.remove_lora_branches()
+            LOWVRAM_PATCH_CACHE.remove_patches(self.patches_uuid)
+
             keys = list(self.backup.keys())
 
             for k in keys:
@@ -913,19 +1091,19 @@ class ModelPatcher:
                         m.to(device_to)
                         module_mem += move_weight_functions(m, device_to)
                         if lowvram_possible:
-                            if weight_key in self.patches:
+                            if self.has_merged_patches(weight_key):
                                 if force_patch_weights:
                                     self.patch_weight_to_device(weight_key)
                                 else:
                                     _, set_func, convert_func = get_key_weight(self.model, weight_key)
-                                    m.weight_function.append(LowVramPatch(weight_key, self.patches, convert_func, set_func))
+                                    m.weight_function.append(LowVramPatch(weight_key, self.patches, convert_func, set_func, self))
                                     patch_counter += 1
-                            if bias_key in self.patches:
+                            if self.has_merged_patches(bias_key):
                                 if force_patch_weights:
                                     self.patch_weight_to_device(bias_key)
                                 else:
                                     _, set_func, convert_func = get_key_weight(self.model, bias_key)
-                                    m.bias_function.append(LowVramPatch(bias_key, self.patches, convert_func, set_func))
+                                    m.bias_function.append(LowVramPatch(bias_key, self.patches, convert_func, set_func, self))
                                     patch_counter += 1
                             cast_weight = True
 
@@ -951,6 +1129,8 @@ class ModelPatcher:
     def partially_load(self, device_to, extra_memory=0, force_patch_weights=False):
         with self.use_ejected(skip_and_inject_on_exit_only=True):
             unpatch_weights = self.model.current_weight_patches_uuid is not None and (self.model.current_weight_patches_uuid != self.patches_uuid or force_patch_weights)
+            if unpatch_weights and not force_patch_weights and self.swap_lora_branches(device_to):
+                unpatch_weights = False
             # TODO: force_patch_weights should not unload + reload full model
             used = self.model.model_loaded_weight_memory
             self.unpatch_model(self.offload_device, unpatch_weights=unpatch_weights)
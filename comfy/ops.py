@@ -102,10 +102,19 @@ def cast_bias_weight(s, input=None, dtype=None, device=None, bias_dtype=None, of
 
     non_blocking = comfy.model_management.device_supports_non_blocking(device)
 
-    weight_has_function = len(s.weight_function) > 0
+    weight_source = s.weight
+    weight_functions = s.weight_function
+    if len(weight_functions) > 0 and hasattr(weight_functions[0], "cached_weight"):
+        # A LowVramPatch that already patched this weight: stream the patched weight instead of patching it again
+        cached_weight = weight_functions[0].cached_weight(dtype)
+        if cached_weight is not None:
+            weight_source = cached_weight
+            weight_functions = weight_functions[1:]
+
+    weight_has_function = len(weight_functions) > 0
     bias_has_function = len(s.bias_function) > 0
 
-    weight = comfy.model_management.cast_to(s.weight, None, device, non_blocking=non_blocking, copy=weight_has_function, stream=offload_stream)
+    weight = comfy.model_management.cast_to(weight_source, None, device, non_blocking=non_blocking, copy=weight_has_function, stream=offload_stream)
 
     bias = None
     if s.bias is not None:
@@ -121,7 +130,7 @@ def cast_bias_weight(s, input=None, dtype=None, device=None, bias_dtype=None, of
             weight = weight.to(dtype=dtype)
             if isinstance(weight, QuantizedTensor):
                 weight = weight.dequantize()
-            for f in s.weight_function:
+            for f in weight_functions:
                 weight = f(weight)
 
     comfy.model_management.sync_stream(device, offload_stream)
@@ -148,9 +157,19 @@ class CastWeightBiasOp:
     comfy_cast_weights = False
     weight_function = []
     bias_function = []
+    # Layers whose forward adds the output of their lora_branches, see comfy.weight_adapter.lora.LoraBranch
+    runtime_lora_support = False
+    lora_branches = ()
+
+def apply_lora_branches(s, input, output):
+    for branch in s.lora_branches:
+        output = branch(s, input, output)
+    return output
 
 class disable_weight_init:
     class Linear(torch.nn.Linear, CastWeightBiasOp):
+        runtime_lora_support = True
+
         def reset_parameters(self):
             return None
 
@@ -163,11 +182,16 @@ class disable_weight_init:
         def forward(self, *args, **kwargs):
             run_every_op()
             if self.comfy_cast_weights or len(self.weight_function) > 0 or len(self.bias_function) > 0:
-                return self.forward_comfy_cast_weights(*args, **kwargs)
+                x = self.forward_comfy_cast_weights(*args, **kwargs)
             else:
-                return super().forward(*args, **kwargs)
+                x = super().forward(*args, **kwargs)
+            if len(self.lora_branches) > 0:
+                x = apply_lora_branches(self, args[0], x)
+            return x
 
     class Conv1d(torch.nn.Conv1d, CastWeightBiasOp):
+        runtime_lora_support = True
+
         def reset_parameters(self):
             return None
 
@@ -180,11 +204,16 @@ class disable_weight_init:
         def forward(self, *args, **kwargs):
             run_every_op()
             if self.comfy_cast_weights or len(self.weight_function) > 0 or len(self.bias_function) > 0:
-                return self.forward_comfy_cast_weights(*args, **kwargs)
+                x = self.forward_comfy_cast_weights(*args, **kwargs)
             else:
-                return super().forward(*args, **kwargs)
+                x = super().forward(*args, **kwargs)
+            if len(self.lora_branches) > 0:
+                x = apply_lora_branches(self, args[0], x)
+            return x
 
     class Conv2d(torch.nn.Conv2d, CastWeightBiasOp):
+        runtime_lora_support = True
+
         def reset_parameters(self):
             return None
 
@@ -197,11 +226,16 @@ class disable_weight_init:
         def forward(self, *args, **kwargs):
             run_every_op()
             if self.comfy_cast_weights or len(self.weight_function) > 0 or len(self.bias_function) > 0:
-                return self.forward_comfy_cast_weights(*args, **kwargs)
+                x = self.forward_comfy_cast_weights(*args, **kwargs)
             else:
-                return super().forward(*args, **kwargs)
+                x = super().forward(*args, **kwargs)
+            if len(self.lora_branches) > 0:
+                x = apply_lora_branches(self, args[0], x)
+            return x
 
     class Conv3d(torch.nn.Conv3d, CastWeightBiasOp):
+        runtime_lora_support = True
+
         def reset_parameters(self):
             return None
 
@@ -223,9 +257,12 @@ class disable_weight_init:
         def forward(self, *args, **kwargs):
             run_every_op()
             if self.comfy_cast_weights or len(self.weight_function) > 0 or len(self.bias_function) > 0:
-                return self.forward_comfy_cast_weights(*args, **kwargs)
+                x = self.forward_comfy_cast_weights(*args, **kwargs)
             else:
-                return super().forward(*args, **kwargs)
+                x = super().forward(*args, **kwargs)
+            if len(self.lora_branches) > 0:
+                x = apply_lora_branches(self, args[0], x)
+            return x
 
     class GroupNorm(torch.nn.GroupNorm, CastWeightBiasOp):
         def reset_parameters(self):
@@ -529,6 +566,8 @@ except ImportError:
 if CUBLAS_IS_AVAILABLE:
     class cublas_ops(disable_weight_init):
         class Linear(CublasLinear, disable_weight_init.Linear):
+            runtime_lora_support = False
+
             def reset_parameters(self):
                 return None
 
@@ -552,6 +591,8 @@ def mixed_precision_ops(layer_quant_config={}, compute_dtype=torch.bfloat16, ful
         _full_precision_mm = full_precision_mm
 
         class Linear(torch.nn.Module, CastWeightBiasOp):
+            runtime_lora_support = True
+
             def __init__(
                 self,
                 in_features: int,
@@ -640,13 +681,18 @@ def mixed_precision_ops(layer_quant_config={}, compute_dtype=torch.bfloat16, ful
             def forward(self, input, *args, **kwargs):
                 run_every_op()
 
+                lora_input = input
                 if self._full_precision_mm or self.comfy_cast_weights or len(self.weight_function) > 0 or len(self.bias_function) > 0:
-                    return self.forward_comfy_cast_weights(input, *args, **kwargs)
-                if (getattr(self, 'layout_type', None) is not None and
-                    getattr(self, 'input_scale', None) is not None and
-                    not isinstance(input, QuantizedTensor)):
-                    input = QuantizedTensor.from_float(input, self.layout_type, scale=self.input_scale, dtype=self.weight.dtype)
-                return self._forward(input, self.weight, self.bias)
+                    x = self.forward_comfy_cast_weights(input, *args, **kwargs)
+                else:
+                    if (getattr(self, 'layout_type', None) is not None and
+                        getattr(self, 'input_scale', None) is not None and
+                        not isinstance(input, QuantizedTensor)):
+                        input = QuantizedTensor.from_float(input, self.layout_type, scale=self.input_scale, dtype=self.weight.dtype)
+                    x = self._forward(input, self.weight, self.bias)
+                if len(self.lora_branches) > 0:
+                    x = apply_lora_branches(self, lora_input, x)
+                return x
 
             def convert_weight(self, weight, inplace=False, **kwargs):
                 if isinstance(weight, QuantizedTensor):
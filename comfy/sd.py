@@ -1,10 +1,12 @@
 from __future__ import annotations
+import contextlib
 import json
 import torch
 from enum import Enum
 import logging
 
 from comfy import model_management
+from comfy.cli_args import args
 from comfy.utils import ProgressBar
 from .ldm.models.autoencoder import AutoencoderKL, AutoencodingEngine
 from .ldm.cascade.stage_a import StageA
@@ -134,6 +136,7 @@ class CLIP:
         self.use_clip_schedule = False
         logging.info("CLIP/text encoder model load device: {}, offload device: {}, current: {}, dtype: {}".format(load_device, offload_device, params['device'], dtype))
         self.tokenizer_options = {}
+        self.embedding_cache = sd1_clip.EmbeddingCache(args.text_encoder_cache_size * 1024 * 1024)
 
     def clone(self):
         n = CLIP(no_init=True)
@@ -144,6 +147,7 @@ class CLIP:
         n.tokenizer_options = self.tokenizer_options.copy()
         n.use_clip_schedule = self.use_clip_schedule
         n.apply_hooks_to_conds = self.apply_hooks_to_conds
+        n.embedding_cache = self.embedding_cache
         return n
 
     def get_ram_usage(self):
@@ -229,6 +233,13 @@ class CLIP:
             all_hooks.reset()
         return all_cond_pooled
 
+    def use_embedding_cache(self):
+        # The cached chunks are only valid for the patches they were encoded with, hooks patch the weights in place
+        cache = getattr(self, "embedding_cache", None)
+        if cache is None or cache.max_size <= 0 or len(self.patcher.hook_backup) > 0:
+            return contextlib.nullcontext()
+        return sd1_clip.use_embedding_cache(cache, self.patcher.patches_uuid)
+
     def encode_from_tokens(self, tokens, return_pooled=False, return_dict=False):
         self.cond_stage_model.reset_clip_options()
 
@@ -239,7 +250,8 @@ class CLIP:
             self.cond_stage_model.set_clip_options({"projected_pooled": False})
 
         self.load_model()
-        o = self.cond_stage_model.encode_token_weights(tokens)
+        with self.use_embedding_cache():
+            o = self.cond_stage_model.encode_token_weights(tokens)
         cond, pooled = o[:2]
         if return_dict:
             out = {"cond": cond, "pooled_output": pooled}
@@ -654,6 +666,16 @@ class VAE:
     def get_ram_usage(self):
         return self.model_size()
 
+    def tile_batch_size(self, memory_used):
+        # As many tiles per forward as fit in the free memory, the same estimate decode/encode use for their batches
+        return lambda shape: model_management.get_free_memory(self.device) / max(1, memory_used(shape, self.vae_dtype))
+
+    def tiled_accumulate_device(self, output_size):
+        # Blend the tiles on the compute device when the output buffers fit there with room left for the tiles
+        if model_management.get_free_memory(self.device) > output_size * 2:
+            return self.device
+        return None
+
     def throw_exception_if_invalid(self):
         if self.first_stage_model is None:
             raise RuntimeError("ERROR: VAE is invalid: None\n\nIf the VAE is from a checkpoint loader node your checkpoint does not contain a valid VAE.")
@@ -679,10 +701,13 @@ class VAE:
         pbar = comfy.utils.ProgressBar(steps)
 
         decode_fn = lambda a: self.first_stage_model.decode(a.to(self.vae_dtype).to(self.device)).float()
+        ratio = self.spacial_compression_decode()
+        tile_args = {"tile_batch_size": self.tile_batch_size(self.memory_used_decode),
+                     "accumulate_device": self.tiled_accumulate_device(samples.shape[0] * 4 * samples.shape[2] * samples.shape[3] * ratio * ratio * 4)}
         output = self.process_output(
-            (comfy.utils.tiled_scale(samples, decode_fn, tile_x // 2, tile_y * 2, overlap, upscale_amount = self.upscale_ratio, output_device=self.output_device, pbar = pbar) +
-            comfy.utils.tiled_scale(samples, decode_fn, tile_x * 2, tile_y // 2, overlap, upscale_amount = self.upscale_ratio, output_device=self.output_device, pbar = pbar) +
-             comfy.utils.tiled_scale(samples, decode_fn, tile_x, tile_y, overlap, upscale_amount = self.upscale_ratio, output_device=self.output_device, pbar = pbar))
+            (comfy.utils.tiled_scale(samples, decode_fn, tile_x // 2, tile_y * 2, overlap, upscale_amount = self.upscale_ratio, output_device=self.output_device, pbar = pbar, **tile_args) +
+            comfy.utils.tiled_scale(samples, decode_fn, tile_x * 2, tile_y // 2, overlap, upscale_amount = self.upscale_ratio, output_device=self.output_device, pbar = pbar, **tile_args) +
+             comfy.utils.tiled_scale(samples, decode_fn, tile_x, tile_y, overlap, upscale_amount = self.upscale_ratio, output_device=self.output_device, pbar = pbar, **tile_args))
             / 3.0)
         return output
 
@@ -707,9 +732,12 @@ class VAE:
         pbar = comfy.utils.ProgressBar(steps)
 
         encode_fn = lambda a: self.first_stage_model.encode((self.process_input(a)).to(self.vae_dtype).to(self.device)).float()
-        samples = comfy.utils.tiled_scale(pixel_samples, encode_fn, tile_x, tile_y, overlap, upscale_amount = (1/self.downscale_ratio), out_channels=self.latent_channels, output_device=self.output_device, pbar=pbar)
-        samples += comfy.utils.tiled_scale(pixel_samples, encode_fn, tile_x * 2, tile_y // 2, overlap, upscale_amount = (1/self.downscale_ratio), out_channels=self.latent_channels, output_device=self.output_device, pbar=pbar)
-        samples += comfy.utils.tiled_scale(pixel_samples, encode_fn, tile_x // 2, tile_y * 2, overlap, upscale_amount = (1/self.downscale_ratio), out_channels=self.latent_channels, output_device=self.output_device, pbar=pbar)
+        ratio = self.spacial_compression_encode()
+        tile_args = {"tile_batch_size": self.tile_batch_size(self.memory_used_encode),
+                     "accumulate_device": self.tiled_accumulate_device(pixel_samples.shape[0] * (self.latent_channels + 1) * (pixel_samples.shape[2] // ratio) * (pixel_samples.shape[3] // ratio) * 4)}
+        samples = comfy.utils.tiled_scale(pixel_samples, encode_fn, tile_x, tile_y, overlap, upscale_amount = (1/self.downscale_ratio), out_channels=self.latent_channels, output_device=self.output_device, pbar=pbar, **tile_args)
+        samples += comfy.utils.tiled_scale(pixel_samples, encode_fn, tile_x * 2, tile_y // 2, overlap, upscale_amount = (1/self.downscale_ratio), out_channels=self.latent_channels, output_device=self.output_device, pbar=pbar, **tile_args)
+        samples += comfy.utils.tiled_scale(pixel_samples, encode_fn, tile_x // 2, tile_y * 2, overlap, upscale_amount = (1/self.downscale_ratio), out_channels=self.latent_channels, output_device=self.output_device, pbar=pbar, **tile_args)
         samples /= 3.0
         return samples
 
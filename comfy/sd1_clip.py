@@ -11,6 +11,53 @@ import json
 import logging
 import numbers
 import re
+import contextlib
+import contextvars
+import threading
+from collections import OrderedDict
+
+class EmbeddingCache:
+    """
+    Encoder outputs (hidden states, pooled output and attention mask) of single token chunks, reused by every prompt
+    that contains the same chunk. The entries are kept on the intermediate device and the least recently used ones
+    are removed when they take more than max_size bytes.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.total_size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry[0]
+        return None
+
+    def put(self, key, value):
+        size = sum(v.numel() * v.element_size() for v in value if v is not None)
+        with self.lock:
+            if key in self.entries or size > self.max_size:
+                return
+            self.entries[key] = (value, size)
+            self.total_size += size
+            while self.total_size > self.max_size:
+                _, (_, old_size) = self.entries.popitem(last=False)
+                self.total_size -= old_size
+
+# (EmbeddingCache, key of the encoder weights) set by CLIP while encoding. Context local so prompts encoding at the
+# same time in other threads don't see each other's cache.
+ACTIVE_EMBEDDING_CACHE = contextvars.ContextVar("active_embedding_cache", default=None)
+
+@contextlib.contextmanager
+def use_embedding_cache(cache, weights_key):
+    token = ACTIVE_EMBEDDING_CACHE.set((cache, weights_key))
+    try:
+        yield
+    finally:
+        ACTIVE_EMBEDDING_CACHE.reset(token)
 
 def gen_empty_tokens(special_tokens, length):
     start_token = special_tokens.get("start", None)
@@ -299,7 +346,40 @@ class SDClipModel(torch.nn.Module, ClipTokenWeightEncoder):
         return z, pooled_output
 
     def encode(self, tokens):
-        return self(tokens)
+        active = ACTIVE_EMBEDDING_CACHE.get()
+        if active is None or not all(isinstance(y, numbers.Integral) for x in tokens for y in x): #embeddings aren't cached
+            return self(tokens)
+
+        cache, weights_key = active
+        layer = tuple(self.layer) if isinstance(self.layer, list) else self.layer
+        keys = [(weights_key, id(self), layer, self.layer_idx, self.return_projected_pooled, tuple(int(y) for y in x)) for x in tokens]
+        rows = [cache.get(k) for k in keys]
+        missing = [i for i in range(len(rows)) if rows[i] is None]
+        if len(missing) > 0:
+            o = self([tokens[i] for i in missing])
+            extra = o[2] if len(o) > 2 else {}
+            attention_mask = extra.get("attention_mask", None)
+            splittable = len(o) <= 3 and all(k == "attention_mask" for k in extra)
+            splittable = splittable and all(v is None or v.shape[0] == len(missing) for v in (o[0], o[1], attention_mask))
+            if not splittable:
+                # Outputs that can't be split by chunk
+                return o if len(missing) == len(rows) else self(tokens)
+            device = model_management.intermediate_device()
+            for j, i in enumerate(missing):
+                rows[i] = (o[0][j].to(device, copy=True),
+                           o[1][j].to(device, copy=True) if o[1] is not None else None,
+                           attention_mask[j].to(device, copy=True) if attention_mask is not None else None)
+                cache.put(keys[i], rows[i])
+            if len(missing) == len(rows):
+                return o
+
+        if len(set(r[0].shape for r in rows)) > 1:
+            return self(tokens)
+        z = torch.stack([r[0] for r in rows])
+        pooled_output = torch.stack([r[1] for r in rows]) if rows[0][1] is not None else None
+        if rows[0][2] is not None:
+            return z, pooled_output, {"attention_mask": torch.stack([r[2] for r in rows])}
+        return z, pooled_output
 
     def load_sd(self, sd):
         return self.transformer.load_state_dict(sd, strict=False)
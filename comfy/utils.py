@@ -19,19 +19,24 @@
 
 import torch
 import math
+import os
+import json
 import struct
+import threading
 import comfy.checkpoint_pickle
 import safetensors.torch
 import numpy as np
 from PIL import Image
 import logging
 import itertools
+from concurrent.futures import ThreadPoolExecutor
 from torch.nn.functional import interpolate
 from einops import rearrange
 from comfy.cli_args import args
 
 MMAP_TORCH_FILES = args.mmap_torch_files
 DISABLE_MMAP = args.disable_mmap
+PARALLEL_LOAD_THREADS = args.parallel_load
 
 ALWAYS_SAFE_LOAD = False
 if hasattr(torch.serialization, "add_safe_globals"):  # TODO: this was added in pytorch 2.4, the unsafe path should be removed once earlier versions are deprecated
@@ -54,21 +59,131 @@ if hasattr(torch.serialization, "add_safe_globals"):  # TODO: this was added in
 else:
     logging.info("Warning, you are using an old pytorch version and some ckpt/pt files might be loaded unsafely. Upgrading to 2.4 or above is recommended.")
 
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+for name, torch_dtype in (("F8_E4M3", "float8_e4m3fn"), ("F8_E5M2", "float8_e5m2"), ("U16", "uint16"), ("U32", "uint32"), ("U64", "uint64")):
+    if hasattr(torch, torch_dtype):
+        SAFETENSORS_DTYPES[name] = getattr(torch, torch_dtype)
+
+PARALLEL_LOAD_CHUNK_SIZE = 64 * 1024 * 1024
+
+def read_safetensors_header(f) -> tuple[dict, int]:
+    """Returns the header of an open safetensors file and the offset its tensor data starts at."""
+    file_size = os.fstat(f.fileno()).st_size
+    header_size_bytes = f.read(8)
+    if len(header_size_bytes) < 8:
+        raise ValueError("MetadataIncompleteBuffer")
+    header_size = struct.unpack("<Q", header_size_bytes)[0]
+    if header_size > file_size - 8:
+        raise ValueError("HeaderTooLarge")
+    header = json.loads(f.read(header_size))
+    return header, 8 + header_size
+
+def load_safetensors_parallel(ckpt, device=None, dtype=None, num_threads=8, pin_memory=False):
+    """
+    Loads a safetensors file by reading its tensors on num_threads threads straight into newly allocated tensors, which
+    avoids both the per tensor calls of safe_open and the extra copy needed when mmap is disabled. With pin_memory the
+    tensors are read into pinned memory so the copy to device doesn't block. Floating point tensors are converted to dtype
+    if it is set.
+    Returns the state dict and the metadata of the file.
+    """
+    if device is None:
+        device = torch.device("cpu")
+
+    with open(ckpt, "rb") as f:
+        header, data_start = read_safetensors_header(f)
+    metadata = header.pop("__metadata__", None)
+    file_size = os.path.getsize(ckpt)
+
+    pin_memory = pin_memory and torch.cuda.is_available()
+    sd = {}
+    buffers = {}
+    chunks = []
+    for k, info in header.items():
+        start, end = info["data_offsets"]
+        if data_start + end > file_size:
+            raise ValueError("MetadataIncompleteBuffer")
+        tensor_dtype = SAFETENSORS_DTYPES.get(info["dtype"])
+        if tensor_dtype is None:
+            raise ValueError("Unsupported dtype {} for tensor {}".format(info["dtype"], k))
+        buffer = torch.empty((end - start,), dtype=torch.uint8, pin_memory=pin_memory)
+        buffers[k] = (buffer, tensor_dtype, info["shape"])
+        # Large tensors are split so they are read on several threads too
+        for offset in range(0, end - start, PARALLEL_LOAD_CHUNK_SIZE):
+            chunks.append((buffer, offset, min(offset + PARALLEL_LOAD_CHUNK_SIZE, end - start), data_start + start + offset))
+
+    # Reading in file order keeps the disk access mostly sequential even with several threads
+    chunks.sort(key=lambda c: c[3])
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+
+    def read_chunk(chunk):
+        buffer, buffer_start, buffer_end, file_offset = chunk
+        handle = getattr(local, "handle", None)
+        if handle is None:
+            handle = open(ckpt, "rb", buffering=0)
+            local.handle = handle
+            with handles_lock:
+                handles.append(handle)
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(handle.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        view = memoryview(buffer.numpy())[buffer_start:buffer_end]
+        handle.seek(file_offset)
+        while len(view) > 0:
+            read = handle.readinto(view)
+            if not read:
+                raise ValueError("MetadataIncompleteBuffer")
+            view = view[read:]
+
+    try:
+        if hasattr(os, "posix_fadvise") and len(chunks) > 0:
+            # Starts readahead of the whole data section while the threads are getting started
+            with open(ckpt, "rb") as f:
+                os.posix_fadvise(f.fileno(), data_start, file_size - data_start, os.POSIX_FADV_WILLNEED)
+        with ThreadPoolExecutor(max_workers=max(1, num_threads), thread_name_prefix="load_safetensors") as executor:
+            for _ in executor.map(read_chunk, chunks):
+                pass
+    finally:
+        for handle in handles:
+            handle.close()
+
+    for k, (buffer, tensor_dtype, shape) in buffers.items():
+        tensor = buffer.view(tensor_dtype).reshape(shape)
+        target_dtype = dtype if dtype is not None and tensor_dtype.is_floating_point else tensor_dtype
+        if device.type != "cpu" or target_dtype != tensor_dtype:
+            tensor = tensor.to(device=device, dtype=target_dtype, non_blocking=pin_memory)
+        sd[k] = tensor
+    return sd, metadata
+
 def load_torch_file(ckpt, safe_load=False, device=None, return_metadata=False):
     if device is None:
         device = torch.device("cpu")
     metadata = None
     if ckpt.lower().endswith(".safetensors") or ckpt.lower().endswith(".sft"):
         try:
-            with safetensors.safe_open(ckpt, framework="pt", device=device.type) as f:
-                sd = {}
-                for k in f.keys():
-                    tensor = f.get_tensor(k)
-                    if DISABLE_MMAP:  # TODO: Not sure if this is the best way to bypass the mmap issues
-                        tensor = tensor.to(device=device, copy=True)
-                    sd[k] = tensor
-                if return_metadata:
-                    metadata = f.metadata()
+            if PARALLEL_LOAD_THREADS > 0:
+                sd, metadata = load_safetensors_parallel(ckpt, device=device, num_threads=PARALLEL_LOAD_THREADS)
+            else:
+                with safetensors.safe_open(ckpt, framework="pt", device=device.type) as f:
+                    sd = {}
+                    for k in f.keys():
+                        tensor = f.get_tensor(k)
+                        if DISABLE_MMAP:  # TODO: Not sure if this is the best way to bypass the mmap issues
+                            tensor = tensor.to(device=device, copy=True)
+                        sd[k] = tensor
+                    if return_metadata:
+                        metadata = f.metadata()
         except Exception as e:
             if len(e.args) > 0:
                 message = e.args[0]
@@ -968,7 +1083,14 @@ def get_tiled_scale_steps(width, height, tile_x, tile_y, overlap):
     return rows * cols
 
 @torch.inference_mode()
-def tiled_scale_multidim(samples, function, tile=(64, 64), overlap=8, upscale_amount=4, out_channels=3, output_device="cpu", downscale=False, index_formulas=None, pbar=None):
+def tiled_scale_multidim(samples, function, tile=(64, 64), overlap=8, upscale_amount=4, out_channels=3, output_device="cpu", downscale=False, index_formulas=None, pbar=None, tile_batch_size=1, accumulate_device=None):
+    """
+    Runs function over overlapping tiles of samples and blends the results with feathered masks.
+
+    tile_batch_size is the number of tiles run in one call of function, or a function of the shape of a tile input
+    that returns it (e.g. from the free memory). Only tiles of the same shape are batched together.
+    The tiles are blended on accumulate_device (output_device by default).
+    """
     dims = len(tile)
 
     if not (isinstance(upscale_amount, (tuple, list))):
@@ -1024,62 +1146,102 @@ def tiled_scale_multidim(samples, function, tile=(64, 64), overlap=8, upscale_am
             out.append(round(get_scale(i, a[i])))
         return out
 
-    output = torch.empty([samples.shape[0], out_channels] + mult_list_upscale(samples.shape[2:]), device=output_device)
-
-    for b in range(samples.shape[0]):
-        s = samples[b:b+1]
-
-        # handle entire input fitting in a single tile
-        if all(s.shape[d+2] <= tile[d] for d in range(dims)):
-            output[b:b+1] = function(s).to(output_device)
+    def get_tile_batch_size(shape):
+        if callable(tile_batch_size):
+            return max(1, int(tile_batch_size(shape)))
+        return max(1, int(tile_batch_size))
+
+    output_shape = [samples.shape[0], out_channels] + mult_list_upscale(samples.shape[2:])
+
+    # handle entire input fitting in a single tile
+    if all(samples.shape[d+2] <= tile[d] for d in range(dims)):
+        output = torch.empty(output_shape, device=output_device)
+        b = 0
+        while b < samples.shape[0]:
+            s = samples[b:b + get_tile_batch_size([1] + list(samples.shape[1:]))]
+            output[b:b + s.shape[0]] = function(s).to(output_device)
+            b += s.shape[0]
             if pbar is not None:
-                pbar.update(1)
-            continue
-
-        out = torch.zeros([s.shape[0], out_channels] + mult_list_upscale(s.shape[2:]), device=output_device)
-        out_div = torch.zeros([s.shape[0], out_channels] + mult_list_upscale(s.shape[2:]), device=output_device)
-
-        positions = [range(0, s.shape[d+2] - overlap[d], tile[d] - overlap[d]) if s.shape[d+2] > tile[d] else [0] for d in range(dims)]
-
-        for it in itertools.product(*positions):
-            s_in = s
-            upscaled = []
-
-            for d in range(dims):
-                pos = max(0, min(s.shape[d + 2] - overlap[d], it[d]))
-                l = min(tile[d], s.shape[d + 2] - pos)
-                s_in = s_in.narrow(d + 2, pos, l)
-                upscaled.append(round(get_pos(d, pos)))
-
-            ps = function(s_in).to(output_device)
-            mask = torch.ones_like(ps)
-
+                pbar.update(s.shape[0])
+        return output
+
+    tiles = []
+    positions = [range(0, samples.shape[d+2] - overlap[d], tile[d] - overlap[d]) if samples.shape[d+2] > tile[d] else [0] for d in range(dims)]
+    for it in itertools.product(*positions):
+        narrows = []
+        upscaled = []
+        for d in range(dims):
+            pos = max(0, min(samples.shape[d + 2] - overlap[d], it[d]))
+            l = min(tile[d], samples.shape[d + 2] - pos)
+            narrows.append((pos, l))
+            upscaled.append(round(get_pos(d, pos)))
+        tiles.append((narrows, upscaled))
+
+    # Tiles of the same shape, of all the batch items, are run together in batches of up to tile_batch_size
+    groups = {}
+    for b in range(samples.shape[0]):
+        for narrows, upscaled in tiles:
+            groups.setdefault(tuple(l for _, l in narrows), []).append((b, narrows, upscaled))
+
+    masks = {}
+    def get_mask(ps):
+        # Feathered blending mask of an output tile, the same for every tile of that shape
+        key = (tuple(ps.shape[2:]), ps.dtype, ps.device)
+        mask = masks.get(key, None)
+        if mask is None:
+            mask = torch.ones([1, 1] + list(ps.shape[2:]), dtype=ps.dtype, device=ps.device)
             for d in range(2, dims + 2):
                 feather = round(get_scale(d - 2, overlap[d - 2]))
                 if feather >= mask.shape[d]:
                     continue
-                for t in range(feather):
-                    a = (t + 1) / feather
-                    mask.narrow(d, t, 1).mul_(a)
-                    mask.narrow(d, mask.shape[d] - 1 - t, 1).mul_(a)
-
-            o = out
-            o_d = out_div
-            for d in range(dims):
-                o = o.narrow(d + 2, upscaled[d], mask.shape[d + 2])
-                o_d = o_d.narrow(d + 2, upscaled[d], mask.shape[d + 2])
-
-            o.add_(ps * mask)
-            o_d.add_(mask)
+                ramp = torch.arange(1, feather + 1, dtype=ps.dtype, device=ps.device) / feather
+                shape = [1] * (dims + 2)
+                shape[d] = feather
+                mask.narrow(d, 0, feather).mul_(ramp.reshape(shape))
+                mask.narrow(d, mask.shape[d] - feather, feather).mul_(ramp.flip(0).reshape(shape))
+            masks[key] = mask
+        return mask
+
+    if accumulate_device is None:
+        accumulate_device = output_device
+    out = torch.zeros(output_shape, device=accumulate_device)
+    out_div = torch.zeros([output_shape[0], 1] + output_shape[2:], device=accumulate_device)
+
+    for shape, items in groups.items():
+        i = 0
+        while i < len(items):
+            batch = items[i:i + get_tile_batch_size([1, samples.shape[1]] + list(shape))]
+            i += len(batch)
+
+            s_in = []
+            for b, narrows, upscaled in batch:
+                t = samples[b:b+1]
+                for d in range(dims):
+                    t = t.narrow(d + 2, narrows[d][0], narrows[d][1])
+                s_in.append(t)
+            s_in = torch.cat(s_in) if len(s_in) > 1 else s_in[0]
+
+            ps = function(s_in).to(accumulate_device)
+            mask = get_mask(ps)
+
+            for j, (b, narrows, upscaled) in enumerate(batch):
+                o = out[b:b+1]
+                o_d = out_div[b:b+1]
+                for d in range(dims):
+                    o = o.narrow(d + 2, upscaled[d], mask.shape[d + 2])
+                    o_d = o_d.narrow(d + 2, upscaled[d], mask.shape[d + 2])
+
+                o.add_(ps[j:j+1] * mask)
+                o_d.add_(mask)
 
             if pbar is not None:
-                pbar.update(1)
+                pbar.update(len(batch))
 
-        output[b:b+1] = out/out_div
-    return output
+    out /= out_div
+    return out.to(output_device)
 
-def tiled_scale(samples, function, tile_x=64, tile_y=64, overlap = 8, upscale_amount = 4, out_channels = 3, output_device="cpu", pbar = None):
-    return tiled_scale_multidim(samples, function, (tile_y, tile_x), overlap=overlap, upscale_amount=upscale_amount, out_channels=out_channels, output_device=output_device, pbar=pbar)
+def tiled_scale(samples, function, tile_x=64, tile_y=64, overlap = 8, upscale_amount = 4, out_channels = 3, output_device="cpu", pbar = None, tile_batch_size=1, accumulate_device=None):
+    return tiled_scale_multidim(samples, function, (tile_y, tile_x), overlap=overlap, upscale_amount=upscale_amount, out_channels=out_channels, output_device=output_device, pbar=pbar, tile_batch_size=tile_batch_size, accumulate_device=accumulate_device)
 
 PROGRESS_BAR_ENABLED = True
 def set_progress_bar_enabled(enabled):
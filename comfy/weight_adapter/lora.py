@@ -55,6 +55,37 @@ class LoraDiff(WeightAdapterTrainBase):
         return sum(param.numel() * param.element_size() for param in self.parameters())
 
 
+class LoraBranch:
+    """
+    A LoRA applied at forward time as a low rank side branch of the layer output, x * down^T * up^T * scale, instead
+    of being merged into the weight.
+    """
+    def __init__(self, up, down, scale):
+        self.up = up
+        self.down = down
+        self.scale = scale
+
+    def move_to(self, device=None):
+        if device is None:
+            return 0
+        self.up = self.up.to(device=device)
+        self.down = self.down.to(device=device)
+        return self.up.nbytes + self.down.nbytes
+
+    def __call__(self, module, input, output):
+        dtype = output.dtype
+        up = comfy.model_management.cast_to_device(self.up, output.device, dtype)
+        down = comfy.model_management.cast_to_device(self.down, output.device, dtype)
+        x = input.to(dtype=dtype)
+        if up.ndim == 2:
+            h = torch.nn.functional.linear(torch.nn.functional.linear(x, down), up)
+        else:
+            # down holds the kernel of the layer and up is 1x1
+            h = module._conv_forward(x, down, None)
+            h = (torch.nn.functional.conv1d, torch.nn.functional.conv2d, torch.nn.functional.conv3d)[up.ndim - 3](h, up)
+        return output + h * self.scale
+
+
 class LoRAAdapter(WeightAdapterBase):
     name = "lora"
 
@@ -77,6 +108,24 @@ class LoRAAdapter(WeightAdapterBase):
     def to_train(self):
         return LoraDiff(self.weights)
 
+    def runtime_branch(self, weight, strength):
+        """LoraBranch that applies this LoRA to the output of the layer of weight, or None if it has to be merged."""
+        up, down, alpha, mid, dora_scale, reshape = self.weights
+        if mid is not None or dora_scale is not None or reshape is not None:
+            return None
+        if up.ndim != weight.ndim or down.ndim != weight.ndim:
+            return None
+        if up.shape[0] != weight.shape[0] or down.shape[1:] != weight.shape[1:] or up.shape[1] != down.shape[0]:
+            return None
+        if any(d != 1 for d in up.shape[2:]):
+            return None
+
+        if alpha is not None:
+            alpha = alpha / down.shape[0]
+        else:
+            alpha = 1.0
+        return LoraBranch(up, down, strength * alpha)
+
     @classmethod
     def load(
         cls,
@@ -1,7 +1,6 @@
 import builtins
 from io import BytesIO
 
-import aiohttp
 import torch
 from typing_extensions import override
 
@@ -13,6 +12,7 @@ from comfy_api_nodes.util import (
     download_url_to_video_output,
     get_fs_object_size,
     get_number_of_images,
+    get_session,
     poll_op,
     sync_op,
     upload_images_to_comfyapi,
@@ -365,15 +365,20 @@ class TopazVideoEnhance(IO.ComfyNode):
             raise NotImplementedError(
                 "Large files are not currently supported. Please open an issue in the ComfyUI repository."
             )
-        async with aiohttp.ClientSession(headers={"Content-Type": "video/mp4"}) as session:
-            if isinstance(src_video_stream, BytesIO):
-                src_video_stream.seek(0)
-                async with session.put(upload_res.urls[0], data=src_video_stream, raise_for_status=True) as res:
+        session = get_session()
+        upload_headers = {"Content-Type": "video/mp4"}
+        if isinstance(src_video_stream, BytesIO):
+            src_video_stream.seek(0)
+            async with session.put(
+                upload_res.urls[0], data=src_video_stream, headers=upload_headers, raise_for_status=True
+            ) as res:
+                upload_etag = res.headers["Etag"]
+        else:
+            with builtins.open(src_video_stream, "rb") as video_file:
+                async with session.put(
+                    upload_res.urls[0], data=video_file, headers=upload_headers, raise_for_status=True
+                ) as res:
                     upload_etag = res.headers["Etag"]
-            else:
-                with builtins.open(src_video_stream, "rb") as video_file:
-                    async with session.put(upload_res.urls[0], data=video_file, raise_for_status=True) as res:
-                        upload_etag = res.headers["Etag"]
         await sync_op(
             cls,
             ApiEndpoint(
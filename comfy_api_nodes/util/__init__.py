@@ -29,6 +29,7 @@ from .download_helpers import (
     download_url_to_image_tensor,
     download_url_to_video_output,
 )
+from .session_pool import get_session
 from .upload_helpers import (
     upload_audio_to_comfyapi,
     upload_file_to_comfyapi,
@@ -56,6 +57,7 @@ __all__ = [
     "poll_op_raw",
     "sync_op",
     "sync_op_raw",
+    "get_session",
     # Upload helpers
     "upload_audio_to_comfyapi",
     "upload_file_to_comfyapi",
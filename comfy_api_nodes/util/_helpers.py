@@ -2,9 +2,12 @@ import asyncio
 import contextlib
 import os
 import time
+import uuid
+from email.utils import parsedate_to_datetime
 from io import BytesIO
-from typing import Callable, Optional, Union
+from typing import Callable, Mapping, Optional, Union
 
+import folder_paths
 from comfy.cli_args import args
 from comfy.model_management import processing_interrupted
 from comfy_api.latest import IO
@@ -60,6 +63,31 @@ async def sleep_with_interrupt(
         await asyncio.sleep(min(1.0, end - now))
 
 
+def parse_retry_after(
+    headers: Optional[Mapping[str, str]], max_seconds: float = 300.0, min_seconds: float = 0.0
+) -> Optional[float]:
+    """Return the delay in seconds a server asks for in its Retry-After header, or None if it doesn't set one.
+
+    Both forms of the header (delay in seconds and HTTP date) are supported, the delay is clamped to
+    [min_seconds, max_seconds].
+    """
+    if not headers:
+        return None
+    value = next((v for k, v in headers.items() if k.lower() == "retry-after"), None)
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    if seconds != seconds:  # NaN
+        return None
+    return min(max(seconds, min_seconds), max_seconds)
+
+
 def mimetype_to_extension(mime_type: str) -> str:
     """Converts a MIME type to a file extension."""
     return mime_type.split("/")[-1].lower()
@@ -68,4 +96,11 @@ def mimetype_to_extension(mime_type: str) -> str:
 def get_fs_object_size(path_or_object: Union[str, BytesIO]) -> int:
     if isinstance(path_or_object, str):
         return os.path.getsize(path_or_object)
-    return len(path_or_object.getvalue())
+    return path_or_object.getbuffer().nbytes
+
+
+def temp_file_path(suffix: str) -> str:
+    """Return a new path in ComfyUI's temp directory for a file too large to be kept in memory, like a video."""
+    temp_dir = os.path.join(folder_paths.get_temp_directory(), "api_files")
+    os.makedirs(temp_dir, exist_ok=True)
+    return os.path.join(temp_dir, f"{uuid.uuid4().hex}{suffix}")
@@ -24,9 +24,11 @@ from ._helpers import (
     get_auth_header,
     get_node_id,
     is_processing_interrupted,
+    parse_retry_after,
     sleep_with_interrupt,
 )
 from .common_exceptions import ApiServerError, LocalNetworkError, ProcessingInterrupted
+from .session_pool import get_session
 
 M = TypeVar("M", bound=BaseModel)
 
@@ -64,6 +66,7 @@ class _RequestConfig:
     final_label_on_success: Optional[str] = "Completed"
     progress_origin_ts: Optional[float] = None
     price_extractor: Optional[Callable[[dict[str, Any]], Optional[float]]] = None
+    response_headers: Optional[dict[str, str]] = None
 
 
 @dataclass
@@ -193,11 +196,13 @@ async def sync_op_raw(
     final_label_on_success: Optional[str] = "Completed",
     progress_origin_ts: Optional[float] = None,
     monitor_progress: bool = True,
+    response_headers: Optional[dict[str, str]] = None,
 ) -> Union[dict[str, Any], bytes]:
     """
     Make a single network request.
       - If as_binary=False (default): returns JSON dict (or {'_raw': '<text>'} if non-JSON).
       - If as_binary=True: returns bytes.
+    If `response_headers` is given, it is filled with the headers of the successful response.
     """
     if isinstance(data, BaseModel):
         data = data.model_dump(exclude_none=True)
@@ -221,6 +226,7 @@ async def sync_op_raw(
         final_label_on_success=final_label_on_success,
         progress_origin_ts=progress_origin_ts,
         price_extractor=price_extractor,
+        response_headers=response_headers,
     )
     return await _request_base(cfg, expect_binary=as_binary)
 
@@ -249,6 +255,7 @@ async def poll_op_raw(
     """
     Polls an endpoint until the task reaches a terminal state. Displays time while queued/processing,
     checks interruption every second, and calls Cancel endpoint (if provided) on interruption.
+    Waits `poll_interval` seconds between polls unless the server asks for another delay with a Retry-After header.
 
     Uses default complete, failed and queued states assumption.
 
@@ -292,6 +299,7 @@ async def poll_op_raw(
     ticker_task = asyncio.create_task(_ticker())
     try:
         while consumed_attempts < max_poll_attempts:
+            poll_headers: dict[str, str] = {}
             try:
                 resp_json = await sync_op_raw(
                     cls,
@@ -306,6 +314,7 @@ async def poll_op_raw(
                     as_binary=False,
                     final_label_on_success=None,
                     monitor_progress=False,
+                    response_headers=poll_headers,
                 )
                 if not isinstance(resp_json, dict):
                     raise Exception("Polling endpoint returned non-JSON response.")
@@ -382,8 +391,10 @@ async def poll_op_raw(
                 logging.error(msg)
                 raise Exception(msg)
 
+            # A Retry-After of 0 (or a date in the past) must not turn polling into a busy loop
+            next_poll = parse_retry_after(poll_headers, min_seconds=poll_interval)
             try:
-                await sleep_with_interrupt(poll_interval, cls, None, None, None)
+                await sleep_with_interrupt(poll_interval if next_poll is None else next_poll, cls, None, None, None)
             except ProcessingInterrupted:
                 if cancel_endpoint:
                     with contextlib.suppress(Exception):
@@ -592,7 +603,6 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
         attempt += 1
         stop_event = asyncio.Event()
         monitor_task: Optional[asyncio.Task] = None
-        sess: Optional[aiohttp.ClientSession] = None
 
         operation_id = _generate_operation_id(method, cfg.endpoint.path, attempt)
         logging.debug("[DEBUG] HTTP %s %s (attempt %d)", method, url, attempt)
@@ -612,7 +622,7 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
                 monitor_task = asyncio.create_task(_monitor(stop_event, start_time))
 
             timeout = aiohttp.ClientTimeout(total=cfg.timeout)
-            sess = aiohttp.ClientSession(timeout=timeout)
+            sess = get_session()
 
             if cfg.content_type == "multipart/form-data" and method != "GET":
                 # aiohttp will set Content-Type boundary; remove any fixed Content-Type
@@ -664,7 +674,7 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
             except Exception as _log_e:
                 logging.debug("[DEBUG] request logging failed: %s", _log_e)
 
-            req_coro = sess.request(method, url, params=params, **payload_kw)
+            req_coro = sess.request(method, url, params=params, timeout=timeout, **payload_kw)
             req_task = asyncio.create_task(req_coro)
 
             # Race: request vs. monitor (interruption)
@@ -688,12 +698,14 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
                     except (ContentTypeError, json.JSONDecodeError):
                         body = await resp.text()
                     if resp.status in _RETRY_STATUS and attempt <= cfg.max_retries:
+                        retry_after = parse_retry_after(resp.headers)
+                        wait = delay if retry_after is None else retry_after
                         logging.warning(
                             "HTTP %s %s -> %s. Retrying in %.2fs (retry %d of %d).",
                             method,
                             url,
                             resp.status,
-                            delay,
+                            wait,
                             attempt,
                             cfg.max_retries,
                         )
@@ -711,7 +723,7 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
                             logging.debug("[DEBUG] response logging failed: %s", _log_e)
 
                         await sleep_with_interrupt(
-                            delay,
+                            wait,
                             cfg.node_cls,
                             cfg.wait_label if cfg.monitor_progress else None,
                             start_time if cfg.monitor_progress else None,
@@ -735,6 +747,8 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
                         logging.debug("[DEBUG] response logging failed: %s", _log_e)
                     raise Exception(msg)
 
+                if cfg.response_headers is not None:
+                    cfg.response_headers.update(resp.headers)
                 if expect_binary:
                     buff = bytearray()
                     last_tick = time.monotonic()
@@ -868,9 +882,6 @@ async def _request_base(cfg: _RequestConfig, expect_binary: bool):
                 monitor_task.cancel()
                 with contextlib.suppress(Exception):
                     await monitor_task
-            if sess:
-                with contextlib.suppress(Exception):
-                    await sess.close()
             if operation_succeeded and cfg.monitor_progress and cfg.final_label_on_success:
                 _display_time_progress(
                     cfg.node_cls,
@@ -110,9 +110,8 @@ def tensor_to_base64_string(
     """
     pil_image = tensor_to_pil(image_tensor, total_pixels=total_pixels)
     img_byte_arr = pil_to_bytesio(pil_image, mime_type=mime_type)
-    img_bytes = img_byte_arr.getvalue()
-    # Encode bytes to base64 string
-    base64_encoded_string = base64.b64encode(img_bytes).decode("utf-8")
+    # Encode the buffer to a base64 string without copying it to bytes first
+    base64_encoded_string = base64.b64encode(img_byte_arr.getbuffer()).decode("utf-8")
     return base64_encoded_string
 
 
@@ -171,8 +170,7 @@ def audio_to_base64_string(audio: Input.Audio, container_format: str = "mp4", co
     waveform: torch.Tensor = audio["waveform"]
     audio_data_np = audio_tensor_to_contiguous_ndarray(waveform)
     audio_bytes_io = audio_ndarray_to_bytesio(audio_data_np, sample_rate, container_format, codec_name)
-    audio_bytes = audio_bytes_io.getvalue()
-    return base64.b64encode(audio_bytes).decode("utf-8")
+    return base64.b64encode(audio_bytes_io.getbuffer()).decode("utf-8")
 
 
 def video_to_base64_string(
@@ -195,8 +193,7 @@ def video_to_base64_string(
     codec_to_use = codec if codec is not None else getattr(video, 'codec', VideoCodec.H264)
 
     video.save_to(video_bytes_io, format=format_to_use, codec=codec_to_use)
-    video_bytes_io.seek(0)
-    return base64.b64encode(video_bytes_io.getvalue()).decode("utf-8")
+    return base64.b64encode(video_bytes_io.getbuffer()).decode("utf-8")
 
 
 def audio_ndarray_to_bytesio(
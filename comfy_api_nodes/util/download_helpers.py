@@ -1,5 +1,6 @@
 import asyncio
 import contextlib
+import os
 import uuid
 from io import BytesIO
 from pathlib import Path
@@ -18,11 +19,14 @@ from ._helpers import (
     default_base_url,
     get_auth_header,
     is_processing_interrupted,
+    parse_retry_after,
     sleep_with_interrupt,
+    temp_file_path,
 )
 from .client import _diagnose_connectivity
 from .common_exceptions import ApiServerError, LocalNetworkError, ProcessingInterrupted
 from .conversions import bytesio_to_image_tensor
+from .session_pool import get_session
 
 _RETRY_STATUS = {408, 429, 500, 502, 503, 504}
 
@@ -57,6 +61,11 @@ async def download_url_to_bytesio(
     delay = retry_delay
     headers: dict[str, str] = {}
 
+    sink_start: Optional[int] = None
+    if not isinstance(dest, (str, Path)):
+        with contextlib.suppress(Exception):
+            sink_start = dest.tell()
+
     parsed_url = urlparse(url)
     if not parsed_url.scheme and not parsed_url.netloc:  # is URL relative?
         if cls is None:
@@ -71,7 +80,6 @@ async def download_url_to_bytesio(
 
         is_path_sink = isinstance(dest, (str, Path))
         fhandle = None
-        session: Optional[aiohttp.ClientSession] = None
         stop_evt: Optional[asyncio.Event] = None
         monitor_task: Optional[asyncio.Task] = None
         req_task: Optional[asyncio.Task] = None
@@ -80,7 +88,7 @@ async def download_url_to_bytesio(
             with contextlib.suppress(Exception):
                 request_logger.log_request_response(operation_id=op_id, request_method="GET", request_url=url)
 
-            session = aiohttp.ClientSession(timeout=timeout_cfg)
+            session = get_session()
             stop_evt = asyncio.Event()
 
             async def _monitor():
@@ -94,7 +102,7 @@ async def download_url_to_bytesio(
 
             monitor_task = asyncio.create_task(_monitor())
 
-            req_task = asyncio.create_task(session.get(url, headers=headers))
+            req_task = asyncio.create_task(session.get(url, headers=headers, timeout=timeout_cfg))
             done, pending = await asyncio.wait({req_task, monitor_task}, return_when=asyncio.FIRST_COMPLETED)
 
             if monitor_task in done and req_task in pending:
@@ -127,7 +135,8 @@ async def download_url_to_bytesio(
                         )
 
                     if resp.status in _RETRY_STATUS and attempt <= max_retries:
-                        await sleep_with_interrupt(delay, cls, None, None, None)
+                        retry_after = parse_retry_after(resp.headers)
+                        await sleep_with_interrupt(delay if retry_after is None else retry_after, cls, None, None, None)
                         delay *= retry_backoff
                         continue
                     raise Exception(f"Failed to download (HTTP {resp.status}).")
@@ -140,6 +149,11 @@ async def download_url_to_bytesio(
                     sink = fhandle
                 else:
                     sink = dest  # BytesIO or file-like
+                    if sink_start is not None:
+                        # Drop what a failed earlier attempt wrote before the body is streamed again
+                        with contextlib.suppress(Exception):
+                            sink.seek(sink_start)
+                            sink.truncate()
 
                 written = 0
                 while True:
@@ -207,9 +221,6 @@ async def download_url_to_bytesio(
                 req_task.cancel()
                 with contextlib.suppress(Exception):
                     await req_task
-            if session:
-                with contextlib.suppress(Exception):
-                    await session.close()
             if fhandle:
                 with contextlib.suppress(Exception):
                     fhandle.flush()
@@ -235,10 +246,23 @@ async def download_url_to_video_output(
     max_retries: int = 5,
     cls: type[COMFY_IO.ComfyNode] = None,
 ) -> VideoFromFile:
-    """Downloads a video from a URL and returns a `VIDEO` output."""
-    result = BytesIO()
-    await download_url_to_bytesio(video_url, result, timeout=timeout, max_retries=max_retries, cls=cls)
-    return VideoFromFile(result)
+    """Downloads a video from a URL and returns a `VIDEO` output.
+
+    The video is streamed to a file in the temp directory instead of memory, results can be hundreds of MB.
+    The file is left there for anything holding on to its path (previews, later nodes, the cache) and is removed
+    with the rest of the temp directory when ComfyUI starts or exits.
+    """
+    suffix = os.path.splitext(urlparse(video_url).path)[1].lower()
+    if not (2 <= len(suffix) <= 5 and suffix[1:].isalnum()):
+        suffix = ".mp4"
+    path = temp_file_path(suffix)
+    try:
+        await download_url_to_bytesio(video_url, path, timeout=timeout, max_retries=max_retries, cls=cls)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(path)
+        raise
+    return VideoFromFile(path)
 
 
 async def download_url_as_bytesio(
@@ -0,0 +1,46 @@
+import asyncio
+import weakref
+from typing import Optional
+
+import aiohttp
+
+from comfy.cli_args import args
+
+KEEPALIVE_TIMEOUT = 60.0
+
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the shared session of the running event loop.
+
+    All requests, polls, uploads and downloads of API nodes go through it, so connections (and their TLS handshakes)
+    are reused instead of being opened for every call. aiohttp sessions are bound to an event loop, the prompt
+    executor keeps its loop between prompts so the connections stay open across prompts too.
+
+    The session is owned by this module: callers pass their timeout per request and must not close it.
+    """
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=args.api_nodes_max_connections,
+            limit_per_host=args.api_nodes_max_connections_per_host,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        # Cookies set by one provider must not be sent along with the requests of later prompts or other providers
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=None),
+            cookie_jar=aiohttp.DummyCookieJar(),
+        )
+        _sessions[loop] = session
+    return session
+
+
+async def close_session() -> None:
+    """Close the shared session of the running event loop, a new one is opened on the next request."""
+    session: Optional[aiohttp.ClientSession] = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
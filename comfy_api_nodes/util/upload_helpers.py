@@ -1,6 +1,7 @@
 import asyncio
 import contextlib
 import logging
+import os
 import time
 import uuid
 from io import BytesIO
@@ -15,7 +16,13 @@ from comfy_api.latest import IO, Input
 from comfy_api.util import VideoCodec, VideoContainer
 
 from . import request_logger
-from ._helpers import is_processing_interrupted, sleep_with_interrupt
+from ._helpers import (
+    get_fs_object_size,
+    is_processing_interrupted,
+    parse_retry_after,
+    sleep_with_interrupt,
+    temp_file_path,
+)
 from .client import (
     ApiEndpoint,
     _diagnose_connectivity,
@@ -28,6 +35,7 @@ from .conversions import (
     audio_tensor_to_contiguous_ndarray,
     tensor_to_bytesio,
 )
+from .session_pool import get_session
 
 
 class UploadRequest(BaseModel):
@@ -123,23 +131,31 @@ async def upload_video_to_comfyapi(
     upload_mime_type = f"video/{container.value.lower()}"
     filename = f"uploaded_video.{container.value.lower()}"
 
-    # Convert VideoInput to BytesIO using specified container/codec
-    video_bytes_io = BytesIO()
-    video.save_to(video_bytes_io, format=container, codec=codec)
-    video_bytes_io.seek(0)
+    if container == VideoContainer.AUTO:
+        # The output format can't be inferred from a file extension, let save_to pick it for a buffer
+        video_bytes_io = BytesIO()
+        video.save_to(video_bytes_io, format=container, codec=codec)
+        return await upload_file_to_comfyapi(cls, video_bytes_io, filename, upload_mime_type, wait_label)
 
-    return await upload_file_to_comfyapi(cls, video_bytes_io, filename, upload_mime_type, wait_label)
+    # Encode the video to a temp file, it is streamed from there so it's never held in memory as a whole
+    video_path = temp_file_path(f".{container.value.lower()}")
+    try:
+        video.save_to(video_path, format=container, codec=codec)
+        return await upload_file_to_comfyapi(cls, video_path, filename, upload_mime_type, wait_label)
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(video_path)
 
 
 async def upload_file_to_comfyapi(
     cls: type[IO.ComfyNode],
-    file_bytes_io: BytesIO,
+    file_bytes_io: BytesIO | str,
     filename: str,
     upload_mime_type: str | None,
     wait_label: str | None = "Uploading",
     progress_origin_ts: float | None = None,
 ) -> str:
-    """Uploads a single file to ComfyUI API and returns its download URL."""
+    """Uploads a single file (BytesIO or filesystem path) to ComfyUI API and returns its download URL."""
     if upload_mime_type is None:
         request_object = UploadRequest(file_name=filename)
     else:
@@ -178,18 +194,14 @@ async def upload_file(
     """
     Upload a file to a signed URL (e.g., S3 pre-signed PUT) with retries, Comfy progress display, and interruption.
 
+    The body is streamed: a path is read from disk in chunks and a BytesIO is sent from its buffer without a copy.
+
     Raises:
         ProcessingInterrupted, LocalNetworkError, ApiServerError, Exception
     """
-    if isinstance(file, BytesIO):
-        with contextlib.suppress(Exception):
-            file.seek(0)
-        data = file.read()
-    elif isinstance(file, str):
-        with open(file, "rb") as f:
-            data = f.read()
-    else:
+    if not isinstance(file, (BytesIO, str)):
         raise ValueError("file must be a BytesIO or a filesystem path string")
+    data_size = get_fs_object_size(file)
 
     headers: dict[str, str] = {}
     skip_auto_headers: set[str] = set()
@@ -220,7 +232,7 @@ async def upload_file(
                 return
 
         monitor_task = asyncio.create_task(_monitor())
-        sess: Optional[aiohttp.ClientSession] = None
+        data = None
         try:
             try:
                 request_logger.log_request_response(
@@ -229,13 +241,17 @@ async def upload_file(
                     request_url=upload_url,
                     request_headers=headers or None,
                     request_params=None,
-                    request_data=f"[File data {len(data)} bytes]",
+                    request_data=f"[File data {data_size} bytes]",
                 )
             except Exception as e:
                 logging.debug("[DEBUG] upload request logging failed: %s", e)
 
-            sess = aiohttp.ClientSession(timeout=timeout)
-            req = sess.put(upload_url, data=data, headers=headers, skip_auto_headers=skip_auto_headers)
+            # A fresh body for every attempt, aiohttp closes file bodies once they are sent
+            data = file.getbuffer() if isinstance(file, BytesIO) else open(file, "rb")
+            sess = get_session()
+            req = sess.put(
+                upload_url, data=data, headers=headers, skip_auto_headers=skip_auto_headers, timeout=timeout
+            )
             req_task = asyncio.create_task(req)
 
             done, pending = await asyncio.wait({req_task, monitor_task}, return_when=asyncio.FIRST_COMPLETED)
@@ -267,8 +283,9 @@ async def upload_file(
                             error_message=msg,
                         )
                     if resp.status in {408, 429, 500, 502, 503, 504} and attempt <= max_retries:
+                        retry_after = parse_retry_after(resp.headers)
                         await sleep_with_interrupt(
-                            delay,
+                            delay if retry_after is None else retry_after,
                             cls,
                             wait_label,
                             start_ts,
@@ -300,7 +317,7 @@ async def upload_file(
                         request_method="PUT",
                         request_url=upload_url,
                         request_headers=headers or None,
-                        request_data=f"[File data {len(data)} bytes]",
+                        request_data=f"[File data {data_size} bytes]",
                         error_message=f"{type(e).__name__}: {str(e)} (will retry)",
                     )
                 await sleep_with_interrupt(
@@ -321,14 +338,17 @@ async def upload_file(
                 ) from e
             raise ApiServerError("The API service appears unreachable at this time.") from e
         finally:
+            # Closes the file, or releases the BytesIO buffer so it can be resized again
+            with contextlib.suppress(Exception):
+                if isinstance(data, memoryview):
+                    data.release()
+                elif data is not None:
+                    data.close()
             stop_evt.set()
             if monitor_task:
                 monitor_task.cancel()
                 with contextlib.suppress(Exception):
                     await monitor_task
-            if sess:
-                with contextlib.suppress(Exception):
-                    await sess.close()
 
 
 def _generate_operation_id(method: str, url: str, attempt: int, op_uuid: str) -> str:
@@ -1,14 +1,27 @@
-import bisect
 import gc
+import hashlib
+import heapq
+import inspect
 import itertools
+import json
+import logging
+import math
+import os
 import psutil
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import safetensors
+import safetensors.torch
 import torch
 from typing import Sequence, Mapping, Dict
 from comfy_execution.graph import DynamicPrompt
 from abc import ABC, abstractmethod
 
 import nodes
+import comfy.model_patcher
+import comfyui_version
+import folder_paths
 
 from comfy_execution.graph_utils import is_link
 
@@ -169,6 +182,9 @@ class BasicCache:
             node_ids = node_ids.union(subcache.all_node_ids())
         return node_ids
 
+    def has(self, node_id):
+        return self.get(node_id) is not None
+
     def _clean_cache(self):
         preserve_keys = set(self.cache_key_set.get_used_keys())
         to_remove = []
@@ -290,6 +306,9 @@ class NullCache:
     def get(self, node_id):
         return None
 
+    def has(self, node_id):
+        return False
+
     def set(self, node_id, value):
         pass
 
@@ -349,13 +368,39 @@ class LRUCache(BasicCache):
         return self
 
 
-#Iterating the cache for usage analysis might be expensive, so if we trigger make sure
-#to take a chunk out to give breathing space on high-node / low-ram-per-node flows.
+def get_value_size(value, seen=None):
+    """
+    Returns the number of bytes held by a cached value: tensors on any device (counted once per storage, so views
+    and tensors shared between outputs aren't counted twice), objects that report get_ram_usage() and any lists,
+    tuples and dicts containing them, such as LATENT dicts and CONDITIONING lists.
+    """
+    if seen is None:
+        seen = set()
+    if isinstance(value, torch.Tensor):
+        try:
+            storage = value.untyped_storage()
+            storage_key = (value.device, storage.data_ptr())
+            if storage_key in seen:
+                return 0
+            seen.add(storage_key)
+            return storage.nbytes()
+        except Exception:
+            return value.numel() * value.element_size()
+    if isinstance(value, (list, tuple)):
+        return sum(get_value_size(v, seen) for v in value)
+    if isinstance(value, dict):
+        return sum(get_value_size(v, seen) for v in value.values())
+    if hasattr(value, "get_ram_usage") and id(value) not in seen:
+        seen.add(id(value))
+        return value.get_ram_usage()
+    return 0
+
+#Eviction takes a chunk out to give breathing space on high-node / low-ram-per-node flows.
 
 RAM_CACHE_HYSTERESIS = 1.1
 
-#This is kinda in GB but not really. It needs to be non-zero for the below heuristic
-#and as long as Multi GB models dwarf this it will approximate OOM scoring OK
+#Added to every entry size so the below heuristic still has something to work with when
+#there is no information on the node ram usage at all.
 
 RAM_CACHE_DEFAULT_RAM_USAGE = 0.1
 
@@ -365,21 +410,51 @@ RAM_CACHE_DEFAULT_RAM_USAGE = 0.1
 RAM_CACHE_OLD_WORKFLOW_OOM_MULTIPLIER = 1.3
 
 class RAMPressureCache(LRUCache):
+    """
+    Evicts the entries with the highest OOM score when available RAM drops below the headroom.
+    The OOM score is size * RAM_CACHE_OLD_WORKFLOW_OOM_MULTIPLIER ** (generation - used_generation). The current
+    generation is a common factor, so entries are kept in a max-heap on log(size) - used_generation * log(multiplier)
+    which only changes when an entry is used. Using an entry pushes a new record and the stale one is skipped when popped.
+    """
 
     def __init__(self, key_class):
         super().__init__(key_class, 0)
         self.timestamps = {}
+        self.sizes = {}
+        self.heap = []
+        self.heap_counter = itertools.count()
+        self.heap_versions = {}
 
     def clean_unused(self):
         self._clean_subcaches()
 
+    def _push(self, key):
+        priority = math.log(self.sizes[key]) - self.used_generation[key] * math.log(RAM_CACHE_OLD_WORKFLOW_OOM_MULTIPLIER)
+        version = next(self.heap_counter)
+        self.heap_versions[key] = version
+        #Break OOM score ties on the last touch timestamp (pure LRU)
+        heapq.heappush(self.heap, (-priority, self.timestamps[key], version, key))
+        if len(self.heap) > 2 * len(self.cache) + 64:
+            self.heap = [record for record in self.heap if self._is_current(record)]
+            heapq.heapify(self.heap)
+
+    def _is_current(self, record):
+        _, _, version, key = record
+        return key in self.cache and self.heap_versions.get(key) == version
+
+    def _mark_used(self, node_id):
+        super()._mark_used(node_id)
+        cache_key = self.cache_key_set.get_data_key(node_id)
+        if cache_key in self.sizes:
+            self.timestamps[cache_key] = time.time()
+            self._push(cache_key)
+
     def set(self, node_id, value):
-        self.timestamps[self.cache_key_set.get_data_key(node_id)] = time.time()
         super().set(node_id, value)
-
-    def get(self, node_id):
-        self.timestamps[self.cache_key_set.get_data_key(node_id)] = time.time()
-        return super().get(node_id)
+        cache_key = self.cache_key_set.get_data_key(node_id)
+        self.sizes[cache_key] = get_value_size(value) + RAM_CACHE_DEFAULT_RAM_USAGE
+        self.timestamps[cache_key] = time.time()
+        self._push(cache_key)
 
     def poll(self, ram_headroom):
         def _ram_gb():
@@ -387,37 +462,295 @@ class RAMPressureCache(LRUCache):
 
         if _ram_gb() > ram_headroom:
             return
+        # Patched weights are only a speedup, they go before any cached output
+        comfy.model_patcher.LOWVRAM_PATCH_CACHE.clear()
         gc.collect()
-        if _ram_gb() > ram_headroom:
+        while self.heap:
+            deficit = (ram_headroom * RAM_CACHE_HYSTERESIS - _ram_gb()) * (1024**3)
+            if deficit <= 0:
+                break
+            #Evict enough entries to cover the deficit before paying for a collection
+            while self.heap and deficit > 0:
+                record = heapq.heappop(self.heap)
+                if not self._is_current(record):
+                    continue
+                key = record[3]
+                deficit -= self.sizes.pop(key)
+                del self.cache[key]
+                del self.timestamps[key]
+                del self.heap_versions[key]
+            gc.collect()
+
+
+DISK_CACHE_FORMAT_VERSION = 1
+
+class NotPersistable(Exception):
+    pass
+
+def signature_digest(obj):
+    """
+    Returns a stable hex digest of a hashable cache key, or None if the key can't be reproduced by another process
+    (it contains Unhashable values or NaN, which is what IS_CHANGED uses to mean 'always execute').
+    frozensets don't have a stable iteration order across processes so their members are sorted by digest.
+    """
+    def encode(o):
+        if o is None:
+            return "N"
+        if isinstance(o, bool):
+            return "B" + ("1" if o else "0")
+        if isinstance(o, int):
+            return "I" + str(o)
+        if isinstance(o, float):
+            if math.isnan(o):
+                raise NotPersistable()
+            return "F" + repr(o)
+        if isinstance(o, str):
+            return "S" + json.dumps(o)
+        if isinstance(o, bytes):
+            return "Y" + o.hex()
+        if isinstance(o, tuple):
+            return "T(" + ",".join(encode(x) for x in o) + ")"
+        if isinstance(o, frozenset):
+            return "Z(" + ",".join(sorted(encode(x) for x in o)) + ")"
+        raise NotPersistable()
+
+    try:
+        encoded = encode(obj)
+    except NotPersistable:
+        return None
+    return hashlib.sha256("v{}:{}".format(DISK_CACHE_FORMAT_VERSION, encoded).encode("utf-8")).hexdigest()
+
+def pack_value(value, tensors):
+    """
+    Converts nested lists, tuples, dicts, tensors and primitives into a JSON structure. Tensors are stored in
+    the tensors dict and referenced by name. Raises NotPersistable for anything else.
+    """
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float):
+        return {"float": repr(value)}
+    if isinstance(value, torch.Tensor):
+        for name, tensor in tensors.items():
+            if tensor is value:
+                return {"tensor": name}
+        name = "t{}".format(len(tensors))
+        tensors[name] = value
+        return {"tensor": name}
+    if isinstance(value, list):
+        return {"list": [pack_value(x, tensors) for x in value]}
+    if isinstance(value, tuple):
+        return {"tuple": [pack_value(x, tensors) for x in value]}
+    if isinstance(value, dict):
+        if not all(isinstance(k, str) for k in value):
+            raise NotPersistable()
+        return {"dict": {k: pack_value(v, tensors) for k, v in value.items()}}
+    raise NotPersistable()
+
+def unpack_value(packed, tensors):
+    if not isinstance(packed, dict):
+        return packed
+    if "float" in packed:
+        return float(packed["float"])
+    if "tensor" in packed:
+        return tensors[packed["tensor"]]
+    if "list" in packed:
+        return [unpack_value(x, tensors) for x in packed["list"]]
+    if "tuple" in packed:
+        return tuple(unpack_value(x, tensors) for x in packed["tuple"])
+    return {k: unpack_value(v, tensors) for k, v in packed["dict"].items()}
+
+DISK_CACHE_EVICT_TARGET = 0.9
+
+def file_identity(path):
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+class DiskCache:
+    """
+    Persistent tier in front of an in-memory output cache. Outputs of node classes that opt in with
+    PERSISTENT_CACHE = True are written to a directory as safetensors files named after a digest of their input
+    signature, so they survive restarts and can be shared by several processes using the same directory.
+    Entries are evicted least recently used first once the directory grows past max_size bytes.
+
+    Input signatures only contain file names, so the digest also covers the ComfyUI version, the size and mtime of the
+    source files of the node classes involved and of the model files their inputs refer to. Model files are found with
+    get_prompt_models and looked up in the folder their loader input lists them from. Replacing a model file or
+    updating a node pack doesn't reuse outputs computed with the old one.
+
+    Entries are written on a background thread so saving large outputs doesn't hold up the execution.
+    """
+    def __init__(self, inner, directory, max_size, entry_class, get_prompt_models):
+        self.inner = inner
+        self.directory = directory
+        self.max_size = max_size
+        self.entry_class = entry_class
+        self.get_prompt_models = get_prompt_models
+        self.key_set = None
+        self.code_identities = {}
+        self.model_paths = {}
+        os.makedirs(self.directory, exist_ok=True)
+        self.total_size = sum(size for _, size, _ in self._scan())
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="disk_cache")
+        # Path -> future of the entries still being written
+        self.pending = {}
+
+    def _scan(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith(".safetensors"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _is_persistent(self, node_id):
+        class_type = self.dynprompt.get_node(node_id)["class_type"]
+        class_def = nodes.NODE_CLASS_MAPPINGS[class_type]
+        return getattr(class_def, "PERSISTENT_CACHE", False) is True
+
+    def _get_path(self, node_id):
+        if self.key_set is None or not self.dynprompt.has_node(node_id) or not self._is_persistent(node_id):
+            return None
+        key = self.key_set.get_data_key(node_id)
+        if key is None:
+            return None
+        digest = signature_digest((key, self._identity(node_id)))
+        if digest is None:
+            return None
+        return os.path.join(self.directory, digest + ".safetensors")
+
+    def _code_identity(self, class_type):
+        # The code that runs is the one loaded at startup, its files are only looked at once
+        if class_type not in self.code_identities:
+            try:
+                source = inspect.getfile(nodes.NODE_CLASS_MAPPINGS[class_type])
+            except (KeyError, TypeError, OSError):
+                source = None
+            self.code_identities[class_type] = (class_type, file_identity(source))
+        return self.code_identities[class_type]
+
+    def _model_identity(self, folder_name, name):
+        path = self.model_paths.get((folder_name, name), None)
+        identity = file_identity(path)
+        if identity is None and folder_name is not None:
+            path = folder_paths.get_full_path(folder_name, name)
+            self.model_paths[(folder_name, name)] = path
+            identity = file_identity(path)
+        return (folder_name, name, identity)
+
+    def _identity(self, node_id):
+        ancestors, _ = self.key_set.get_ordered_ancestry(self.dynprompt, node_id)
+        prompt = {n: self.dynprompt.get_node(n) for n in [node_id] + ancestors if self.dynprompt.has_node(n)}
+        code = frozenset(self._code_identity(node["class_type"]) for node in prompt.values())
+        models = frozenset(self._model_identity(folder_name, name) for folder_name, name in self.get_prompt_models(prompt, folders=True))
+        return (comfyui_version.__version__, code, models)
+
+    async def set_prompt(self, dynprompt, node_ids, is_changed_cache):
+        await self.inner.set_prompt(dynprompt, node_ids, is_changed_cache)
+        self.dynprompt = dynprompt
+        self.key_set = CacheKeySetInputSignature(dynprompt, node_ids, is_changed_cache)
+        await self.key_set.add_keys(node_ids)
+
+    def all_node_ids(self):
+        return self.inner.all_node_ids()
+
+    def clean_unused(self):
+        self.inner.clean_unused()
+
+    def poll(self, **kwargs):
+        self.inner.poll(**kwargs)
+
+    def has(self, node_id):
+        """Like get, but only checks for the entry file instead of loading it."""
+        if self.inner.has(node_id):
+            return True
+        path = self._get_path(node_id)
+        return path is not None and (path in self.pending or os.path.exists(path))
+
+    def get(self, node_id):
+        value = self.inner.get(node_id)
+        if value is not None:
+            return value
+        path = self._get_path(node_id)
+        if path is None:
+            return None
+        future = self.pending.get(path, None)
+        if future is not None:
+            future.result()
+        if not os.path.exists(path):
+            return None
+        try:
+            with safetensors.safe_open(path, framework="pt", device="cpu") as f:
+                tensors = {k: f.get_tensor(k) for k in f.keys()}
+                metadata = f.metadata()
+            value = self.entry_class(ui=json.loads(metadata["ui"]), outputs=unpack_value(json.loads(metadata["outputs"]), tensors))
+            os.utime(path)
+        except Exception as e:
+            logging.warning("Failed to load disk cache entry {}: {}".format(path, e))
+            return None
+        self.inner.set(node_id, value)
+        return value
+
+    def set(self, node_id, value):
+        self.inner.set(node_id, value)
+        path = self._get_path(node_id)
+        if path is None or path in self.pending or os.path.exists(path):
+            return
+        tensors = {}
+        try:
+            metadata = {
+                "ui": json.dumps(value.ui),
+                "outputs": json.dumps(pack_value(value.outputs, tensors)),
+            }
+        except (NotPersistable, TypeError, ValueError):
             return
+        future = self.writer.submit(self._write, path, tensors, metadata)
+        self.pending[path] = future
+        future.add_done_callback(lambda f: self.pending.pop(path, None))
+
+    def flush(self):
+        """Waits for the entries being written."""
+        for future in list(self.pending.values()):
+            future.result()
+
+    def _write(self, path, tensors, metadata):
+        temp_path = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+        try:
+            tensors = {k: v.detach().to("cpu").contiguous() for k, v in tensors.items()}
+            safetensors.torch.save_file(tensors, temp_path, metadata=metadata)
+            os.replace(temp_path, path)
+        except Exception as e:
+            logging.warning("Failed to write disk cache entry {}: {}".format(path, e))
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self.total_size += os.path.getsize(path)
+        if self.total_size > self.max_size:
+            self._evict()
+
+    def _evict(self):
+        # Rescan since other processes may be sharing the directory
+        entries = sorted(self._scan(), key=lambda e: e[2])
+        self.total_size = sum(size for _, size, _ in entries)
+        target = self.max_size * DISK_CACHE_EVICT_TARGET
+        for path, size, _ in entries:
+            if self.total_size <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_size -= size
 
-        clean_list = []
-
-        for key, (outputs, _), in self.cache.items():
-            oom_score =  RAM_CACHE_OLD_WORKFLOW_OOM_MULTIPLIER ** (self.generation - self.used_generation[key])
-
-            ram_usage = RAM_CACHE_DEFAULT_RAM_USAGE
-            def scan_list_for_ram_usage(outputs):
-                nonlocal ram_usage
-                if outputs is None:
-                    return
-                for output in outputs:
-                    if isinstance(output, list):
-                        scan_list_for_ram_usage(output)
-                    elif isinstance(output, torch.Tensor) and output.device.type == 'cpu':
-                        #score Tensors at a 50% discount for RAM usage as they are likely to
-                        #be high value intermediates
-                        ram_usage += (output.numel() * output.element_size()) * 0.5
-                    elif hasattr(output, "get_ram_usage"):
-                        ram_usage += output.get_ram_usage()
-            scan_list_for_ram_usage(outputs)
-
-            oom_score *= ram_usage
-            #In the case where we have no information on the node ram usage at all,
-            #break OOM score ties on the last touch timestamp (pure LRU)
-            bisect.insort(clean_list, (oom_score, self.timestamps[key], key))
-
-        while _ram_gb() < ram_headroom * RAM_CACHE_HYSTERESIS and clean_list:
-            _, _, key = clean_list.pop()
-            del self.cache[key]
-            gc.collect()
+    async def ensure_subcache_for(self, node_id, children_ids):
+        await self.key_set.add_keys(children_ids)
+        return await self.inner.ensure_subcache_for(node_id, children_ids)
+
+    def recursive_debug_dump(self):
+        return self.inner.recursive_debug_dump()
@@ -195,6 +195,7 @@ class ExecutionList(TopologicalSort):
         super().__init__(dynprompt)
         self.output_cache = output_cache
         self.staged_node_id = None
+        self.staged_node_ids = set()
         self.execution_cache = {}
         self.execution_cache_listeners = {}
 
@@ -262,6 +263,30 @@ class ExecutionList(TopologicalSort):
         self.staged_node_id = self.ux_friendly_pick_node(available)
         return self.staged_node_id, None, None
 
+    async def stage_ready_nodes(self, in_flight=False):
+        """
+        Stages every node that is ready to execute and isn't already staged, ordered so that the nodes
+        ux_friendly_pick_node would prefer come first. Used by parallel execution, where several nodes can
+        be in flight at once. Returns an empty list when nothing new is ready but staged nodes are still running.
+        """
+        available = [node_id for node_id in self.get_ready_nodes() if node_id not in self.staged_node_ids]
+        if len(available) == 0 and not in_flight:
+            if self.is_empty():
+                return [], None, None
+            node_id, error_details, ex = await self.stage_node_execution()
+            if node_id is None:
+                return [], error_details, ex
+            self.staged_node_id = None
+            available = [node_id]
+
+        ordered = []
+        while len(available) > 0:
+            node_id = self.ux_friendly_pick_node(available)
+            available.remove(node_id)
+            ordered.append(node_id)
+        self.staged_node_ids.update(ordered)
+        return ordered, None, None
+
     def ux_friendly_pick_node(self, node_list):
         # If an output node is available, do that first.
         # Technically this has no effect on the overall length of execution, but it feels better as a user
@@ -301,16 +326,22 @@ class ExecutionList(TopologicalSort):
         #TODO: this function should be improved
         return node_list[0]
 
-    def unstage_node_execution(self):
+    def unstage_node_execution(self, node_id=None):
+        if node_id is not None:
+            self.staged_node_ids.discard(node_id)
+            return
         assert self.staged_node_id is not None
         self.staged_node_id = None
 
-    def complete_node_execution(self):
-        node_id = self.staged_node_id
+    def complete_node_execution(self, node_id=None):
+        if node_id is None:
+            node_id = self.staged_node_id
+            self.staged_node_id = None
+        else:
+            self.staged_node_ids.discard(node_id)
         self.pop_node(node_id)
         self.execution_cache.pop(node_id, None)
         self.execution_cache_listeners.pop(node_id, None)
-        self.staged_node_id = None
 
     def get_nodes_in_cycle(self):
         # We'll dissolve the graph in reverse topological order to leave only the nodes in the cycle.
@@ -1,3 +1,5 @@
+import threading
+
 def is_link(obj):
     if not isinstance(obj, list):
         return False
@@ -14,6 +16,8 @@ class GraphBuilder:
     _default_prefix_root = ""
     _default_prefix_call_index = 0
     _default_prefix_graph_index = 0
+    # Nodes can run on worker threads when parallel execution is enabled, so the default prefix is tracked per thread.
+    _default_prefix_local = threading.local()
 
     def __init__(self, prefix = None):
         if prefix is None:
@@ -25,20 +29,22 @@ class GraphBuilder:
 
     @classmethod
     def set_default_prefix(cls, prefix_root, call_index, graph_index = 0):
-        cls._default_prefix_root = prefix_root
-        cls._default_prefix_call_index = call_index
-        cls._default_prefix_graph_index = graph_index
+        local = GraphBuilder._default_prefix_local
+        local.root = prefix_root
+        local.call_index = call_index
+        local.graph_index = graph_index
 
     @classmethod
     def alloc_prefix(cls, root=None, call_index=None, graph_index=None):
+        local = GraphBuilder._default_prefix_local
         if root is None:
-            root = GraphBuilder._default_prefix_root
+            root = getattr(local, "root", GraphBuilder._default_prefix_root)
         if call_index is None:
-            call_index = GraphBuilder._default_prefix_call_index
+            call_index = getattr(local, "call_index", GraphBuilder._default_prefix_call_index)
         if graph_index is None:
-            graph_index = GraphBuilder._default_prefix_graph_index
+            graph_index = getattr(local, "graph_index", GraphBuilder._default_prefix_graph_index)
         result = f"{root}.{call_index}.{graph_index}."
-        GraphBuilder._default_prefix_graph_index += 1
+        local.graph_index = getattr(local, "graph_index", GraphBuilder._default_prefix_graph_index) + 1
         return result
 
     def node(self, class_type, id=None, **kwargs):
@@ -0,0 +1,128 @@
+import collections
+import logging
+import os
+import threading
+
+import psutil
+
+import folder_paths
+
+# Folders that never hold model files a loader reads
+SKIPPED_FOLDERS = frozenset(["custom_nodes", "configs"])
+
+class ModelPrefetcher:
+    """
+    Warms the OS page cache with the model files of the next queued prompts while the current one executes, so their
+    loader nodes read from RAM instead of waiting on the disk.
+
+    Only the first depth queued prompts are looked at. Model files are found with get_prompt_models and resolved
+    through folder_paths. Files are read once on a single background thread and skipped if they don't fit in the
+    available RAM, they would only push the files of the running prompt out of the page cache. A file being read is
+    left for later when the queue changes, reading continues where it stopped once the new queue was looked at.
+    """
+    READ_SIZE = 16 * 1024 * 1024
+    # How many warmed files are remembered so they aren't read again for every queued prompt using them
+    WARMED_HISTORY = 64
+
+    def __init__(self, queue, get_prompt_models, depth=2, poll_interval=0.5):
+        self.queue = queue
+        self.get_prompt_models = get_prompt_models
+        self.depth = depth
+        self.poll_interval = poll_interval
+        self.warmed = collections.OrderedDict()
+        # File key -> offset reading stopped at
+        self.partial = collections.OrderedDict()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True, name="model_prefetch")
+        self.thread.start()
+        logging.info("Prefetching the models of the next {} queued prompts.".format(self.depth))
+
+    def stop(self):
+        self.stop_event.set()
+
+    def resolve(self, name):
+        """Full path of a model file referenced by a prompt, or None if it isn't in any model folder."""
+        for folder_name in folder_paths.folder_names_and_paths:
+            if folder_name in SKIPPED_FOLDERS:
+                continue
+            full_path = folder_paths.get_full_path(folder_name, name)
+            if full_path is not None:
+                return full_path
+        return None
+
+    def pending_files(self):
+        _, queued = self.queue.get_current_queue_volatile()
+        files = []
+        for item in queued[:self.depth]:
+            for name in sorted(self.get_prompt_models(item[2])):
+                full_path = self.resolve(name)
+                if full_path is not None and full_path not in files:
+                    files.append(full_path)
+        return files
+
+    def _file_key(self, path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (path, stat.st_size, stat.st_mtime)
+
+    def warm(self, path, version=None):
+        """
+        Reads path into the page cache, returns True if it was read completely. Reading stops early when the
+        prefetcher is stopped or the queue version isn't version anymore.
+        """
+        key = self._file_key(path)
+        if key is None:
+            return False
+        if key in self.warmed:
+            self.warmed.move_to_end(key)
+            return False
+        size = key[1]
+        if size > psutil.virtual_memory().available // 2:
+            logging.debug("Not prefetching {}, it doesn't fit in the available RAM.".format(path))
+            return False
+
+        buffer = bytearray(self.READ_SIZE)
+        offset = self.partial.pop(key, 0)
+        complete = False
+        with open(path, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            f.seek(offset)
+            # Checked between reads so a newly queued prompt doesn't wait for a large file to finish
+            while not self.stop_event.is_set() and (version is None or self.queue.version == version):
+                read = f.readinto(buffer)
+                if read == 0:
+                    complete = True
+                    break
+                offset += read
+
+        if not complete:
+            self.partial[key] = offset
+            while len(self.partial) > self.WARMED_HISTORY:
+                self.partial.popitem(last=False)
+            return False
+
+        self.warmed[key] = None
+        while len(self.warmed) > self.WARMED_HISTORY:
+            self.warmed.popitem(last=False)
+        logging.debug("Prefetched {}".format(path))
+        return True
+
+    def _run(self):
+        version = None
+        while not self.stop_event.wait(self.poll_interval):
+            if self.queue.version == version:
+                continue
+            version = self.queue.version
+            try:
+                for path in self.pending_files():
+                    if self.stop_event.is_set() or self.queue.version != version:
+                        break
+                    self.warm(path, version)
+            except Exception as e:
+                logging.warning("Model prefetch failed: {}".format(e))
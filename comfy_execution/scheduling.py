@@ -0,0 +1,62 @@
+import asyncio
+import contextvars
+import inspect
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+import comfy.model_management
+
+# Core nodes that only do plain tensor, PIL or file work on the CPU. Other nodes may run models or move tensors to
+# the device even when their inputs and outputs are images and primitives, they stay on the device lane unless they
+# set CPU_BOUND = True.
+CPU_BOUND_NODES = frozenset([
+    "LoadImage", "LoadImageMask", "EmptyImage", "ImageScale", "ImageScaleBy", "ImageInvert", "ImageBatch",
+    "ImagePadForOutpaint", "ImageCrop", "ImageFlip", "ImageRotate", "ImageStitch", "RepeatImageBatch",
+    "ImageFromBatch", "ImageBlend", "ImageQuantize", "ImageCompositeMasked", "MaskToImage", "ImageToMask",
+    "ImageColorToMask", "SolidMask", "InvertMask", "CropMask", "MaskComposite", "FeatherMask", "GrowMask",
+    "ThresholdMask",
+])
+# Modules the allowlisted nodes come from, so a custom node registered under one of their names isn't trusted
+CORE_NODE_MODULES = ("nodes", "comfy_extras")
+
+class NodeScheduler:
+    """
+    Decides where the function of a node runs when parallel execution is enabled.
+
+    CPU-bound nodes are dispatched to a thread pool so independent branches of the graph overlap. Everything else
+    (including output nodes) may touch models or shared files and is serialized on a single device lane, which keeps
+    model management single threaded.
+    A node is CPU-bound when its class sets CPU_BOUND = True or when it is one of the core CPU_BOUND_NODES.
+    When device is set, the threads use it as their torch device (see comfy.model_management.set_torch_device).
+    """
+    def __init__(self, num_threads, device=None):
+        self.num_threads = max(1, num_threads)
+        initializer = lambda: comfy.model_management.set_torch_device(device)
+        self.cpu_pool = ThreadPoolExecutor(max_workers=self.num_threads, thread_name_prefix="comfy_cpu", initializer=initializer)
+        self.device_lane = ThreadPoolExecutor(max_workers=1, thread_name_prefix="comfy_device", initializer=initializer)
+        logging.info("Parallel execution enabled with {} CPU threads.".format(self.num_threads))
+
+    def is_cpu_bound(self, class_def, class_type=None):
+        result = getattr(class_def, "CPU_BOUND", None)
+        if result is not None:
+            return result is True
+        return class_type in CPU_BOUND_NODES and class_def.__module__.split(".")[0] in CORE_NODE_MODULES
+
+    def get_node_executor(self, class_def, class_type=None):
+        """
+        Returns a coroutine function that runs a node call on the right lane, or None if the node should keep
+        running on the event loop (async nodes already overlap with everything else).
+        """
+        if inspect.iscoroutinefunction(getattr(class_def, class_def.FUNCTION, None)):
+            return None
+        pool = self.cpu_pool if self.is_cpu_bound(class_def, class_type) else self.device_lane
+
+        async def run(f):
+            context = contextvars.copy_context()
+            def call():
+                with torch.inference_mode():
+                    return context.run(f)
+            return await asyncio.get_running_loop().run_in_executor(pool, call)
+        return run
@@ -77,12 +77,18 @@ class ImageUpscaleWithModel(io.ComfyNode):
         tile = 512
         overlap = 32
 
+        # Same estimate as above, per tile: as many tiles as fit in the free memory are upscaled together
+        tile_memory = lambda shape: shape[1] * shape[2] * shape[3] * image.element_size() * max(upscale_model.scale, 1.0) * 384.0
+        tile_batch_size = lambda shape: model_management.get_free_memory(device) / tile_memory(shape)
+        output_size = in_img.shape[0] * (in_img.shape[1] + 1) * in_img.shape[2] * in_img.shape[3] * upscale_model.scale * upscale_model.scale * 4
+        accumulate_device = device if model_management.get_free_memory(device) > output_size * 2 else None
+
         oom = True
         while oom:
             try:
                 steps = in_img.shape[0] * comfy.utils.get_tiled_scale_steps(in_img.shape[3], in_img.shape[2], tile_x=tile, tile_y=tile, overlap=overlap)
                 pbar = comfy.utils.ProgressBar(steps)
-                s = comfy.utils.tiled_scale(in_img, lambda a: upscale_model(a), tile_x=tile, tile_y=tile, overlap=overlap, upscale_amount=upscale_model.scale, pbar=pbar)
+                s = comfy.utils.tiled_scale(in_img, lambda a: upscale_model(a), tile_x=tile, tile_y=tile, overlap=overlap, upscale_amount=upscale_model.scale, pbar=pbar, tile_batch_size=tile_batch_size, accumulate_device=accumulate_device)
                 oom = False
             except model_management.OOM_EXCEPTION as e:
                 tile //= 2
@@ -1,6 +1,9 @@
 # (c) City96 || Apache-2.0 (apache.org/licenses/LICENSE-2.0)
+import os
 import gguf
 import torch
+import logging
+import importlib.util
 from tqdm import tqdm
 
 
@@ -32,7 +35,6 @@ def dequantize(data, qtype, oshape, dtype=None):
     Dequantize tensor back to usable shape/dtype
     """
     block_size, type_size = gguf.GGML_QUANT_SIZES[qtype]
-    dequantize_blocks = dequantize_functions[qtype]
 
     rows = data.reshape(
         (-1, data.shape[-1])
@@ -40,9 +42,40 @@ def dequantize(data, qtype, oshape, dtype=None):
 
     n_blocks = rows.numel() // type_size
     blocks = rows.reshape((n_blocks, type_size))
-    blocks = dequantize_blocks(blocks, block_size, type_size, dtype)
+    blocks = dequantize_blocks(blocks, qtype, block_size, type_size, dtype)
     return blocks.reshape(oshape)
 
+# torch.compile fuses the many small ops of each dequant function into a few kernels.
+# Opt-in with COMFYUI_GGUF_COMPILE_DEQUANT=1 until tools/bench_dequant.py shows it's faster on common setups.
+# Only used on CUDA with triton available.
+ALLOW_COMPILE = os.environ.get("COMFYUI_GGUF_COMPILE_DEQUANT", "0") == "1"
+compiled_functions = {}
+compile_failed = set()
+
+def compile_available(device):
+    return (
+        ALLOW_COMPILE and device.type == "cuda" and hasattr(torch, "compile")
+        and importlib.util.find_spec("triton") is not None
+    )
+
+def dequantize_blocks(blocks, qtype, block_size, type_size, dtype=None):
+    function = dequantize_functions[qtype]
+    # built before compiling so the traced functions only read the table cache
+    get_luts(blocks.device)
+    if qtype in compile_failed or not compile_available(blocks.device):
+        return function(blocks, block_size, type_size, dtype)
+
+    compiled = compiled_functions.get(qtype)
+    if compiled is None:
+        compiled = torch.compile(function, dynamic=True)
+        compiled_functions[qtype] = compiled
+    try:
+        return compiled(blocks, block_size, type_size, dtype)
+    except Exception as e:
+        logging.warning(f"ComfyUI-GGUF: torch.compile failed for {getattr(qtype, 'name', repr(qtype))}, using eager dequant: {e}")
+        compile_failed.add(qtype)
+        return function(blocks, block_size, type_size, dtype)
+
 def to_uint32(x):
     # no uint32 :(
     x = x.view(torch.uint8).to(torch.int32)
@@ -57,6 +90,31 @@ def split_block_dims(blocks, *args):
     dims = list(args) + [n_max - sum(args)]
     return torch.split(blocks, dims, dim=1)
 
+# Lookup tables #
+# Constant tensors of the dequant functions, built once per device instead of being copied over on every call
+KVALUES = torch.tensor([-127, -104, -83, -65, -49, -35, -22, -10, 1, 13, 25, 38, 53, 69, 89, 113], dtype=torch.int8)
+
+def build_luts():
+    byte = torch.arange(256, dtype=torch.int32)
+    return {
+        "shift_nibble": torch.tensor([0, 4], dtype=torch.uint8),
+        "shift_2bit": torch.tensor([0, 2, 4, 6], dtype=torch.uint8),
+        "shift_bit": torch.arange(8, dtype=torch.uint8),
+        "shift_bit32": torch.arange(32, dtype=torch.int32),
+        "shift_iq4_xs": torch.arange(0, QK_K // 16, 2, dtype=torch.uint8),
+        # IQ4 values of the low and high nibble of every byte, one lookup replaces the shift, mask and gather
+        "iq4_pairs": torch.stack([KVALUES[byte & 0x0F], KVALUES[byte >> 4]], dim=-1),
+    }
+
+luts = {}
+
+def get_luts(device):
+    tables = luts.get(device)
+    if tables is None:
+        tables = {k: v.to(device) for k, v in build_luts().items()}
+        luts[device] = tables
+    return tables
+
 # Full weights #
 def dequantize_blocks_BF16(blocks, block_size, type_size, dtype=None):
     return (blocks.view(torch.int16).to(torch.int32) << 16).view(torch.float32)
@@ -76,8 +134,8 @@ def dequantize_blocks_Q5_1(blocks, block_size, type_size, dtype=None):
     m = m.view(torch.float16).to(dtype)
     qh = to_uint32(qh)
 
-    qh = qh.reshape((n_blocks, 1)) >> torch.arange(32, device=d.device, dtype=torch.int32).reshape(1, 32)
-    ql = qs.reshape((n_blocks, -1, 1, block_size // 2)) >> torch.tensor([0, 4], device=d.device, dtype=torch.uint8).reshape(1, 1, 2, 1)
+    qh = qh.reshape((n_blocks, 1)) >> get_luts(d.device)["shift_bit32"].reshape(1, 32)
+    ql = qs.reshape((n_blocks, -1, 1, block_size // 2)) >> get_luts(d.device)["shift_nibble"].reshape(1, 1, 2, 1)
     qh = (qh & 1).to(torch.uint8)
     ql = (ql & 0x0F).reshape((n_blocks, -1))
 
@@ -91,8 +149,8 @@ def dequantize_blocks_Q5_0(blocks, block_size, type_size, dtype=None):
     d  = d.view(torch.float16).to(dtype)
     qh = to_uint32(qh)
 
-    qh = qh.reshape(n_blocks, 1) >> torch.arange(32, device=d.device, dtype=torch.int32).reshape(1, 32)
-    ql = qs.reshape(n_blocks, -1, 1, block_size // 2) >> torch.tensor([0, 4], device=d.device, dtype=torch.uint8).reshape(1, 1, 2, 1)
+    qh = qh.reshape(n_blocks, 1) >> get_luts(d.device)["shift_bit32"].reshape(1, 32)
+    ql = qs.reshape(n_blocks, -1, 1, block_size // 2) >> get_luts(d.device)["shift_nibble"].reshape(1, 1, 2, 1)
 
     qh = (qh & 1).to(torch.uint8)
     ql = (ql & 0x0F).reshape(n_blocks, -1)
@@ -107,7 +165,7 @@ def dequantize_blocks_Q4_1(blocks, block_size, type_size, dtype=None):
     d = d.view(torch.float16).to(dtype)
     m = m.view(torch.float16).to(dtype)
 
-    qs = qs.reshape((n_blocks, -1, 1, block_size // 2)) >> torch.tensor([0, 4], device=d.device, dtype=torch.uint8).reshape(1, 1, 2, 1)
+    qs = qs.reshape((n_blocks, -1, 1, block_size // 2)) >> get_luts(d.device)["shift_nibble"].reshape(1, 1, 2, 1)
     qs = (qs & 0x0F).reshape(n_blocks, -1)
 
     return (d * qs) + m
@@ -118,7 +176,7 @@ def dequantize_blocks_Q4_0(blocks, block_size, type_size, dtype=None):
     d, qs = split_block_dims(blocks, 2)
     d  = d.view(torch.float16).to(dtype)
 
-    qs = qs.reshape((n_blocks, -1, 1, block_size // 2)) >> torch.tensor([0, 4], device=d.device, dtype=torch.uint8).reshape((1, 1, 2, 1))
+    qs = qs.reshape((n_blocks, -1, 1, block_size // 2)) >> get_luts(d.device)["shift_nibble"].reshape((1, 1, 2, 1))
     qs = (qs & 0x0F).reshape((n_blocks, -1)).to(torch.int8) - 8
     return (d * qs)
 
@@ -147,9 +205,9 @@ def dequantize_blocks_Q6_K(blocks, block_size, type_size, dtype=None):
     d = d.view(torch.float16).to(dtype)
     d = (d * scales).reshape((n_blocks, QK_K // 16, 1))
 
-    ql = ql.reshape((n_blocks, -1, 1, 64)) >> torch.tensor([0, 4], device=d.device, dtype=torch.uint8).reshape((1, 1, 2, 1))
+    ql = ql.reshape((n_blocks, -1, 1, 64)) >> get_luts(d.device)["shift_nibble"].reshape((1, 1, 2, 1))
     ql = (ql & 0x0F).reshape((n_blocks, -1, 32))
-    qh = qh.reshape((n_blocks, -1, 1, 32)) >> torch.tensor([0, 2, 4, 6], device=d.device, dtype=torch.uint8).reshape((1, 1, 4, 1))
+    qh = qh.reshape((n_blocks, -1, 1, 32)) >> get_luts(d.device)["shift_2bit"].reshape((1, 1, 4, 1))
     qh = (qh & 0x03).reshape((n_blocks, -1, 32))
     q = (ql | (qh << 4)).to(torch.int8) - 32
     q = q.reshape((n_blocks, QK_K // 16, -1))
@@ -169,8 +227,8 @@ def dequantize_blocks_Q5_K(blocks, block_size, type_size, dtype=None):
     d = (d * sc).reshape((n_blocks, -1, 1))
     dm = (dmin * m).reshape((n_blocks, -1, 1))
 
-    ql = qs.reshape((n_blocks, -1, 1, 32)) >> torch.tensor([0, 4], device=d.device, dtype=torch.uint8).reshape((1, 1, 2, 1))
-    qh = qh.reshape((n_blocks, -1, 1, 32)) >> torch.tensor([i for i in range(8)], device=d.device, dtype=torch.uint8).reshape((1, 1, 8, 1))
+    ql = qs.reshape((n_blocks, -1, 1, 32)) >> get_luts(d.device)["shift_nibble"].reshape((1, 1, 2, 1))
+    qh = qh.reshape((n_blocks, -1, 1, 32)) >> get_luts(d.device)["shift_bit"].reshape((1, 1, 8, 1))
     ql = (ql & 0x0F).reshape((n_blocks, -1, 32))
     qh = (qh & 0x01).reshape((n_blocks, -1, 32))
     q = (ql | (qh << 4))
@@ -189,7 +247,7 @@ def dequantize_blocks_Q4_K(blocks, block_size, type_size, dtype=None):
     d = (d * sc).reshape((n_blocks, -1, 1))
     dm = (dmin * m).reshape((n_blocks, -1, 1))
 
-    qs = qs.reshape((n_blocks, -1, 1, 32)) >> torch.tensor([0, 4], device=d.device, dtype=torch.uint8).reshape((1, 1, 2, 1))
+    qs = qs.reshape((n_blocks, -1, 1, 32)) >> get_luts(d.device)["shift_nibble"].reshape((1, 1, 2, 1))
     qs = (qs & 0x0F).reshape((n_blocks, -1, 32))
 
     return (d * qs - dm).reshape((n_blocks, QK_K))
@@ -201,17 +259,17 @@ def dequantize_blocks_Q3_K(blocks, block_size, type_size, dtype=None):
     d = d.view(torch.float16).to(dtype)
 
     lscales, hscales = scales[:, :8], scales[:, 8:]
-    lscales = lscales.reshape((n_blocks, 1, 8)) >> torch.tensor([0, 4], device=d.device, dtype=torch.uint8).reshape((1, 2, 1))
+    lscales = lscales.reshape((n_blocks, 1, 8)) >> get_luts(d.device)["shift_nibble"].reshape((1, 2, 1))
     lscales = lscales.reshape((n_blocks, 16))
-    hscales = hscales.reshape((n_blocks, 1, 4)) >> torch.tensor([0, 2, 4, 6], device=d.device, dtype=torch.uint8).reshape((1, 4, 1))
+    hscales = hscales.reshape((n_blocks, 1, 4)) >> get_luts(d.device)["shift_2bit"].reshape((1, 4, 1))
     hscales = hscales.reshape((n_blocks, 16))
     scales = (lscales & 0x0F) | ((hscales & 0x03) << 4)
     scales = (scales.to(torch.int8) - 32)
 
     dl = (d * scales).reshape((n_blocks, 16, 1))
 
-    ql = qs.reshape((n_blocks, -1, 1, 32)) >> torch.tensor([0, 2, 4, 6], device=d.device, dtype=torch.uint8).reshape((1, 1, 4, 1))
-    qh = hmask.reshape(n_blocks, -1, 1, 32) >> torch.tensor([i for i in range(8)], device=d.device, dtype=torch.uint8).reshape((1, 1, 8, 1))
+    ql = qs.reshape((n_blocks, -1, 1, 32)) >> get_luts(d.device)["shift_2bit"].reshape((1, 1, 4, 1))
+    qh = hmask.reshape(n_blocks, -1, 1, 32) >> get_luts(d.device)["shift_bit"].reshape((1, 1, 8, 1))
     ql = ql.reshape((n_blocks, 16, QK_K // 16)) & 3
     qh = (qh.reshape((n_blocks, 16, QK_K // 16)) & 1) ^ 1
     q = (ql.to(torch.int8) - (qh << 2).to(torch.int8))
@@ -229,7 +287,7 @@ def dequantize_blocks_Q2_K(blocks, block_size, type_size, dtype=None):
     dl = (d * (scales & 0xF)).reshape((n_blocks, QK_K // 16, 1))
     ml = (dmin * (scales >> 4)).reshape((n_blocks, QK_K // 16, 1))
 
-    shift = torch.tensor([0, 2, 4, 6], device=d.device, dtype=torch.uint8).reshape((1, 1, 4, 1))
+    shift = get_luts(d.device)["shift_2bit"].reshape((1, 1, 4, 1))
 
     qs = (qs.reshape((n_blocks, -1, 1, 32)) >> shift) & 3
     qs = qs.reshape((n_blocks, QK_K // 16, 16))
@@ -238,20 +296,15 @@ def dequantize_blocks_Q2_K(blocks, block_size, type_size, dtype=None):
     return qs.reshape((n_blocks, -1))
 
 # IQ quants
-KVALUES = torch.tensor([-127, -104, -83, -65, -49, -35, -22, -10, 1, 13, 25, 38, 53, 69, 89, 113], dtype=torch.int8)
-
 def dequantize_blocks_IQ4_NL(blocks, block_size, type_size, dtype=None):
     n_blocks = blocks.shape[0]
 
     d, qs = split_block_dims(blocks, 2)
     d = d.view(torch.float16).to(dtype)
 
-    qs = qs.reshape((n_blocks, -1, 1, block_size//2)) >> torch.tensor([0, 4], device=d.device, dtype=torch.uint8).reshape((1, 1, 2, 1))
-    qs = (qs & 0x0F).reshape((n_blocks, -1, 1)).to(torch.int32)
-
-    kvalues = KVALUES.to(qs.device).expand(*qs.shape[:-1], 16)
-    qs = torch.gather(kvalues, dim=-1, index=qs).reshape((n_blocks, -1))
-    del kvalues # should still be view, but just to be safe
+    # (n_blocks, 16, 2) -> low nibbles of all bytes first, then the high ones
+    qs = get_luts(d.device)["iq4_pairs"][qs.to(torch.int32)]
+    qs = qs.transpose(-1, -2).reshape((n_blocks, -1))
 
     return (d * qs)
 
@@ -261,8 +314,8 @@ def dequantize_blocks_IQ4_XS(blocks, block_size, type_size, dtype=None):
     d = d.view(torch.float16).to(dtype)
     scales_h = to_uint16(scales_h)
 
-    shift_a = torch.tensor([0, 4], device=d.device, dtype=torch.uint8).reshape((1, 1, 2))
-    shift_b = torch.tensor([2 * i for i in range(QK_K // 32)], device=d.device, dtype=torch.uint8).reshape((1, -1, 1))
+    shift_a = get_luts(d.device)["shift_nibble"]
+    shift_b = get_luts(d.device)["shift_iq4_xs"]
 
     scales_l = scales_l.reshape((n_blocks, -1, 1)) >> shift_a.reshape((1, 1, 2))
     scales_h = scales_h.reshape((n_blocks, -1, 1)) >> shift_b.reshape((1, -1, 1))
@@ -273,14 +326,9 @@ def dequantize_blocks_IQ4_XS(blocks, block_size, type_size, dtype=None):
     scales = (scales_l | (scales_h << 4)).to(torch.int8) - 32
     dl = (d * scales.to(dtype)).reshape((n_blocks, -1, 1))
 
-    qs = qs.reshape((n_blocks, -1, 1, 16)) >> shift_a.reshape((1, 1, 2, 1))
-    qs = qs.reshape((n_blocks, -1, 32, 1)) & 0x0F
-
-    kvalues = KVALUES.to(qs.device).expand(*qs.shape[:-1], 16)
-    qs = torch.gather(kvalues, dim=-1, index=qs.to(torch.int32)).reshape((n_blocks, -1, 32))
-    del kvalues # see IQ4_NL
-    del shift_a
-    del shift_b
+    # (n_blocks, 8, 16, 2) -> per 16 bytes, low nibbles first, then the high ones
+    qs = get_luts(d.device)["iq4_pairs"][qs.reshape((n_blocks, -1, 16)).to(torch.int32)]
+    qs = qs.transpose(-1, -2).reshape((n_blocks, -1, 32))
 
     return (dl * qs).reshape((n_blocks, -1))
 
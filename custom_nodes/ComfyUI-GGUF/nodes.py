@@ -12,7 +12,7 @@ import comfy.model_patcher
 import comfy.model_management
 import folder_paths
 
-from .ops import GGMLOps, move_patch_to_device
+from .ops import GGMLOps, GGMLLayer, DequantCache, move_patch_to_device
 from .loader import gguf_sd_loader, gguf_clip_loader
 from .dequant import is_quantized, is_torch_compatible
 
@@ -33,9 +33,35 @@ update_folder_names_and_paths("clip_gguf", ["text_encoders", "clip"])
 
 class GGUFModelPatcher(comfy.model_patcher.ModelPatcher):
     patch_on_device = False
+    dequant_cache = None
+
+    def set_dequant_cache(self, cache):
+        """Makes the Linear layers of this model keep their dequantized weights in cache (None to disable it)"""
+        self.dequant_cache = cache
+        for m in self.model.modules():
+            if isinstance(m, GGMLLayer) and isinstance(m, torch.nn.Linear):
+                m.dequant_cache = cache
+
+    # the cached weights are on the load device on top of the model weights, count them so model management sees them
+    def model_size(self):
+        cache_size = self.dequant_cache.size if self.dequant_cache is not None else 0
+        return super().model_size() + cache_size
+
+    def loaded_size(self):
+        cache_size = self.dequant_cache.size if self.dequant_cache is not None else 0
+        return super().loaded_size() + cache_size
+
+    def partially_unload(self, device_to, memory_to_free=0, force_patch_weights=False):
+        freed = 0
+        if self.dequant_cache is not None:
+            freed = self.dequant_cache.size
+            self.dequant_cache.clear()
+            if freed >= memory_to_free:
+                return freed
+        return freed + super().partially_unload(device_to, memory_to_free - freed, force_patch_weights=force_patch_weights)
 
     def patch_weight_to_device(self, key, device_to=None, inplace_update=False):
-        if key not in self.patches:
+        if not self.has_merged_patches(key):
             return
         weight = comfy.utils.get_attr(self.model, key)
 
@@ -73,6 +99,9 @@ class GGUFModelPatcher(comfy.model_patcher.ModelPatcher):
                 patches = getattr(p, "patches", [])
                 if len(patches) > 0:
                     p.patches = []
+            # free the memory held by dequantized weights of the unloaded model
+            if self.dequant_cache is not None:
+                self.dequant_cache.clear()
         # TODO: Find another way to not unload after patches
         return super().unpatch_model(device_to=device_to, unpatch_weights=unpatch_weights)
 
@@ -127,6 +156,7 @@ class GGUFModelPatcher(comfy.model_patcher.ModelPatcher):
         # GGUF specific clone values below
         n.patch_on_device = getattr(self, "patch_on_device", False)
         n.mmap_released = getattr(self, "mmap_released", False)
+        n.dequant_cache = getattr(self, "dequant_cache", None)
         if src_cls != GGUFModelPatcher:
             n.size = 0 # force recalc
         return n
@@ -146,7 +176,7 @@ class UnetLoaderGGUF:
     CATEGORY = "bootleg"
     TITLE = "Unet Loader (GGUF)"
 
-    def load_unet(self, unet_name, dequant_dtype=None, patch_dtype=None, patch_on_device=None):
+    def load_unet(self, unet_name, dequant_dtype=None, patch_dtype=None, patch_on_device=None, dequant_cache_mb=0):
         ops = GGMLOps()
 
         if dequant_dtype in ("default", None):
@@ -174,6 +204,9 @@ class UnetLoaderGGUF:
             raise RuntimeError("ERROR: Could not detect model type of: {}".format(unet_path))
         model = GGUFModelPatcher.clone(model)
         model.patch_on_device = patch_on_device
+        # one cache per loaded model, the ops classes are shared by all of them
+        if dequant_cache_mb > 0:
+            model.set_dequant_cache(DequantCache(dequant_cache_mb * 1024 * 1024))
         return (model,)
 
 class UnetLoaderGGUFAdvanced(UnetLoaderGGUF):
@@ -186,6 +219,9 @@ class UnetLoaderGGUFAdvanced(UnetLoaderGGUF):
                 "dequant_dtype": (["default", "target", "float32", "float16", "bfloat16"], {"default": "default"}),
                 "patch_dtype": (["default", "target", "float32", "float16", "bfloat16"], {"default": "default"}),
                 "patch_on_device": ("BOOLEAN", {"default": False}),
+            },
+            "optional": {
+                "dequant_cache_mb": ("INT", {"default": 0, "min": 0, "max": 1024 * 1024, "step": 256, "tooltip": "Keep up to this many MB of dequantized and LoRA patched weights on the device instead of dequantizing them on every step. 0 disables the cache."}),
             }
         }
     TITLE = "Unet Loader (GGUF/Advanced)"
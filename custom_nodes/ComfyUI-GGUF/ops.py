@@ -2,6 +2,8 @@
 import gguf
 import torch
 import logging
+import threading
+import collections
 
 import comfy.ops
 import comfy.lora
@@ -90,6 +92,50 @@ class GGMLTensor(torch.Tensor):
             self.tensor_shape = self.size()
         return self.tensor_shape
 
+class DequantCache:
+    """
+    LRU cache of dequantized and patched weights, up to budget bytes.
+    Saves dequantizing and re-applying the LoRA patches of every layer on each step. An entry is only used while the
+    layer still holds the same quantized tensor with the same patches, so re-patching the model invalidates it.
+    """
+    def __init__(self, budget):
+        self.budget = budget
+        self.size = 0
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, source, patches):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] is not source or len(entry[1]) != len(patches) or any(a is not b for a, b in zip(entry[1], patches)):
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[2]
+
+    def put(self, key, source, patches, weight):
+        size = weight.nelement() * weight.element_size()
+        if size > self.budget:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            while self.size + size > self.budget and len(self.entries) > 0:
+                self._remove(next(iter(self.entries)))
+            self.entries[key] = (source, list(patches), weight, size)
+            self.size += size
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.size -= entry[3]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
 class GGMLLayer(torch.nn.Module):
     """
     This (should) be responsible for de-quantizing on the fly
@@ -98,6 +144,7 @@ class GGMLLayer(torch.nn.Module):
     dequant_dtype = None
     patch_dtype = None
     largest_layer = False
+    dequant_cache = None
     torch_compatible_tensor_types = {None, gguf.GGMLQuantizationType.F32, gguf.GGMLQuantizationType.F16}
 
     def is_ggml_quantized(self, *, weight=None, bias=None):
@@ -190,6 +237,22 @@ class GGMLLayer(torch.nn.Module):
                 weight = comfy.lora.calculate_weight(patch_list, weight, key, patch_dtype)
         return weight
 
+    def get_cached_weight(self, tensor, name, device, dtype):
+        """get_weight for tensor moved to device, through the dequant cache if it's enabled"""
+        cache = self.dequant_cache
+        patches = getattr(tensor, "patches", [])
+        if cache is None or not (is_quantized(tensor) or len(patches) > 0):
+            return self.get_weight(tensor.to(device), dtype)
+
+        key = (id(self), name, device, dtype)
+        weight = cache.get(key, tensor, patches)
+        if weight is None:
+            weight = self.get_weight(tensor.to(device), dtype)
+            # don't take memory the model needs for sampling
+            if comfy.model_management.get_free_memory(device) > 2 * weight.nelement() * weight.element_size():
+                cache.put(key, tensor, patches, weight)
+        return weight
+
     @torch_compiler_disable()
     def cast_bias_weight(s, input=None, dtype=None, device=None, bias_dtype=None):
         if input is not None:
@@ -203,10 +266,10 @@ class GGMLLayer(torch.nn.Module):
         bias = None
         non_blocking = comfy.model_management.device_supports_non_blocking(device)
         if s.bias is not None:
-            bias = s.get_weight(s.bias.to(device), dtype)
+            bias = s.get_cached_weight(s.bias, "bias", device, dtype)
             bias = comfy.ops.cast_to(bias, bias_dtype, device, non_blocking=non_blocking, copy=False)
 
-        weight = s.get_weight(s.weight.to(device), dtype)
+        weight = s.get_cached_weight(s.weight, "weight", device, dtype)
         weight = comfy.ops.cast_to(weight, dtype, device, non_blocking=non_blocking, copy=False)
         return weight, bias
 
@@ -0,0 +1,86 @@
+# (c) City96 || Apache-2.0 (apache.org/licenses/LICENSE-2.0)
+import os
+import sys
+import time
+import gguf
+import torch
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dequant # noqa: E402
+from dequant import dequantize, dequantize_functions # noqa: E402
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure dequantization speed for every supported qtype")
+    parser.add_argument("--qtypes", nargs="+", help="Qtypes to test (e.g. Q4_K Q8_0), defaults to all supported ones.")
+    parser.add_argument("--size", type=int, default=64, help="Size of the dequantized weight in millions of values.")
+    parser.add_argument("--dtype", default="float16", choices=["float32", "float16", "bfloat16"], help="Output dtype.")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per qtype and device.")
+    parser.add_argument("--check", action="store_true", help="Compare the output against the gguf-py numpy reference.")
+    parser.add_argument("--compile", action="store_true", help="Use the torch.compile dequant functions where available (COMFYUI_GGUF_COMPILE_DEQUANT=1).")
+    return parser.parse_args()
+
+def get_devices():
+    devices = [torch.device("cpu")]
+    if torch.cuda.is_available():
+        devices.append(torch.device("cuda"))
+    elif hasattr(torch, "xpu") and torch.xpu.is_available():
+        devices.append(torch.device("xpu"))
+    elif torch.backends.mps.is_available():
+        devices.append(torch.device("mps"))
+    return devices
+
+def synchronize(device):
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+    elif device.type == "xpu":
+        torch.xpu.synchronize()
+    elif device.type == "mps":
+        torch.mps.synchronize()
+
+def make_data(qtype, n_values):
+    # random blocks, the speed of the dequant functions doesn't depend on the values
+    block_size, type_size = gguf.GGML_QUANT_SIZES[qtype]
+    n_blocks = n_values // block_size
+    data = torch.randint(0, 256, (n_blocks, type_size), dtype=torch.uint8)
+    return data, (n_blocks * block_size,)
+
+def bench(data, qtype, oshape, dtype, device, repeat):
+    data = data.to(device)
+    # warmup, also compiles on first use
+    dequantize(data, qtype, oshape, dtype=dtype)
+    synchronize(device)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        dequantize(data, qtype, oshape, dtype=dtype)
+    synchronize(device)
+    return (time.perf_counter() - start) / repeat
+
+def check(data, qtype, oshape):
+    ref = gguf.quants.dequantize(data.numpy(), qtype).reshape(oshape)
+    out = dequantize(data, qtype, oshape, dtype=torch.float32).numpy()
+    return np.allclose(out, ref, rtol=1e-3, atol=1e-3, equal_nan=True)
+
+def main(args):
+    dequant.ALLOW_COMPILE = args.compile
+    dtype = getattr(torch, args.dtype)
+    qtypes = [getattr(gguf.GGMLQuantizationType, x) for x in args.qtypes] if args.qtypes else list(dequantize_functions)
+    devices = get_devices()
+    n_values = args.size * 1000 * 1000
+
+    header = f"{'qtype':8} {'device':6} {'ms':>9} {'in GB/s':>9} {'out GB/s':>9}"
+    print(header + ("  check" if args.check else ""))
+    for qtype in qtypes:
+        data, oshape = make_data(qtype, n_values)
+        in_bytes = data.numel()
+        out_bytes = oshape[0] * torch.empty((), dtype=dtype).element_size()
+        status = ""
+        if args.check:
+            status = "  ok" if check(data, qtype, oshape) else "  MISMATCH"
+        for device in devices:
+            seconds = bench(data, qtype, oshape, dtype, device, args.repeat)
+            print(f"{qtype.name:8} {device.type:6} {seconds * 1000:9.2f} {in_bytes / seconds / 1e9:9.2f} {out_bytes / seconds / 1e9:9.2f}{status}")
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,80 @@
+# (c) City96 || Apache-2.0 (apache.org/licenses/LICENSE-2.0)
+import os
+import sys
+import time
+import gguf
+import torch
+import argparse
+import importlib
+
+# run from anywhere inside a ComfyUI install, the ops need comfy and the package for their relative imports
+node_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(node_dir)))
+sys.path.insert(0, os.path.dirname(node_dir))
+ops = importlib.import_module(os.path.basename(node_dir) + ".ops")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure the step time of a stack of quantized Linear layers with and without the dequant cache")
+    parser.add_argument("--qtypes", nargs="+", default=["Q4_K", "Q8_0"], help="Qtypes to test.")
+    parser.add_argument("--layers", type=int, default=48, help="Number of Linear layers per step.")
+    parser.add_argument("--dim", type=int, default=3072, help="Input and output features of the layers.")
+    parser.add_argument("--tokens", type=int, default=4096, help="Tokens in the input of every layer.")
+    parser.add_argument("--dtype", default="float16", choices=["float32", "float16", "bfloat16"], help="Compute dtype.")
+    parser.add_argument("--device", default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--steps", type=int, default=20, help="Timed steps per qtype.")
+    return parser.parse_args()
+
+def synchronize(device):
+    if device.type == "cuda":
+        torch.cuda.synchronize()
+
+def make_layers(qtype, n_layers, dim, device):
+    # random blocks, like bench_dequant the values don't change the speed
+    block_size, type_size = gguf.GGML_QUANT_SIZES[qtype]
+    layers = []
+    for _ in range(n_layers):
+        layer = ops.GGMLOps.Linear(dim, dim)
+        data = torch.randint(0, 256, (dim, dim // block_size * type_size), dtype=torch.uint8, device=device)
+        weight = ops.GGMLTensor(data, tensor_type=qtype, tensor_shape=torch.Size((dim, dim)))
+        layer.weight = torch.nn.Parameter(weight, requires_grad=False)
+        layers.append(layer)
+    return layers
+
+def bench(layers, x, steps):
+    def step():
+        out = x
+        for layer in layers:
+            out = layer(out)
+        return out
+    # warmup, also fills the cache
+    step()
+    synchronize(x.device)
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+    synchronize(x.device)
+    return (time.perf_counter() - start) / steps
+
+def main(args):
+    dtype = getattr(torch, args.dtype)
+    device = torch.device(args.device)
+    x = torch.randn(args.tokens, args.dim, dtype=dtype, device=device)
+
+    print(f"{'qtype':8} {'device':6} {'cache MB':>9} {'ms/step':>9}")
+    for name in args.qtypes:
+        qtype = getattr(gguf.GGMLQuantizationType, name)
+        layers = make_layers(qtype, args.layers, args.dim, device)
+        cache_size = args.layers * args.dim * args.dim * torch.empty((), dtype=dtype).element_size()
+        for budget in (0, cache_size):
+            cache = ops.DequantCache(budget) if budget > 0 else None
+            for layer in layers:
+                layer.dequant_cache = cache
+            seconds = bench(layers, x, args.steps)
+            used = cache.size if cache is not None else 0
+            print(f"{name:8} {device.type:6} {used / 1024 ** 2:9.0f} {seconds * 1000:9.2f}")
+            if cache is not None:
+                cache.clear()
+
+if __name__ == "__main__":
+    with torch.inference_mode():
+        main(parse_args())
@@ -1,4 +1,5 @@
 from typing import Any, Dict, Optional, List
+import asyncio
 import time
 import inspect
 import json
@@ -8,6 +9,7 @@ from urllib.parse import urlencode, quote_plus
 import socket
 from io import BytesIO
 
+import aiohttp
 import numpy as np
 from PIL import Image
 import torch
@@ -18,6 +20,7 @@ import folder_paths
 
 MAX_INPUTS = 64
 TEMP_SUBDIR = os.path.join("WBLESS", "apicore")
+API_URL = "https://api.apicore.ai/v1/images/generations"
 
 class APICoreNode(CozyBaseNode):
     """
@@ -263,22 +266,26 @@ class APICoreNode(CozyBaseNode):
         
         return unique_urls
 
-    def _download_image_tensor(self, url: str) -> Optional[torch.Tensor]:
+    async def _download_image_tensor(self, session: aiohttp.ClientSession, url: str, idx: int = 1, total: int = 1) -> Optional[torch.Tensor]:
         """
         下载远程图片并转换为ComfyUI期望的IMAGE tensor
         """
+        print(f"Downloading image {idx}/{total}: {url}")
         try:
-            import urllib.request
-            with urllib.request.urlopen(url, timeout=20) as response:
-                data = response.read()
-            image = Image.open(BytesIO(data)).convert("RGB")
-            arr = np.array(image).astype(np.float32) / 255.0
-            tensor = torch.from_numpy(arr)[None, ...]
-            return tensor
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=20)) as response:
+                response.raise_for_status()
+                data = await response.read()
+            # 解码放到线程里执行，不阻塞事件循环
+            return await asyncio.to_thread(self._decode_image_tensor, data)
         except Exception as exc:
             print(f"Failed to download preview image from {url}: {exc}")
             return None
 
+    def _decode_image_tensor(self, data: bytes) -> torch.Tensor:
+        image = Image.open(BytesIO(data)).convert("RGB")
+        arr = np.array(image).astype(np.float32) / 255.0
+        return torch.from_numpy(arr)[None, ...]
+
     def _create_blank_image(self) -> torch.Tensor:
         """
         创建一个占位的黑色图像，避免IMAGE输出为空
@@ -322,7 +329,7 @@ class APICoreNode(CozyBaseNode):
         port = os.environ.get("WBLESS_PUBLIC_PORT", getattr(args, "port", 8188))
         return f"{scheme}://{display_host}:{port}"
     
-    def run(self, prompt, api_key, model, server_origin, size, n, unique_id=None, extra_pnginfo=None, **kw) -> tuple:
+    async def run(self, prompt, api_key, model, server_origin, size, n, unique_id=None, extra_pnginfo=None, **kw) -> tuple:
         # 处理列表格式的输入参数
         if isinstance(prompt, list) and len(prompt) > 0:
             prompt = prompt[0]
@@ -339,7 +346,8 @@ class APICoreNode(CozyBaseNode):
         """
         图片分析API调用节点的运行方法
         
-        获取输入图片的URL，构建API请求，发送到服务器并返回响应
+        获取输入图片的URL，构建API请求，发送到服务器并返回响应。
+        异步执行：等待API响应和下载图片时不会阻塞执行线程
         
         Args:
             prompt: 分析提示词
@@ -352,9 +360,6 @@ class APICoreNode(CozyBaseNode):
         Returns:
             tuple: 包含API响应的字符串
         """
-        import http.client
-        from io import BytesIO
-        
         server_origin_value = (server_origin or "").strip()
         if not server_origin_value:
             error_message = "请在节点中填写ComfyUI地址(server_origin)"
@@ -362,27 +367,28 @@ class APICoreNode(CozyBaseNode):
             for _ in range(10):
                 result.append(self._create_blank_image())
             return tuple(result)
-        # 收集所有有效的图片输入URL
-        image_urls = []
+        # 收集所有有效的图片输入
+        image_inputs = []
         for i in range(1, MAX_INPUTS + 1):
             input_name = f"image_{i}"
             if input_name in kw:
                 value = kw[input_name]
                 # 处理列表格式的输入
                 if isinstance(value, list) and len(value) > 0:
-                    try:
-                        # 获取图片URL
-                        img_url = self._get_image_url(value[0], server_origin_value)
-                        image_urls.append(img_url)
-                    except Exception as e:
-                        print(f"Error getting URL for image {i}: {str(e)}")
+                    image_inputs.append((i, value[0]))
                 elif value is not None:
-                    try:
-                        # 获取图片URL
-                        img_url = self._get_image_url(value, server_origin_value)
-                        image_urls.append(img_url)
-                    except Exception as e:
-                        print(f"Error getting URL for image {i}: {str(e)}")
+                    image_inputs.append((i, value))
+
+        async def get_image_url(i, value) -> Optional[str]:
+            try:
+                # 获取图片URL（可能需要编码并保存PNG，放到线程里执行）
+                return await asyncio.to_thread(self._get_image_url, value, server_origin_value)
+            except Exception as e:
+                print(f"Error getting URL for image {i}: {str(e)}")
+                return None
+
+        # 所有图片并行处理，保持输入顺序
+        image_urls = [url for url in await asyncio.gather(*(get_image_url(i, value) for i, value in image_inputs)) if url]
         
         # 组合最终prompt：图片URL + 空格 + 文本
         # 如果没有图片，则直接使用文本提示
@@ -429,13 +435,12 @@ class APICoreNode(CozyBaseNode):
         
         preview_tensor: Optional[torch.Tensor] = None
 
+        # 生成图片可能耗时较长，与之前一样不设置总超时
+        session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_connect=30))
         try:
             # 发送API请求
-            conn = http.client.HTTPSConnection("api.apicore.ai")
-            conn.request("POST", "/v1/images/generations", payload, headers)
-            res = conn.getresponse()
-            data = res.read()
-            conn.close()
+            async with session.post(API_URL, data=payload, headers=headers) as res:
+                data = await res.read()
             
             # 解析响应
             response_data = data.decode("utf-8")
@@ -456,11 +461,11 @@ class APICoreNode(CozyBaseNode):
                 for i, url in enumerate(urls[:n_value], 1):
                     print(f"  URL {i}: {url}")
 
-            # 下载所有图片，最多n_value个
+            # 并行下载所有图片，最多n_value个
+            total = min(len(urls), n_value)
+            downloaded = await asyncio.gather(*(self._download_image_tensor(session, url, idx, total) for idx, url in enumerate(urls[:n_value], 1)))
             preview_tensors = []
-            for idx, url in enumerate(urls[:n_value], 1):
-                print(f"Downloading image {idx}/{min(len(urls), n_value)}: {url}")
-                tensor = self._download_image_tensor(url)
+            for idx, tensor in enumerate(downloaded, 1):
                 if tensor is not None:
                     preview_tensors.append(tensor)
                     print(f"  Successfully downloaded image {idx}")
@@ -496,6 +501,8 @@ class APICoreNode(CozyBaseNode):
             for _ in range(10):
                 result.append(self._create_blank_image())
             return tuple(result)
+        finally:
+            await session.close()
     
 # 确保节点能被正确识别
 def NODE_CLASS_MAPPINGS():
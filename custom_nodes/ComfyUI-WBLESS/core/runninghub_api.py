@@ -1,14 +1,13 @@
-import http.client
+import asyncio
 import json
 import logging
 import time
 import io
-import tempfile
-import os
 from PIL import Image
 import numpy as np
 import torch
-import requests
+import aiohttp
+import comfy.model_management
 from cozy_comfyui.node import CozyBaseNode
 
 # 配置日志
@@ -16,6 +15,9 @@ logger = logging.getLogger(__name__)
 
 # RunningHub API 配置
 API_HOST = "www.runninghub.cn"
+API_BASE_URL = f"https://{API_HOST}"
+# 单个请求的超时：连接 30 秒，读取 120 秒（上传大图时服务端可能较慢）
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=120)
 
 class RunningHubApi(CozyBaseNode):
     """
@@ -69,11 +71,58 @@ class RunningHubApi(CozyBaseNode):
         import random
         return random.random()
 
-    def upload_image(self, api_key, image_tensor):
+    @staticmethod
+    def encode_png(image_tensor):
+        """
+        将 ComfyUI 的图片 tensor 编码为 PNG 字节
+        
+        Args:
+            image_tensor: ComfyUI 的图片 tensor (B, H, W, C)，值范围是 0-1
+        
+        Returns:
+            PNG 字节
+        """
+        # 获取第一张图片并去除多余的维度
+        image_np = image_tensor.cpu().numpy()
+        
+        # 如果是 4D 张量，取第一张图片
+        if len(image_np.shape) == 4:
+            image_np = image_np[0]
+        
+        # 去除可能存在的单维度
+        image_np = np.squeeze(image_np)
+        
+        # 确保是 3D 张量 (H, W, C)
+        if len(image_np.shape) != 3:
+            raise ValueError(f"图片张量维度错误: {image_np.shape}，期望 (H, W, C)")
+        
+        # 转换为 uint8
+        image_np = (image_np * 255).astype(np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(image_np).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    @staticmethod
+    def decode_image(data):
+        """
+        将下载的图片字节解码为 ComfyUI tensor 格式 (1, H, W, C)
+        """
+        image = Image.open(io.BytesIO(data))
+        
+        # 转换为 RGB（如果是 RGBA 或其他格式）
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        # 转换为 numpy 数组，再转换为 torch tensor 并添加 batch 维度
+        image_np = np.array(image).astype(np.float32) / 255.0
+        return torch.from_numpy(image_np)[None,]
+
+    async def upload_image(self, session, api_key, image_tensor):
         """
         上传图片到 RunningHub 平台
         
         Args:
+            session: aiohttp 会话
             api_key: API 密钥
             image_tensor: ComfyUI 的图片 tensor (B, H, W, C)
         
@@ -87,68 +136,43 @@ class RunningHubApi(CozyBaseNode):
             image_tensor = image_tensor[0]
         
         try:
-            # 将 tensor 转换为 PIL Image
-            # ComfyUI 的图片格式是 (B, H, W, C)，值范围是 0-1
-            # 获取第一张图片并去除多余的维度
-            image_np = image_tensor.cpu().numpy()
+            # PNG 编码比较耗时，放到线程里执行，不阻塞事件循环
+            png_bytes = await asyncio.to_thread(self.encode_png, image_tensor)
             
-            # 如果是 4D 张量，取第一张图片
-            if len(image_np.shape) == 4:
-                image_np = image_np[0]
+            # 上传文件（直接从内存上传，不再写临时文件）
+            form = aiohttp.FormData()
+            form.add_field('apiKey', api_key)
+            form.add_field('fileType', 'input')
+            form.add_field('file', png_bytes, filename='image.png', content_type='image/png')
             
-            # 去除可能存在的单维度
-            image_np = np.squeeze(image_np)
+            async with session.post(f"{API_BASE_URL}/task/openapi/upload", data=form) as response:
+                result = json.loads(await response.text())
+            logger.info(f"[RunningHub API] 上传结果: {result}")
             
-            # 确保是 3D 张量 (H, W, C)
-            if len(image_np.shape) != 3:
-                raise ValueError(f"图片张量维度错误: {image_np.shape}，期望 (H, W, C)")
-            
-            # 转换为 uint8
-            image_np = (image_np * 255).astype(np.uint8)
-            pil_image = Image.fromarray(image_np)
-            
-            # 保存到临时文件
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp_file:
-                pil_image.save(tmp_file, format='PNG')
-                tmp_file_path = tmp_file.name
-            
-            try:
-                # 上传文件
-                url = f"https://{API_HOST}/task/openapi/upload"
-                headers = {'Host': API_HOST}
-                data = {
-                    'apiKey': api_key,
-                    'fileType': 'input'
-                }
-                
-                with open(tmp_file_path, 'rb') as f:
-                    files = {'file': f}
-                    response = requests.post(url, headers=headers, files=files, data=data)
-                
-                result = response.json()
-                logger.info(f"[RunningHub API] 上传结果: {result}")
-                
-                if result.get("code") == 0 and result.get("msg") == "success":
-                    file_name = result.get("data", {}).get("fileName")
-                    logger.info(f"[RunningHub API] 图片上传成功: {file_name}")
-                    return file_name
-                else:
-                    raise Exception(f"上传失败: {result}")
-                    
-            finally:
-                # 删除临时文件
-                if os.path.exists(tmp_file_path):
-                    os.unlink(tmp_file_path)
+            if result.get("code") == 0 and result.get("msg") == "success":
+                file_name = result.get("data", {}).get("fileName")
+                logger.info(f"[RunningHub API] 图片上传成功: {file_name}")
+                return file_name
+            else:
+                raise Exception(f"上传失败: {result}")
                     
         except Exception as e:
             logger.error(f"[RunningHub API] 图片上传失败: {e}")
             raise
 
-    def submit_task(self, webapp_id, api_key, node_info_list):
+    async def post_json(self, session, path, payload):
+        """
+        向 RunningHub 发送 JSON POST 请求并返回解析后的响应
+        """
+        async with session.post(f"{API_BASE_URL}{path}", json=payload) as res:
+            return json.loads(await res.text())
+
+    async def submit_task(self, session, webapp_id, api_key, node_info_list):
         """
         提交任务到 RunningHub AI 应用
         
         Args:
+            session: aiohttp 会话
             webapp_id: WebApp ID
             api_key: API 密钥
             node_info_list: 节点信息列表
@@ -159,26 +183,18 @@ class RunningHubApi(CozyBaseNode):
         logger.info("[RunningHub API] 开始提交任务")
         
         try:
-            conn = http.client.HTTPSConnection(API_HOST)
-            payload = json.dumps({
+            payload = {
                 "webappId": webapp_id,
                 "apiKey": api_key,
                 "nodeInfoList": node_info_list
-            })
-            headers = {
-                'Host': API_HOST,
-                'Content-Type': 'application/json'
             }
             
             # 输出详细的请求信息用于调试
             logger.debug(f"[RunningHub API] WebApp ID: {webapp_id}")
             logger.debug(f"[RunningHub API] 节点信息数量: {len(node_info_list)}")
-            logger.debug(f"[RunningHub API] Payload: {payload}")
+            logger.debug(f"[RunningHub API] Payload: {json.dumps(payload)}")
             
-            conn.request("POST", "/task/openapi/ai-app/run", payload, headers)
-            res = conn.getresponse()
-            data = json.loads(res.read().decode("utf-8"))
-            conn.close()
+            data = await self.post_json(session, "/task/openapi/ai-app/run", payload)
             
             logger.info(f"[RunningHub API] 任务提交结果: {data}")
             return data
@@ -187,11 +203,12 @@ class RunningHubApi(CozyBaseNode):
             logger.error(f"[RunningHub API] 任务提交失败: {e}")
             raise
 
-    def query_task_outputs(self, task_id, api_key):
+    async def query_task_outputs(self, session, task_id, api_key):
         """
         查询任务状态和生成结果
         
         Args:
+            session: aiohttp 会话
             task_id: 任务 ID
             api_key: API 密钥
         
@@ -199,32 +216,21 @@ class RunningHubApi(CozyBaseNode):
             任务查询结果
         """
         try:
-            conn = http.client.HTTPSConnection(API_HOST)
-            payload = json.dumps({
+            return await self.post_json(session, "/task/openapi/outputs", {
                 "apiKey": api_key,
                 "taskId": task_id
             })
-            headers = {
-                'Host': API_HOST,
-                'Content-Type': 'application/json'
-            }
-            
-            conn.request("POST", "/task/openapi/outputs", payload, headers)
-            res = conn.getresponse()
-            data = json.loads(res.read().decode("utf-8"))
-            conn.close()
-            
-            return data
             
         except Exception as e:
             logger.error(f"[RunningHub API] 查询任务失败: {e}")
             raise
 
-    def download_image(self, url):
+    async def download_image(self, session, url):
         """
         从 URL 下载图片并转换为 ComfyUI tensor 格式
         
         Args:
+            session: aiohttp 会话
             url: 图片 URL
         
         Returns:
@@ -233,21 +239,12 @@ class RunningHubApi(CozyBaseNode):
         logger.info(f"[RunningHub API] 开始下载图片: {url}")
         
         try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            
-            # 将下载的内容转换为 PIL Image
-            image = Image.open(io.BytesIO(response.content))
-            
-            # 转换为 RGB（如果是 RGBA 或其他格式）
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # 转换为 numpy 数组
-            image_np = np.array(image).astype(np.float32) / 255.0
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as response:
+                response.raise_for_status()
+                data = await response.read()
             
-            # 转换为 torch tensor 并添加 batch 维度
-            image_tensor = torch.from_numpy(image_np)[None,]
+            # 解码放到线程里执行，不阻塞事件循环
+            image_tensor = await asyncio.to_thread(self.decode_image, data)
             
             logger.info(f"[RunningHub API] 图片下载成功，尺寸: {image_tensor.shape}")
             return image_tensor
@@ -256,10 +253,12 @@ class RunningHubApi(CozyBaseNode):
             logger.error(f"[RunningHub API] 图片下载失败: {e}")
             raise
 
-    def run(self, api_key, webapp_id, node_modifications, timeout, **kwargs):
+    async def run(self, api_key, webapp_id, node_modifications, timeout, **kwargs):
         """
         主执行函数
         
+        这是一个异步节点：等待远程任务时不会占用执行线程，队列中的其他节点可以同时运行
+        
         Args:
             api_key: API 密钥
             webapp_id: WebApp ID
@@ -282,6 +281,7 @@ class RunningHubApi(CozyBaseNode):
         if isinstance(timeout, list) and len(timeout) > 0:
             timeout = timeout[0]
         
+        session = aiohttp.ClientSession(timeout=REQUEST_TIMEOUT)
         try:
             # 解析节点修改配置
             try:
@@ -300,34 +300,36 @@ class RunningHubApi(CozyBaseNode):
             
             # 处理动态图片输入
             # kwargs 中的键格式为 image_{nodeId}_{fieldName}
+            image_inputs = []
             for input_name, image_tensor in kwargs.items():
                 if input_name.startswith("image_") and image_tensor is not None:
                     # 解析输入名称，提取 nodeId 和 fieldName
                     # 格式: image_{nodeId}_{fieldName}
                     parts = input_name.split("_", 2)  # 分割为 ["image", nodeId, fieldName]
                     if len(parts) >= 3:
-                        node_id = parts[1]
-                        field_name = parts[2]
-                        
-                        logger.info(f"[RunningHub API] 上传图片: 节点 {node_id}")
-                        
-                        # 上传图片
-                        uploaded_file_name = self.upload_image(api_key, image_tensor)
-                        
-                        # 查找并更新对应的节点
-                        updated = False
-                        for node in node_info_list:
-                            if node.get("nodeId") == node_id and node.get("fieldName") == field_name:
-                                node["fieldValue"] = uploaded_file_name
-                                logger.info(f"[RunningHub API] 图片已上传: {uploaded_file_name}")
-                                updated = True
-                                break
-                        
-                        if not updated:
-                            logger.warning(f"[RunningHub API] 未找到匹配的节点: {node_id}/{field_name}")
+                        logger.info(f"[RunningHub API] 上传图片: 节点 {parts[1]}")
+                        image_inputs.append((parts[1], parts[2], image_tensor))
+            
+            # 所有图片并行上传
+            uploaded_file_names = await asyncio.gather(
+                *(self.upload_image(session, api_key, image_tensor) for _, _, image_tensor in image_inputs)
+            )
+            
+            for (node_id, field_name, _), uploaded_file_name in zip(image_inputs, uploaded_file_names):
+                # 查找并更新对应的节点
+                updated = False
+                for node in node_info_list:
+                    if node.get("nodeId") == node_id and node.get("fieldName") == field_name:
+                        node["fieldValue"] = uploaded_file_name
+                        logger.info(f"[RunningHub API] 图片已上传: {uploaded_file_name}")
+                        updated = True
+                        break
+                
+                if not updated:
+                    logger.warning(f"[RunningHub API] 未找到匹配的节点: {node_id}/{field_name}")
             
             # 提交任务
-            submit_result = self.submit_task(webapp_id, api_key, node_info_list)
+            submit_result = await self.submit_task(session, webapp_id, api_key, node_info_list)
             
             # 检查提交结果
             if submit_result.get("code") != 0:
@@ -363,8 +365,11 @@ class RunningHubApi(CozyBaseNode):
                     logger.error(f"[RunningHub API] {error_msg}")
                     raise Exception(error_msg)
                 
+                # 用户取消执行时停止轮询
+                comfy.model_management.throw_exception_if_processing_interrupted()
+                
                 # 查询任务状态
-                outputs_result = self.query_task_outputs(task_id, api_key)
+                outputs_result = await self.query_task_outputs(session, task_id, api_key)
                 code = outputs_result.get("code")
                 msg = outputs_result.get("msg")
                 data = outputs_result.get("data")
@@ -374,7 +379,7 @@ class RunningHubApi(CozyBaseNode):
                     logger.info(f"[RunningHub API] 🎉 任务完成！生成结果: {file_url}")
                     
                     # 下载生成的图片
-                    result_image = self.download_image(file_url)
+                    result_image = await self.download_image(session, file_url)
                     
                     logger.info("[RunningHub API] ========== RunningHub API 节点执行完成 ==========")
                     return (result_image, file_url)
@@ -399,12 +404,14 @@ class RunningHubApi(CozyBaseNode):
                 else:  # 未知状态
                     logger.warning(f"[RunningHub API] ⚠️ 未知状态: {outputs_result}")
                 
-                # 等待后继续查询
-                time.sleep(poll_interval)
+                # 等待后继续查询（异步等待，不阻塞执行线程）
+                await asyncio.sleep(poll_interval)
                 
         except Exception as e:
             logger.error(f"[RunningHub API] 执行失败: {e}")
             raise
+        finally:
+            await session.close()
 
 NODE_CLASS_MAPPINGS = {
     "RunningHUB API": RunningHubApi
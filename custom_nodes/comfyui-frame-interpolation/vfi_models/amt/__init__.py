@@ -70,17 +70,21 @@ class AMT_VFI:
         frames = padder.pad(frames)
         
         def return_middle_frame(frame_0, frame_1, timestep, model):
+            if torch.is_tensor(timestep):
+                embt = timestep.view(frame_0.shape[0], 1, 1, 1).to(get_torch_device())
+            else:
+                embt = torch.FloatTensor([timestep] * frame_0.shape[0]).view(frame_0.shape[0], 1, 1, 1).to(get_torch_device())
             return model(
                 frame_0, 
                 frame_1,
-                embt=torch.FloatTensor([timestep] * frame_0.shape[0]).view(frame_0.shape[0], 1, 1, 1).to(get_torch_device()),
+                embt=embt,
                 scale_factor=1.0,
                 eval=True
             )["imgt_pred"]
         
         args = [interpolation_model]
         out = generic_frame_loop(type(self).__name__, frames, clear_cache_after_n_frames, multiplier, return_middle_frame, *args, 
-                               interpolation_states=optional_interpolation_states, dtype=torch.float32)
+                               interpolation_states=optional_interpolation_states, dtype=torch.float32, batched=True)
         out = padder.unpad(out)
         out = postprocess_frames(out)
         return (out,)
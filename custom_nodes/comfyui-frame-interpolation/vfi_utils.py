@@ -8,7 +8,7 @@ import traceback
 import einops
 import gc
 import torchvision.transforms.functional as transform
-from comfy.model_management import soft_empty_cache, get_torch_device
+from comfy.model_management import soft_empty_cache, get_torch_device, get_free_memory
 import numpy as np
 
 BASE_MODEL_DOWNLOAD_URLS = [
@@ -23,6 +23,10 @@ if os.path.exists(config_path):
 else:
     raise Exception("config.yaml file is neccessary, plz recreate the config file by downloading it from https://github.com/Fannovel16/ComfyUI-Frame-Interpolation")
 DEVICE = get_torch_device()
+BATCHED_INFERENCE = config.get("batched_inference", True)
+# Memory needed to interpolate one frame, in multiples of the input frame size. Only used when it can't be measured
+BATCH_MEMORY_FACTOR = 64
+MAX_PAIRS_PER_BATCH = 64
 
 class InterpolationStateList():
 
@@ -130,7 +134,20 @@ def _generic_frame_loop(
         interpolation_states: InterpolationStateList = None,
         use_timestep=True,
         dtype=torch.float16,
-        final_logging=True):
+        final_logging=True,
+        batched=False):
+
+    if batched and use_timestep and BATCHED_INFERENCE:
+        return _batched_frame_loop(
+            frames,
+            clear_cache_after_n_frames,
+            multiplier,
+            return_middle_frame_function,
+            *return_middle_frame_function_args,
+            interpolation_states=interpolation_states,
+            dtype=dtype,
+            final_logging=final_logging
+        )
     
     #https://github.com/hzwer/Practical-RIFE/blob/main/inference_video.py#L169
     def non_timestep_inference(frame0, frame1, n):        
@@ -206,6 +223,119 @@ def _generic_frame_loop(
         print("Done cache clearing")
     return output_frames[:out_len]
 
+def _output_positions(num_frames, multiplier, interpolation_states):
+    """
+    Returns the frame pairs to interpolate and where the input and middle frames go in the output,
+    the same layout _generic_frame_loop writes them in.
+    """
+    pairs, frame_positions, middle_positions = [], [], []
+    out_len = 0
+    for frame_itr in range(num_frames - 1):
+        frame_positions.append(out_len)
+        out_len += 1
+        if interpolation_states is not None and interpolation_states.is_frame_skipped(frame_itr):
+            continue
+        pairs.append(frame_itr)
+        middle_positions.extend(range(out_len, out_len + multiplier - 1))
+        out_len += multiplier - 1
+    frame_positions.append(out_len)
+    return pairs, frame_positions, middle_positions, out_len + 1
+
+def _pairs_per_batch(bytes_per_pair):
+    free_memory = get_free_memory(DEVICE)
+    return max(1, min(MAX_PAIRS_PER_BATCH, int(free_memory * 0.8 // max(bytes_per_pair, 1))))
+
+def _batched_frame_loop(
+        frames,
+        clear_cache_after_n_frames,
+        multiplier: typing.SupportsInt,
+        return_middle_frame_function,
+        *return_middle_frame_function_args,
+        interpolation_states: InterpolationStateList = None,
+        dtype=torch.float16,
+        final_logging=True):
+    """
+    Same output as _generic_frame_loop, but interpolates several frame pairs and all their timesteps in one forward call.
+    return_middle_frame_function gets a [N, 1, 1, 1] timestep tensor, one timestep per frame pair in the batch.
+
+    The first batch is a single pair, the memory it takes sizes the following batches. The input frames of the next
+    batch are copied to the device on a side stream while the current batch runs.
+    """
+    pairs, frame_positions, middle_positions, out_len = _output_positions(len(frames), multiplier, interpolation_states)
+    output_frames = torch.zeros(multiplier*frames.shape[0], *frames.shape[1:], dtype=dtype, device="cpu")
+    output_frames[frame_positions] = frames.to(device="cpu", dtype=dtype)
+
+    middles_per_pair = multiplier - 1
+    timesteps = torch.tensor([middle_i/multiplier for middle_i in range(1, multiplier)], dtype=torch.float32)
+    copy_stream = torch.cuda.Stream(DEVICE) if DEVICE.type == "cuda" else None
+
+    def load_pairs(start, count):
+        pair_indices = torch.tensor(pairs[start:start + count])
+        # Ensure that input frames are in fp32 - the same dtype as model
+        batch = torch.stack((frames[pair_indices], frames[pair_indices + 1])).to(dtype=torch.float32)
+        if copy_stream is None:
+            return batch.to(DEVICE)
+        with torch.cuda.stream(copy_stream):
+            return batch.pin_memory().to(DEVICE, non_blocking=True)
+
+    start, count = 0, 1
+    pairs_per_batch = None
+    number_of_frames_processed_since_last_cleared_cuda_cache = 0
+    batch = load_pairs(start, count) if pairs else None
+    while start < len(pairs):
+        if copy_stream is not None:
+            torch.cuda.current_stream(DEVICE).wait_stream(copy_stream)
+            batch.record_stream(torch.cuda.current_stream(DEVICE))
+            if pairs_per_batch is None:
+                torch.cuda.reset_peak_memory_stats(DEVICE)
+                memory_before = torch.cuda.memory_allocated(DEVICE)
+
+        next_start = start + count
+        if pairs_per_batch is not None and next_start < len(pairs):
+            next_batch = load_pairs(next_start, pairs_per_batch)
+
+        middle_frames = return_middle_frame_function(
+            batch[0].repeat_interleave(middles_per_pair, dim=0),
+            batch[1].repeat_interleave(middles_per_pair, dim=0),
+            timesteps.repeat(count).view(-1, 1, 1, 1).to(DEVICE),
+            *return_middle_frame_function_args
+        ).detach().cpu().to(dtype=dtype)
+
+        # Copy all middle frames of the batch to the output at once
+        output_frames[middle_positions[start * middles_per_pair:next_start * middles_per_pair]] = middle_frames
+
+        if pairs_per_batch is None:
+            if copy_stream is not None:
+                bytes_per_pair = torch.cuda.max_memory_allocated(DEVICE) - memory_before + batch.nbytes
+            else:
+                bytes_per_pair = batch.nbytes * middles_per_pair * BATCH_MEMORY_FACTOR
+            del batch, middle_frames
+            pairs_per_batch = _pairs_per_batch(bytes_per_pair)
+            if final_logging:
+                print(f"Comfy-VFI: Interpolating {pairs_per_batch} frame pairs per batch")
+            if next_start < len(pairs):
+                next_batch = load_pairs(next_start, pairs_per_batch)
+
+        number_of_frames_processed_since_last_cleared_cuda_cache += count
+        # Try to avoid a memory overflow by clearing cuda cache regularly
+        if number_of_frames_processed_since_last_cleared_cuda_cache >= clear_cache_after_n_frames:
+            soft_empty_cache()
+            number_of_frames_processed_since_last_cleared_cuda_cache = 0
+
+        start, count = next_start, min(pairs_per_batch, len(pairs) - next_start)
+        if start < len(pairs):
+            batch = next_batch
+
+    if final_logging:
+        print(f"Comfy-VFI done! {len(output_frames)} frames generated at resolution: {output_frames[0].shape}")
+    # clear cache for courtesy
+    if final_logging:
+        print("Comfy-VFI: Final clearing cache...", end = ' ')
+    soft_empty_cache()
+    if final_logging:
+        print("Done cache clearing")
+    return output_frames[:out_len]
+
 def generic_frame_loop(
         model_name,
         frames,
@@ -215,7 +345,12 @@ def generic_frame_loop(
         *return_middle_frame_function_args,
         interpolation_states: InterpolationStateList = None,
         use_timestep=True,
-        dtype=torch.float32):
+        dtype=torch.float32,
+        batched=False):
+    """
+    batched: return_middle_frame_function accepts batches of frame pairs with a [N, 1, 1, 1] timestep tensor,
+    so the pairs can be interpolated in batches instead of one timestep at a time.
+    """
 
     assert_batch_size(frames, vfi_name=model_name.replace('_', ' ').replace('VFI', ''))
     if type(multiplier) == int:
@@ -227,7 +362,8 @@ def generic_frame_loop(
             *return_middle_frame_function_args, 
             interpolation_states=interpolation_states,
             use_timestep=use_timestep,
-            dtype=dtype
+            dtype=dtype,
+            batched=batched
         )
     if type(multiplier) == list:
         multipliers = list(map(int, multiplier))
@@ -245,7 +381,8 @@ def generic_frame_loop(
                 interpolation_states=interpolation_states,
                 use_timestep=use_timestep,
                 dtype=dtype,
-                final_logging=False
+                final_logging=False,
+                batched=batched
             )
             if frame_itr != len(frames) - 2: # Not append last frame unless this batch is the last one
                 frame_batch = frame_batch[:-1]
@@ -247,36 +247,10 @@ def gen_negative_hints(w, h, x1, y1, x2, y2):
     return npoints, nplabs
 
 
-def enhance_detail(image, model, clip, vae, guide_size, guide_size_for_bbox, max_size, bbox, seed, steps, cfg,
-                   sampler_name,
-                   scheduler, positive, negative, denoise, noise_mask, force_inpaint,
-                   wildcard_opt=None, wildcard_opt_concat_mode=None,
-                   detailer_hook=None,
-                   refiner_ratio=None, refiner_model=None, refiner_clip=None, refiner_positive=None,
-                   refiner_negative=None, control_net_wrapper=None, cycle=1,
-                   inpaint_model=False, noise_mask_feather=0, scheduler_func=None,
-                   vae_tiled_encode=False, vae_tiled_decode=False):
-
-    if noise_mask is not None:
-        noise_mask = utils.tensor_gaussian_blur_mask(noise_mask, noise_mask_feather)
-        noise_mask = noise_mask.squeeze(3)
-
-        if noise_mask_feather > 0 and 'denoise_mask_function' not in model.model_options:
-            model = nodes_differential_diffusion.DifferentialDiffusion().execute(model)[0]
-
-    if wildcard_opt is not None and wildcard_opt != "":
-        model, _, wildcard_positive = wildcards.process_with_loras(wildcard_opt, model, clip)
-
-        if wildcard_opt_concat_mode == "concat":
-            positive = nodes.ConditioningConcat().concat(positive, wildcard_positive)[0]
-        else:
-            positive = wildcard_positive
-            positive = [positive[0].copy()]
-            if 'pooled_output' in wildcard_positive[0][1]:
-                positive[0][1]['pooled_output'] = wildcard_positive[0][1]['pooled_output']
-            elif 'pooled_output' in positive[0][1]:
-                del positive[0][1]['pooled_output']
-
+def get_detail_size(image, model, guide_size, guide_size_for_bbox, max_size, bbox, force_inpaint, detailer_hook=None):
+    """
+    Size the cropped `image` is upscaled to before it is detailed, or None if the segment is skipped.
+    """
     h = image.shape[1]
     w = image.shape[2]
 
@@ -286,7 +260,7 @@ def enhance_detail(image, model, clip, vae, guide_size, guide_size_for_bbox, max
     # Skip processing if the detected bbox is already larger than the guide_size
     if not force_inpaint and bbox_h >= guide_size and bbox_w >= guide_size:
         logging.info("Detailer: segment skip (enough big)")
-        return None, None
+        return None
 
     if guide_size_for_bbox:  # == "bbox"
         # Scale up based on the smaller dimension between width and height.
@@ -310,11 +284,11 @@ def enhance_detail(image, model, clip, vae, guide_size, guide_size_for_bbox, max
     if not force_inpaint:
         if upscale <= 1.0:
             logging.info(f"Detailer: segment skip [determined upscale factor={upscale}]")
-            return None, None
+            return None
 
         if new_w == 0 or new_h == 0:
             logging.info(f"Detailer: segment skip [zero size={new_w, new_h}]")
-            return None, None
+            return None
     else:
         if upscale <= 1.0 or new_w == 0 or new_h == 0:
             logging.info("Detailer: force inpaint")
@@ -327,6 +301,48 @@ def enhance_detail(image, model, clip, vae, guide_size, guide_size_for_bbox, max
 
     logging.info(f"Detailer: segment upscale for ({bbox_w, bbox_h}) | crop region {w, h} x {upscale} -> {new_w, new_h}")
 
+    return new_w, new_h
+
+
+def enhance_detail(image, model, clip, vae, guide_size, guide_size_for_bbox, max_size, bbox, seed, steps, cfg,
+                   sampler_name,
+                   scheduler, positive, negative, denoise, noise_mask, force_inpaint,
+                   wildcard_opt=None, wildcard_opt_concat_mode=None,
+                   detailer_hook=None,
+                   refiner_ratio=None, refiner_model=None, refiner_clip=None, refiner_positive=None,
+                   refiner_negative=None, control_net_wrapper=None, cycle=1,
+                   inpaint_model=False, noise_mask_feather=0, scheduler_func=None,
+                   vae_tiled_encode=False, vae_tiled_decode=False):
+
+    if noise_mask is not None:
+        noise_mask = utils.tensor_gaussian_blur_mask(noise_mask, noise_mask_feather)
+        noise_mask = noise_mask.squeeze(3)
+
+        if noise_mask_feather > 0 and 'denoise_mask_function' not in model.model_options:
+            model = nodes_differential_diffusion.DifferentialDiffusion().execute(model)[0]
+
+    if wildcard_opt is not None and wildcard_opt != "":
+        model, _, wildcard_positive = wildcards.process_with_loras(wildcard_opt, model, clip)
+
+        if wildcard_opt_concat_mode == "concat":
+            positive = nodes.ConditioningConcat().concat(positive, wildcard_positive)[0]
+        else:
+            positive = wildcard_positive
+            positive = [positive[0].copy()]
+            if 'pooled_output' in wildcard_positive[0][1]:
+                positive[0][1]['pooled_output'] = wildcard_positive[0][1]['pooled_output']
+            elif 'pooled_output' in positive[0][1]:
+                del positive[0][1]['pooled_output']
+
+    h = image.shape[1]
+    w = image.shape[2]
+
+    detail_size = get_detail_size(image, model, guide_size, guide_size_for_bbox, max_size, bbox, force_inpaint, detailer_hook)
+    if detail_size is None:
+        return None, None
+
+    new_w, new_h = detail_size
+
     # upscale
     upscaled_image = utils.tensor_resize(image, new_w, new_h)
 
@@ -388,18 +404,7 @@ def enhance_detail(image, model, clip, vae, guide_size, guide_size_for_bbox, max
             refined_latent = detailer_hook.pre_decode(refined_latent)
 
         # non-latent downscale - latent downscale cause bad quality
-        start = time.time()
-        if vae_tiled_decode:
-            (refined_image,) = nodes.VAEDecodeTiled().decode(vae, refined_latent, 512) # using default settings
-            logging.info(f"[Impact Pack] vae decoded (tiled) in {time.time() - start:.1f}s")
-        else:
-            try:
-                refined_image = vae.decode(refined_latent['samples'])
-            except Exception:
-                # usually an out-of-memory exception from the decode, so try a tiled approach
-                logging.warning(f"[Impact Pack] failed after {time.time() - start:.1f}s, doing vae.decode_tiled 64...")
-                refined_image = vae.decode_tiled(refined_latent["samples"], tile_x=64, tile_y=64, )
-            logging.info(f"[Impact Pack] vae decoded in {time.time() - start:.1f}s")
+        refined_image = decode_detail_latent(vae, refined_latent, vae_tiled_decode)
     else:
         # skipped
         refined_image = upscaled_image
@@ -423,6 +428,73 @@ def enhance_detail(image, model, clip, vae, guide_size, guide_size_for_bbox, max
     return refined_image, cnet_pils
 
 
+def decode_detail_latent(vae, refined_latent, vae_tiled_decode=False):
+    start = time.time()
+    if vae_tiled_decode:
+        (refined_image,) = nodes.VAEDecodeTiled().decode(vae, refined_latent, 512) # using default settings
+        logging.info(f"[Impact Pack] vae decoded (tiled) in {time.time() - start:.1f}s")
+    else:
+        try:
+            refined_image = vae.decode(refined_latent['samples'])
+        except Exception:
+            # usually an out-of-memory exception from the decode, so try a tiled approach
+            logging.warning(f"[Impact Pack] failed after {time.time() - start:.1f}s, doing vae.decode_tiled 64...")
+            refined_image = vae.decode_tiled(refined_latent["samples"], tile_x=64, tile_y=64, )
+        logging.info(f"[Impact Pack] vae decoded in {time.time() - start:.1f}s")
+
+    return refined_image
+
+
+# Samplers that draw fresh noise from the seed while sampling or step by batch-wide statistics. Their output changes
+# when segments share a batch, so those segments are always detailed one at a time.
+BATCH_VARIANT_SAMPLERS = ('ancestral', 'sde', 'lcm', 'ddpm', 'restart', 'sa_solver', 'seeds', 'dpm_adaptive', 'dpm_fast')
+
+
+def is_batchable_sampler(sampler_name):
+    return not any(x in sampler_name for x in BATCH_VARIANT_SAMPLERS)
+
+
+def crop_regions_overlap(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def enhance_detail_batch(images, model, vae, detail_size, seeds, steps, cfg, sampler_name, scheduler, positive, negative,
+                         denoise, noise_masks, cycle=1, noise_mask_feather=0, scheduler_func=None,
+                         vae_tiled_encode=False, vae_tiled_decode=False):
+    """
+    Batched `enhance_detail` for segments that are upscaled to the same `detail_size`.
+
+    Every segment keeps its own noise mask and its own noise seed, so the results match detailing the segments one
+    at a time with a deterministic sampler. Returns the refined images resized back to the size of each crop.
+    """
+    new_w, new_h = detail_size
+
+    if noise_masks is not None and noise_mask_feather > 0 and 'denoise_mask_function' not in model.model_options:
+        model = nodes_differential_diffusion.DifferentialDiffusion().execute(model)[0]
+
+    upscaled_image = torch.cat([utils.tensor_resize(image, new_w, new_h) for image in images])
+    latent_image = utils.to_latent_image(upscaled_image, vae, vae_tiled_encode=vae_tiled_encode)
+    samples = latent_image['samples']
+
+    if noise_masks is not None:
+        # Resized to the latent size here, the sampler would do the same for a single mask of a different size
+        latent_mask_shape = (1, 1) + tuple(samples.shape[2:])
+        latent_image['noise_mask'] = torch.cat([
+            comfy.utils.reshape_mask(utils.tensor_gaussian_blur_mask(mask, noise_mask_feather).squeeze(3), latent_mask_shape)
+            for mask in noise_masks])
+
+    refined_latent = latent_image
+    for i in range(0, cycle):
+        noise = torch.cat([Noise_RandomNoise(seed + i).generate_noise({'samples': samples[k:k+1]}) for k, seed in enumerate(seeds)])
+        refined_latent = impact_sampling.ksampler_wrapper(model, seeds[0] + i, steps, cfg, sampler_name, scheduler, positive, negative,
+                                                          refined_latent, denoise, noise=noise, scheduler_func=scheduler_func)
+
+    refined_image = decode_detail_latent(vae, refined_latent, vae_tiled_decode)
+
+    # downscale
+    return [utils.tensor_resize(refined_image[k:k+1], image.shape[2], image.shape[1]).cpu() for k, image in enumerate(images)]
+
+
 def enhance_detail_for_animatediff(image_frames, model, clip, vae, guide_size, guide_size_for_bbox, max_size, bbox, seed, steps, cfg,
                                    sampler_name,
                                    scheduler, positive, negative, denoise, noise_mask,
@@ -246,6 +246,8 @@ class DetailerForEach:
                     "scheduler_func_opt": ("SCHEDULER_FUNC",),
                     "tiled_encode": ("BOOLEAN", {"default": False, "label_on": "enabled", "label_off": "disabled"}),
                     "tiled_decode": ("BOOLEAN", {"default": False, "label_on": "enabled", "label_off": "disabled"}),
+                    "batch_segs": ("BOOLEAN", {"default": False, "label_on": "enabled", "label_off": "disabled",
+                                               "tooltip": "Sample segments that are upscaled to the same size as one batch. Only used when no detailer_hook, inpaint_model, wildcard, ControlNet or conditioning mask is involved and the sampler doesn't draw noise while sampling."}),
                    }
                 }
 
@@ -264,7 +266,8 @@ class DetailerForEach:
     def do_detail(image, segs, model, clip, vae, guide_size, guide_size_for_bbox, max_size, seed, steps, cfg, sampler_name, scheduler,
                   positive, negative, denoise, feather, noise_mask, force_inpaint, wildcard_opt=None, detailer_hook=None,
                   refiner_ratio=None, refiner_model=None, refiner_clip=None, refiner_positive=None, refiner_negative=None,
-                  cycle=1, inpaint_model=False, noise_mask_feather=0, scheduler_func_opt=None, tiled_encode=False, tiled_decode=False):
+                  cycle=1, inpaint_model=False, noise_mask_feather=0, scheduler_func_opt=None, tiled_encode=False, tiled_decode=False,
+                  batch_segs=False):
 
         if len(image) > 1:
             raise Exception('[Impact Pack] ERROR: DetailerForEach does not allow image batches.\nPlease refer to https://github.com/ltdrdata/ComfyUI-extension-tutorials/blob/Main/ComfyUI-Impact-Pack/tutorial/batching-detailer.md for more information.')
@@ -303,7 +306,78 @@ class DetailerForEach:
         if not (isinstance(model, str) and model == "DUMMY") and noise_mask_feather > 0 and 'denoise_mask_function' not in model.model_options:
             model = nodes_differential_diffusion.DifferentialDiffusion().execute(model)[0]
 
+        def has_condition_mask(conditioning):
+            return not isinstance(conditioning, str) and any('mask' in details for _, details in conditioning)
+
+        # Segments can only share a batch if nothing but the crop, the mask and the seed differs between them
+        if batch_segs:
+            batch_segs = (detailer_hook is None and not inpaint_model and refiner_model is None
+                          and not (isinstance(model, str) and model == "DUMMY")
+                          and core.is_batchable_sampler(sampler_name) and getattr(vae, 'latent_dim', 2) == 2
+                          and not has_condition_mask(positive) and not has_condition_mask(negative))
+            if not batch_segs:
+                logging.info("Detailer: segments are detailed one at a time [the options don't allow batching]")
+
+        pending = []    # detailed segments waiting to be pasted, in order
+        batches = {}    # detail size -> segments of `pending` that still have to be sampled
+
+        def paste_detailed(seg, mask, orig_cropped_image, enhanced_image, cnet_pils):
+            nonlocal image
+
+            if cnet_pils is not None:
+                cnet_pil_list.extend(cnet_pils)
+
+            if enhanced_image is not None:
+                # don't latent composite-> converting to latent caused poor quality
+                # use image paste
+                image = image.cpu()
+                enhanced_image = enhanced_image.cpu()
+                utils.tensor_paste(image, enhanced_image, (seg.crop_region[0], seg.crop_region[1]), mask)  # this code affecting to `cropped_image`.
+                enhanced_list.append(enhanced_image)
+
+                if detailer_hook is not None:
+                    image = detailer_hook.post_paste(image)
+
+            if enhanced_image is not None:
+                # Convert enhanced_pil_alpha to RGBA mode
+                enhanced_image_alpha = utils.tensor_convert_rgba(enhanced_image)
+                new_seg_image = enhanced_image.numpy()  # alpha should not be applied to seg_image
+
+                # Apply the mask
+                mask = utils.tensor_resize(mask, *utils.tensor_get_size(enhanced_image))
+                utils.tensor_putalpha(enhanced_image_alpha, mask)
+                enhanced_alpha_list.append(enhanced_image_alpha)
+            else:
+                new_seg_image = None
+
+            cropped_list.append(orig_cropped_image) # NOTE: Don't use `cropped_image`
+
+            new_seg = SEG(new_seg_image, seg.cropped_mask, seg.confidence, seg.crop_region, seg.bbox, seg.label, seg.control_net_wrapper)
+            new_segs.append(new_seg)
+
+        def flush_pending():
+            for detail_size, items in batches.items():
+                logging.info(f"Detailer: {len(items)} segment(s) detailed as a batch at {detail_size}")
+                enhanced_images = core.enhance_detail_batch([item['cropped_image'] for item in items], model, vae, detail_size,
+                                                            [item['seed'] for item in items], steps, cfg, sampler_name, scheduler,
+                                                            positive, negative, denoise,
+                                                            [item['noise_mask'] for item in items] if noise_mask else None,
+                                                            cycle=cycle, noise_mask_feather=noise_mask_feather,
+                                                            scheduler_func=scheduler_func_opt, vae_tiled_encode=tiled_encode,
+                                                            vae_tiled_decode=tiled_decode)
+                for item, enhanced_image in zip(items, enhanced_images):
+                    item['enhanced_image'] = enhanced_image
+            batches.clear()
+
+            for item in pending:
+                paste_detailed(item['seg'], item['mask'], item['cropped_image'], item['enhanced_image'], item['cnet_pils'])
+            pending.clear()
+
         for i, seg in enumerate(ordered_segs):
+            # A segment has to see the pasted result of every earlier segment it overlaps
+            if any(core.crop_regions_overlap(item['seg'].crop_region, seg.crop_region) for item in pending):
+                flush_pending()
+
             cropped_image = utils.crop_ndarray4(image.cpu().numpy(), seg.crop_region)  # Never use seg.cropped_image to handle overlapping area
             cropped_image = utils.to_tensor(cropped_image)
             mask = utils.to_tensor(seg.cropped_mask)
@@ -358,6 +432,15 @@ class DetailerForEach:
                 break
 
             orig_cropped_image = cropped_image.clone()
+            if batch_segs and not wildcard_item and seg.control_net_wrapper is None:
+                detail_size = core.get_detail_size(cropped_image, model, guide_size, guide_size_for_bbox, max_size, seg.bbox, force_inpaint)
+                item = {'seg': seg, 'mask': mask, 'cropped_image': orig_cropped_image, 'seed': seg_seed,
+                        'noise_mask': cropped_mask, 'enhanced_image': None, 'cnet_pils': None}
+                pending.append(item)
+                if detail_size is not None:
+                    batches.setdefault(detail_size, []).append(item)
+                continue
+
             if not (isinstance(model, str) and model == "DUMMY"):
                 enhanced_image, cnet_pils = core.enhance_detail(cropped_image, model, clip, vae, guide_size, guide_size_for_bbox, max_size,
                                                                 seg.bbox, seg_seed, steps, cfg, sampler_name, scheduler,
@@ -374,36 +457,13 @@ class DetailerForEach:
                 enhanced_image = cropped_image
                 cnet_pils = None
 
-            if cnet_pils is not None:
-                cnet_pil_list.extend(cnet_pils)
-
-            if enhanced_image is not None:
-                # don't latent composite-> converting to latent caused poor quality
-                # use image paste
-                image = image.cpu()
-                enhanced_image = enhanced_image.cpu()
-                utils.tensor_paste(image, enhanced_image, (seg.crop_region[0], seg.crop_region[1]), mask)  # this code affecting to `cropped_image`.
-                enhanced_list.append(enhanced_image)
-
-                if detailer_hook is not None:
-                    image = detailer_hook.post_paste(image)
-
-            if enhanced_image is not None:
-                # Convert enhanced_pil_alpha to RGBA mode
-                enhanced_image_alpha = utils.tensor_convert_rgba(enhanced_image)
-                new_seg_image = enhanced_image.numpy()  # alpha should not be applied to seg_image
-
-                # Apply the mask
-                mask = utils.tensor_resize(mask, *utils.tensor_get_size(enhanced_image))
-                utils.tensor_putalpha(enhanced_image_alpha, mask)
-                enhanced_alpha_list.append(enhanced_image_alpha)
+            if pending:
+                pending.append({'seg': seg, 'mask': mask, 'cropped_image': orig_cropped_image,
+                                'enhanced_image': enhanced_image, 'cnet_pils': cnet_pils})
             else:
-                new_seg_image = None
-
-            cropped_list.append(orig_cropped_image) # NOTE: Don't use `cropped_image`
+                paste_detailed(seg, mask, orig_cropped_image, enhanced_image, cnet_pils)
 
-            new_seg = SEG(new_seg_image, seg.cropped_mask, seg.confidence, seg.crop_region, seg.bbox, seg.label, seg.control_net_wrapper)
-            new_segs.append(new_seg)
+        flush_pending()
 
         image_tensor = utils.tensor_convert_rgb(image)
 
@@ -416,14 +476,15 @@ class DetailerForEach:
     def doit(self, image, segs, model, clip, vae, guide_size, guide_size_for, max_size, seed, steps, cfg, sampler_name,
              scheduler, positive, negative, denoise, feather, noise_mask, force_inpaint, wildcard, cycle=1,
              detailer_hook=None, inpaint_model=False, noise_mask_feather=0, scheduler_func_opt=None,
-             tiled_encode=False, tiled_decode=False):
+             tiled_encode=False, tiled_decode=False, batch_segs=False):
 
         enhanced_img, *_ = \
             DetailerForEach.do_detail(image, segs, model, clip, vae, guide_size, guide_size_for, max_size, seed, steps,
                                       cfg, sampler_name, scheduler, positive, negative, denoise, feather, noise_mask,
                                       force_inpaint, wildcard, detailer_hook,
                                       cycle=cycle, inpaint_model=inpaint_model, noise_mask_feather=noise_mask_feather,
-                                      scheduler_func_opt=scheduler_func_opt, tiled_encode=tiled_encode, tiled_decode=tiled_decode)
+                                      scheduler_func_opt=scheduler_func_opt, tiled_encode=tiled_encode, tiled_decode=tiled_decode,
+                                      batch_segs=batch_segs)
 
         return (enhanced_img, )
 
@@ -1851,7 +1912,8 @@ class DetailerForEachTest(DetailerForEach):
 
     def doit(self, image, segs, model, clip, vae, guide_size, guide_size_for, max_size, seed, steps, cfg, sampler_name,
              scheduler, positive, negative, denoise, feather, noise_mask, force_inpaint, wildcard, detailer_hook=None,
-             cycle=1, inpaint_model=False, noise_mask_feather=0, scheduler_func_opt=None, tiled_encode=False, tiled_decode=False):
+             cycle=1, inpaint_model=False, noise_mask_feather=0, scheduler_func_opt=None, tiled_encode=False, tiled_decode=False,
+             batch_segs=False):
 
         if len(image) > 1:
             raise Exception('[Impact Pack] ERROR: DetailerForEach does not allow image batches.\nPlease refer to https://github.com/ltdrdata/ComfyUI-extension-tutorials/blob/Main/ComfyUI-Impact-Pack/tutorial/batching-detailer.md for more information.')
@@ -1861,7 +1923,8 @@ class DetailerForEachTest(DetailerForEach):
                                       cfg, sampler_name, scheduler, positive, negative, denoise, feather, noise_mask,
                                       force_inpaint, wildcard, detailer_hook,
                                       cycle=cycle, inpaint_model=inpaint_model, noise_mask_feather=noise_mask_feather,
-                                      scheduler_func_opt=scheduler_func_opt, tiled_encode=tiled_encode, tiled_decode=tiled_decode)
+                                      scheduler_func_opt=scheduler_func_opt, tiled_encode=tiled_encode, tiled_decode=tiled_decode,
+                                      batch_segs=batch_segs)
 
         # set fallback image
         if len(cropped) == 0:
@@ -171,6 +171,7 @@ class reactor:
         self.interpolation = "Bicubic"
         self.boost_model_visibility = 1
         self.boost_cf_weight = 0.5
+        self.face_tracking = 0.0
         self.last_swapped_bboxes = None
         # self.last_swapped_indices = None
         self.restore_swapped_only = True
@@ -482,6 +483,7 @@ class reactor:
                 face_restore_visibility=self.boost_model_visibility,
                 codeformer_weight=self.boost_cf_weight,
                 interpolation=self.interpolation,
+                face_tracking=self.face_tracking,
             )
             result = batched_pil_to_tensor(p.init_images)
             # print(f"bbox={p.bbox}")
@@ -543,6 +545,7 @@ class ReActorPlusOpt:
         self.source_faces_index = "0"
         self.console_log_level = 1
         self.restore_swapped_only = True
+        self.face_tracking = 0.0
         # self.face_size = 512
         self.face_boost_enabled = False
         self.restore = True
@@ -561,6 +564,7 @@ class ReActorPlusOpt:
             self.input_faces_index = options["input_faces_index"]
             self.source_faces_index = options["source_faces_index"]
             self.restore_swapped_only = options["restore_swapped_only"]
+            self.face_tracking = options.get("face_tracking", 0.0)
 
         if face_boost is not None:
             self.face_boost_enabled = face_boost["enabled"]
@@ -1590,6 +1594,9 @@ class ReActorOptions:
                 "detect_gender_source": (["no","female","male"], {"default": "no"}),
                 "console_log_level": ([0, 1, 2], {"default": 1}),
                 "restore_swapped_only": ("BOOLEAN", {"default": True, "label_off": "no", "label_on": "yes"})
+            },
+            "optional": {
+                "face_tracking": ("FLOAT", {"default": 0.0, "min": 0.0, "max": 0.1, "step": 0.001, "tooltip": "Reuse the faces of the previous analyzed frame when a frame differs less than this from it (0 = analyze every frame)"}),
             }
         }
 
@@ -1597,7 +1604,7 @@ class ReActorOptions:
     FUNCTION = "execute"
     CATEGORY = "🌌 ReActor"
 
-    def execute(self,input_faces_order, input_faces_index, detect_gender_input, source_faces_order, source_faces_index, detect_gender_source, console_log_level, restore_swapped_only):
+    def execute(self,input_faces_order, input_faces_index, detect_gender_input, source_faces_order, source_faces_index, detect_gender_source, console_log_level, restore_swapped_only, face_tracking=0.0):
         options: dict = {
             "input_faces_order": input_faces_order,
             "input_faces_index": input_faces_index,
@@ -1607,6 +1614,7 @@ class ReActorOptions:
             "detect_gender_source": detect_gender_source,
             "console_log_level": console_log_level,
             "restore_swapped_only": restore_swapped_only,
+            "face_tracking": face_tracking,
         }
         return (options, )
 
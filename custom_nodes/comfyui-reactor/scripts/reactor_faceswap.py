@@ -60,6 +60,7 @@ class FaceSwapScript(scripts.Script):
         face_restore_visibility,
         codeformer_weight,
         interpolation,
+        face_tracking=0.0,
     ):
         self.enable = enable
         if self.enable:
@@ -76,6 +77,7 @@ class FaceSwapScript(scripts.Script):
             self.face_restore_visibility = face_restore_visibility
             self.codeformer_weight = codeformer_weight
             self.interpolation = interpolation
+            self.face_tracking = face_tracking
             self.source_faces_index = [
                 int(x) for x in source_faces_index.strip(",").split(",") if x.isnumeric()
             ]
@@ -143,6 +145,7 @@ class FaceSwapScript(scripts.Script):
                         face_restore_visibility=self.face_restore_visibility,
                         codeformer_weight=self.codeformer_weight,
                         interpolation=self.interpolation,
+                        face_tracking=self.face_tracking,
                     )
                     p.init_images = result
                     p.bbox = bbox
@@ -1,5 +1,6 @@
 import os
 import shutil
+from collections import OrderedDict
 from typing import List, Union
 
 import cv2
@@ -75,8 +76,14 @@ SOURCE_FACES = None
 SOURCE_IMAGE_HASH = None
 TARGET_FACES = None
 TARGET_IMAGE_HASH = None
-TARGET_FACES_LIST = []
-TARGET_IMAGE_LIST_HASH = []
+
+# Faces found in target images, keyed by the MD5 hash of the image, so repeated frames are found wherever they are
+TARGET_FACES_CACHE_SIZE = 1024
+TARGET_FACES_CACHE = OrderedDict()
+# How many target images are stacked into one face detector run
+DETECTION_BATCH_SIZE = 16
+# None until the detector was checked to give the same results for stacked images
+BATCHED_DETECTION = None
 
 def unload_model(model):
     if model is not None:
@@ -345,6 +352,172 @@ def analyze_faces(img_data: np.ndarray, det_size=(640, 640)):
 
     return faces
 
+class ReplaySession:
+    """
+    Stands in for the onnxruntime session of the face detector and returns outputs of a batched run,
+    so insightface post-processes each image of the batch exactly as if it ran alone.
+    """
+    def __init__(self, session, outputs):
+        self.session = session
+        self.outputs = outputs
+
+    def run(self, output_names, input_feed, run_options=None):
+        return self.outputs
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+def detector_blob(det_model, images):
+    # Same letterboxing as SCRFD.detect
+    input_size = det_model.input_size
+    det_images = []
+    for img in images:
+        im_ratio = float(img.shape[0]) / img.shape[1]
+        model_ratio = float(input_size[1]) / input_size[0]
+        if im_ratio > model_ratio:
+            new_height = input_size[1]
+            new_width = int(new_height / im_ratio)
+        else:
+            new_width = input_size[0]
+            new_height = int(new_width * im_ratio)
+        det_img = np.zeros((input_size[1], input_size[0], 3), dtype=np.uint8)
+        det_img[:new_height, :new_width, :] = cv2.resize(img, (new_width, new_height))
+        det_images.append(det_img)
+    mean = det_model.input_mean
+    return cv2.dnn.blobFromImages(det_images, 1.0 / det_model.input_std, tuple(input_size), (mean, mean, mean), swapRB=True)
+
+def split_detector_outputs(det_model, outputs, count):
+    if det_model.batched:
+        return [[out[i:i + 1] for out in outputs] for i in range(count)]
+    # Detectors without a batch dimension in their outputs (like buffalo_l's) concatenate the images' rows
+    if any(out.shape[0] % count for out in outputs):
+        return None
+    return [list(batch) for batch in zip(*(np.split(out, count) for out in outputs))]
+
+def run_detector_batch(det_model, images):
+    blob = detector_blob(det_model, images)
+    outputs = det_model.session.run(det_model.output_names, {det_model.input_name: blob})
+    return split_detector_outputs(det_model, outputs, len(images))
+
+def check_batched_detection(det_model, images):
+    """Runs the first two images alone and stacked once, batching is only used if both give the same outputs."""
+    global BATCHED_DETECTION
+    try:
+        stacked = run_detector_batch(det_model, images[:2])
+        single = [run_detector_batch(det_model, [img])[0] for img in images[:2]]
+        BATCHED_DETECTION = stacked is not None and all(
+            np.allclose(a, b, atol=1e-4) for s, b_outs in zip(stacked, single) for a, b in zip(s, b_outs)
+        )
+    except Exception as e:
+        logger.debug(f"Batched face detection is not supported: {e}")
+        BATCHED_DETECTION = False
+    logger.info("Batched face detection %s", "enabled" if BATCHED_DETECTION else "disabled")
+
+def detection_interrupted():
+    if state.interrupted or model_management.processing_interrupted():
+        logger.status("Interrupted by User")
+        return True
+    return False
+
+def analyze_faces_batch(images: List[np.ndarray], det_size=(640, 640), pbar=None):
+    """
+    analyze_faces for a list of images: the face detector runs on stacked images,
+    landmarks, recognition and gender/age then run per face as usual.
+    pbar is updated after every detection batch. Returns an empty list when interrupted.
+    """
+    face_analyser = getAnalysisModel(det_size)
+    det_model = face_analyser.det_model
+    if BATCHED_DETECTION is None and len(images) > 1 and hasattr(det_model, "session"):
+        check_batched_detection(det_model, images)
+    if not BATCHED_DETECTION or len(images) == 1:
+        results = []
+        for img in images:
+            if detection_interrupted():
+                return []
+            results.append(analyze_faces(img, det_size))
+            if pbar is not None:
+                pbar.update(1)
+        return results
+
+    results = []
+    for start in range(0, len(images), DETECTION_BATCH_SIZE):
+        if detection_interrupted():
+            return []
+        batch = images[start:start + DETECTION_BATCH_SIZE]
+        outputs = run_detector_batch(det_model, batch)
+        session = det_model.session
+        for img, img_outputs in zip(batch, outputs):
+            faces = []
+            det_model.session = ReplaySession(session, img_outputs)
+            try:
+                faces = face_analyser.get(img)
+            except:
+                logger.error("No faces found")
+            finally:
+                det_model.session = session
+            results.append(faces)
+        if pbar is not None:
+            pbar.update(len(batch))
+
+    # Try halving det_size for the images without faces
+    retry = [i for i, faces in enumerate(results) if len(faces) == 0]
+    if retry and det_size[0] > 320 and det_size[1] > 320:
+        retried = analyze_faces_batch([images[i] for i in retry], half_det_size(det_size))
+        if len(retried) != len(retry):
+            return []
+        for i, faces in zip(retry, retried):
+            results[i] = faces
+    return results
+
+def frames_differ(img_a: np.ndarray, img_b: np.ndarray, threshold: float):
+    """Mean absolute difference of downscaled grayscale versions of the images, relative to the full range."""
+    if img_a.shape != img_b.shape:
+        return True
+    size = (max(1, img_a.shape[1] // 8), max(1, img_a.shape[0] // 8))
+    small_a = cv2.resize(cv2.cvtColor(img_a, cv2.COLOR_BGR2GRAY), size, interpolation=cv2.INTER_AREA)
+    small_b = cv2.resize(cv2.cvtColor(img_b, cv2.COLOR_BGR2GRAY), size, interpolation=cv2.INTER_AREA)
+    return cv2.absdiff(small_a, small_b).mean() / 255.0 > threshold
+
+def analyze_target_faces(target_imgs: List[np.ndarray], tracking_threshold: float = 0.0):
+    """
+    Faces of every target image. Results are cached by image content, the images not in the cache are analyzed
+    in batches. With a tracking_threshold above 0, an image that differs less than that from the last analyzed one
+    reuses its faces instead of being analyzed. Returns an empty list when interrupted.
+    """
+    faces_list = [None] * len(target_imgs)
+    source_index = list(range(len(target_imgs)))
+    to_analyze = []
+    key_index = None
+    for i, target_img in enumerate(target_imgs):
+        target_image_md5hash = get_image_md5hash(target_img)
+        logger.info("(Image %s) Target Image MD5 Hash = %s", i, target_image_md5hash)
+        if target_image_md5hash in TARGET_FACES_CACHE:
+            TARGET_FACES_CACHE.move_to_end(target_image_md5hash)
+            faces_list[i] = TARGET_FACES_CACHE[target_image_md5hash]
+            key_index = i
+        elif tracking_threshold > 0 and key_index is not None and not frames_differ(target_imgs[key_index], target_img, tracking_threshold):
+            source_index[i] = key_index
+        else:
+            to_analyze.append(i)
+            key_index = i
+
+    if len(to_analyze) < len(target_imgs):
+        logger.status(f"Using Hashed Target Face(s) Model for {len(target_imgs) - len(to_analyze)} image(s)...")
+    if to_analyze:
+        logger.status(f"Analyzing {len(to_analyze)} Target Image(s)...")
+        pbar = progress_bar(len(to_analyze))
+        analyzed = analyze_faces_batch([target_imgs[i] for i in to_analyze], pbar=pbar)
+        progress_bar_reset(pbar)
+        if len(analyzed) != len(to_analyze):
+            return []
+        for i, faces in zip(to_analyze, analyzed):
+            faces_list[i] = faces
+            TARGET_FACES_CACHE[get_image_md5hash(target_imgs[i])] = faces
+        while len(TARGET_FACES_CACHE) > TARGET_FACES_CACHE_SIZE:
+            TARGET_FACES_CACHE.popitem(last=False)
+
+    return [faces_list[j] for j in source_index]
+
 def get_face_single(img_data: np.ndarray, face, face_index=0, det_size=(640, 640), gender_source=0, gender_target=0, order="large-small"):
 
     buffalo_path = os.path.join(insightface_models_path, "buffalo_l.zip")
@@ -563,8 +736,9 @@ def swap_face_many(
     face_restore_visibility: int = 1,
     codeformer_weight: float = 0.5,
     interpolation: str = "Bicubic",
+    face_tracking: float = 0.0,
 ):
-    global SOURCE_FACES, SOURCE_IMAGE_HASH, TARGET_FACES, TARGET_IMAGE_HASH, TARGET_FACES_LIST, TARGET_IMAGE_LIST_HASH
+    global SOURCE_FACES, SOURCE_IMAGE_HASH
     result_images = target_imgs
     bbox = []
     swapped_indexes = []
@@ -623,59 +797,11 @@ def swap_face_many(
 
         if source_faces is not None:
 
-            target_faces = []
-            pbar = progress_bar(len(target_imgs))
-
-            if len(TARGET_IMAGE_LIST_HASH) > 0:
-                logger.status(f"Using Hashed Target Face(s) Model...")
+            if state.interrupted or model_management.processing_interrupted():
+                logger.status("Interrupted by User")
+                target_faces = []
             else:
-                logger.status(f"Analyzing Target Image...")
-            
-            for i, target_img in enumerate(target_imgs):
-                if state.interrupted or model_management.processing_interrupted():
-                    logger.status("Interrupted by User")
-                    break
-                
-                target_image_md5hash = get_image_md5hash(target_img)
-                if len(TARGET_IMAGE_LIST_HASH) == 0:
-                    TARGET_IMAGE_LIST_HASH = [target_image_md5hash]
-                    target_image_same = False
-                elif len(TARGET_IMAGE_LIST_HASH) == i:
-                    TARGET_IMAGE_LIST_HASH.append(target_image_md5hash)
-                    target_image_same = False
-                else:
-                    target_image_same = True if TARGET_IMAGE_LIST_HASH[i] == target_image_md5hash else False
-                    if not target_image_same:
-                        TARGET_IMAGE_LIST_HASH[i] = target_image_md5hash
-                
-                logger.info("(Image %s) Target Image MD5 Hash = %s", i, TARGET_IMAGE_LIST_HASH[i])
-                logger.info("(Image %s) Target Image the Same? %s", i, target_image_same)
-
-                if len(TARGET_FACES_LIST) == 0:
-                    # logger.status(f"Analyzing Target Image {i}...")
-                    target_face = analyze_faces(target_img)
-                    TARGET_FACES_LIST = [target_face]
-                elif len(TARGET_FACES_LIST) == i and not target_image_same:
-                    # logger.status(f"Analyzing Target Image {i}...")
-                    target_face = analyze_faces(target_img)
-                    TARGET_FACES_LIST.append(target_face)
-                elif len(TARGET_FACES_LIST) != i and not target_image_same:
-                    # logger.status(f"Analyzing Target Image {i}...")
-                    target_face = analyze_faces(target_img)
-                    TARGET_FACES_LIST[i] = target_face
-                elif target_image_same:
-                    # logger.status("(Image %s) Using Hashed Target Face(s) Model...", i)
-                    target_face = TARGET_FACES_LIST[i]
-                
-
-                # logger.status(f"Analyzing Target Image {i}...")
-                # target_face = analyze_faces(target_img)
-                if target_face is not None:
-                    target_faces.append(target_face)
-                
-                pbar.update(1)
-
-            progress_bar_reset(pbar)
+                target_faces = analyze_target_faces(target_imgs, face_tracking)
             
             # No use in trying to swap faces if no faces are found, enhancement
             if len(target_faces) == 0:
@@ -2,6 +2,7 @@ import copy
 import heapq
 import inspect
 import logging
+import os
 import sys
 import threading
 import time
@@ -13,11 +14,13 @@ import asyncio
 import torch
 
 import comfy.model_management
+import folder_paths
 import nodes
 from comfy_execution.caching import (
     BasicCache,
     CacheKeySetID,
     CacheKeySetInputSignature,
+    DiskCache,
     NullCache,
     HierarchicalCache,
     LRUCache,
@@ -31,8 +34,11 @@ from comfy_execution.graph import (
 )
 from comfy_execution.graph_utils import GraphBuilder, is_link
 from comfy_execution.validation import validate_node_input
+from comfy_execution.scheduling import NodeScheduler
+from comfy_execution.prefetch import SKIPPED_FOLDERS
 from comfy_execution.progress import get_progress_state, reset_progress_state, add_progress_handler, WebUIProgressHandler
 from comfy_execution.utils import CurrentNodeContext
+from app.history_store import HistoryStore
 from comfy_api.internal import _ComfyNodeInternal, _NodeOutputInternal, first_real_override, is_class, make_locked_method_func
 from comfy_api.latest import io
 
@@ -117,6 +123,11 @@ class CacheSet:
         else:
             self.init_classic_cache()
 
+        cache_disk = cache_args.get("disk", None) if cache_args is not None else None
+        if cache_disk is not None:
+            self.init_disk_cache(cache_disk, cache_args.get("disk_size", 10.0))
+            logging.info("Using persistent disk cache in {}".format(cache_disk))
+
         self.all = [self.outputs, self.objects]
 
     # Performs like the old cache -- dump data ASAP
@@ -132,6 +143,10 @@ class CacheSet:
         self.outputs = RAMPressureCache(CacheKeySetInputSignature)
         self.objects = HierarchicalCache(CacheKeySetID)
 
+    # Keeps the outputs of nodes that opt in with PERSISTENT_CACHE on disk across restarts
+    def init_disk_cache(self, directory, max_size_gb):
+        self.outputs = DiskCache(self.outputs, directory, max_size=max_size_gb * (1024 ** 3), entry_class=CacheEntry, get_prompt_models=get_prompt_models)
+
     def init_null_cache(self):
         self.outputs = NullCache()
         self.objects = NullCache()
@@ -223,7 +238,7 @@ async def resolve_map_node_over_list_results(results):
                 raise exc
         return [x.result() if isinstance(x, asyncio.Task) else x for x in results]
 
-async def _async_map_node_over_list(prompt_id, unique_id, obj, input_data_all, func, allow_interrupt=False, execution_block_cb=None, pre_execute_cb=None, hidden_inputs=None):
+async def _async_map_node_over_list(prompt_id, unique_id, obj, input_data_all, func, allow_interrupt=False, execution_block_cb=None, pre_execute_cb=None, hidden_inputs=None, node_executor=None):
     # check if node wants the lists
     input_is_list = getattr(obj, "INPUT_IS_LIST", False)
 
@@ -251,7 +266,7 @@ async def _async_map_node_over_list(prompt_id, unique_id, obj, input_data_all, f
                 execution_block = execution_block_cb(v) if execution_block_cb else v
                 break
         if execution_block is None:
-            if pre_execute_cb is not None and index is not None:
+            if pre_execute_cb is not None and index is not None and node_executor is None:
                 pre_execute_cb(index)
             # V3
             if isinstance(obj, _ComfyNodeInternal) or (is_class(obj) and issubclass(obj, _ComfyNodeInternal)):
@@ -281,6 +296,15 @@ async def _async_map_node_over_list(prompt_id, unique_id, obj, input_data_all, f
                     results.append(result)
                 else:
                     results.append(task)
+            elif node_executor is not None:
+                def run_node():
+                    # The default GraphBuilder prefix is per thread, so it has to be set on the worker
+                    if pre_execute_cb is not None and index is not None:
+                        pre_execute_cb(index)
+                    with CurrentNodeContext(prompt_id, unique_id, index):
+                        return f(**inputs)
+                result = await node_executor(run_node)
+                results.append(result)
             else:
                 with CurrentNodeContext(prompt_id, unique_id, index):
                     result = f(**inputs)
@@ -320,8 +344,8 @@ def merge_result_data(results, obj):
             output.append([o[i] for o in results])
     return output
 
-async def get_output_data(prompt_id, unique_id, obj, input_data_all, execution_block_cb=None, pre_execute_cb=None, hidden_inputs=None):
-    return_values = await _async_map_node_over_list(prompt_id, unique_id, obj, input_data_all, obj.FUNCTION, allow_interrupt=True, execution_block_cb=execution_block_cb, pre_execute_cb=pre_execute_cb, hidden_inputs=hidden_inputs)
+async def get_output_data(prompt_id, unique_id, obj, input_data_all, execution_block_cb=None, pre_execute_cb=None, hidden_inputs=None, node_executor=None):
+    return_values = await _async_map_node_over_list(prompt_id, unique_id, obj, input_data_all, obj.FUNCTION, allow_interrupt=True, execution_block_cb=execution_block_cb, pre_execute_cb=pre_execute_cb, hidden_inputs=hidden_inputs, node_executor=node_executor)
     has_pending_task = any(isinstance(r, asyncio.Task) and not r.done() for r in return_values)
     if has_pending_task:
         return return_values, {}, False, has_pending_task
@@ -401,7 +425,7 @@ def format_value(x):
     else:
         return str(x)
 
-async def execute(server, dynprompt, caches, current_item, extra_data, executed, prompt_id, execution_list, pending_subgraph_results, pending_async_nodes, ui_outputs):
+async def execute(server, dynprompt, caches, current_item, extra_data, executed, prompt_id, execution_list, pending_subgraph_results, pending_async_nodes, ui_outputs, scheduler=None):
     unique_id = current_item
     real_node_id = dynprompt.get_real_node_id(unique_id)
     display_node_id = dynprompt.get_display_node_id(unique_id)
@@ -507,7 +531,8 @@ async def execute(server, dynprompt, caches, current_item, extra_data, executed,
             def pre_execute_cb(call_index):
                 # TODO - How to handle this with async functions without contextvars (which requires Python 3.12)?
                 GraphBuilder.set_default_prefix(unique_id, call_index, 0)
-            output_data, output_ui, has_subgraph, has_pending_tasks = await get_output_data(prompt_id, unique_id, obj, input_data_all, execution_block_cb=execution_block_cb, pre_execute_cb=pre_execute_cb, hidden_inputs=hidden_inputs)
+            node_executor = scheduler.get_node_executor(class_def, class_type) if scheduler is not None else None
+            output_data, output_ui, has_subgraph, has_pending_tasks = await get_output_data(prompt_id, unique_id, obj, input_data_all, execution_block_cb=execution_block_cb, pre_execute_cb=pre_execute_cb, hidden_inputs=hidden_inputs, node_executor=node_executor)
             if has_pending_tasks:
                 pending_async_nodes[unique_id] = output_data
                 unblock = execution_list.add_external_block(unique_id)
@@ -612,10 +637,15 @@ async def execute(server, dynprompt, caches, current_item, extra_data, executed,
     return (ExecutionResult.SUCCESS, None, None)
 
 class PromptExecutor:
-    def __init__(self, server, cache_type=False, cache_args=None):
+    def __init__(self, server, cache_type=False, cache_args=None, parallel_threads=0, device=None):
         self.cache_args = cache_args
         self.cache_type = cache_type
         self.server = server
+        self.scheduler = None
+        if parallel_threads > 0:
+            self.scheduler = NodeScheduler(parallel_threads, device=device)
+        # Kept between prompts so resources bound to the loop, like the open connections of API nodes, are reused
+        self.loop = None
         self.reset()
 
     def reset(self):
@@ -623,6 +653,19 @@ class PromptExecutor:
         self.status_messages = []
         self.success = True
 
+    def close(self):
+        """Closes the event loop kept between prompts and the API nodes session bound to it, execute opens a new one."""
+        if self.loop is None or self.loop.is_closed():
+            self.loop = None
+            return
+        from comfy_api_nodes.util.session_pool import close_session
+        try:
+            self.loop.run_until_complete(close_session())
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+        finally:
+            self.loop.close()
+            self.loop = None
+
     def add_message(self, event, data: dict, broadcast: bool):
         data = {
             **data,
@@ -661,9 +704,22 @@ class PromptExecutor:
             self.add_message("execution_error", mes, broadcast=False)
 
     def execute(self, prompt, prompt_id, extra_data={}, execute_outputs=[]):
-        asyncio.run(self.execute_async(prompt, prompt_id, extra_data, execute_outputs))
+        if self.loop is None or self.loop.is_closed():
+            self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self.execute_async(prompt, prompt_id, extra_data, execute_outputs))
+        finally:
+            # An interrupt that arrived after the last check must not stay around
+            nodes.interrupt_processing(False, prompt_id=prompt_id)
+            # Same as asyncio.run(), nothing started by a prompt keeps running after it
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            if len(pending) > 0:
+                self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
 
     async def execute_async(self, prompt, prompt_id, extra_data={}, execute_outputs=[]):
+        comfy.model_management.set_current_prompt(prompt_id)
         nodes.interrupt_processing(False)
 
         if "client_id" in extra_data:
@@ -685,7 +741,7 @@ class PromptExecutor:
 
             cached_nodes = []
             for node_id in prompt:
-                if self.caches.outputs.get(node_id) is not None:
+                if self.caches.outputs.has(node_id):
                     cached_nodes.append(node_id)
 
             comfy.model_management.cleanup_models_gc()
@@ -701,26 +757,30 @@ class PromptExecutor:
             for node_id in list(execute_outputs):
                 execution_list.add_node(node_id)
 
-            while not execution_list.is_empty():
-                node_id, error, ex = await execution_list.stage_node_execution()
-                if error is not None:
-                    self.handle_execution_error(prompt_id, dynamic_prompt.original_prompt, current_outputs, executed, error, ex)
-                    break
-
-                assert node_id is not None, "Node ID should not be None at this point"
-                result, error, ex = await execute(self.server, dynamic_prompt, self.caches, node_id, extra_data, executed, prompt_id, execution_list, pending_subgraph_results, pending_async_nodes, ui_node_outputs)
-                self.success = result != ExecutionResult.FAILURE
-                if result == ExecutionResult.FAILURE:
-                    self.handle_execution_error(prompt_id, dynamic_prompt.original_prompt, current_outputs, executed, error, ex)
-                    break
-                elif result == ExecutionResult.PENDING:
-                    execution_list.unstage_node_execution()
-                else: # result == ExecutionResult.SUCCESS:
-                    execution_list.complete_node_execution()
-                self.caches.outputs.poll(ram_headroom=self.cache_args["ram"])
+            if self.scheduler is not None:
+                if await self.execute_parallel(prompt_id, dynamic_prompt, extra_data, executed, execution_list, current_outputs, pending_subgraph_results, pending_async_nodes, ui_node_outputs):
+                    self.add_message("execution_success", { "prompt_id": prompt_id }, broadcast=False)
             else:
-                # Only execute when the while-loop ends without break
-                self.add_message("execution_success", { "prompt_id": prompt_id }, broadcast=False)
+                while not execution_list.is_empty():
+                    node_id, error, ex = await execution_list.stage_node_execution()
+                    if error is not None:
+                        self.handle_execution_error(prompt_id, dynamic_prompt.original_prompt, current_outputs, executed, error, ex)
+                        break
+
+                    assert node_id is not None, "Node ID should not be None at this point"
+                    result, error, ex = await execute(self.server, dynamic_prompt, self.caches, node_id, extra_data, executed, prompt_id, execution_list, pending_subgraph_results, pending_async_nodes, ui_node_outputs)
+                    self.success = result != ExecutionResult.FAILURE
+                    if result == ExecutionResult.FAILURE:
+                        self.handle_execution_error(prompt_id, dynamic_prompt.original_prompt, current_outputs, executed, error, ex)
+                        break
+                    elif result == ExecutionResult.PENDING:
+                        execution_list.unstage_node_execution()
+                    else: # result == ExecutionResult.SUCCESS:
+                        execution_list.complete_node_execution()
+                    self.caches.outputs.poll(ram_headroom=self.cache_args["ram"])
+                else:
+                    # Only execute when the while-loop ends without break
+                    self.add_message("execution_success", { "prompt_id": prompt_id }, broadcast=False)
 
             ui_outputs = {}
             meta_outputs = {}
@@ -735,6 +795,60 @@ class PromptExecutor:
             if comfy.model_management.DISABLE_SMART_MEMORY:
                 comfy.model_management.unload_all_models()
 
+    async def execute_parallel(self, prompt_id, dynamic_prompt, extra_data, executed, execution_list, current_outputs, pending_subgraph_results, pending_async_nodes, ui_node_outputs):
+        """
+        Executes every ready node at once instead of one at a time, using the scheduler to decide which thread
+        each node function runs on. Returns True if all nodes executed successfully.
+        """
+        running = {}
+        failure = None
+        while failure is None or len(running) > 0:
+            if failure is None:
+                node_ids, error, ex = await execution_list.stage_ready_nodes(in_flight=len(running) > 0)
+                if error is not None:
+                    failure = (error, ex)
+                for node_id in node_ids:
+                    task = asyncio.create_task(execute(self.server, dynamic_prompt, self.caches, node_id, extra_data, executed, prompt_id, execution_list, pending_subgraph_results, pending_async_nodes, ui_node_outputs, scheduler=self.scheduler))
+                    running[task] = node_id
+            if len(running) == 0:
+                break
+
+            waiting = set(running)
+            unblocked = None
+            if execution_list.externalBlocks > 0:
+                # A pending async node may release new nodes before any running node finishes
+                unblocked = asyncio.create_task(execution_list.unblockedEvent.wait())
+                waiting.add(unblocked)
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if unblocked is not None:
+                if unblocked in done:
+                    execution_list.unblockedEvent.clear()
+                else:
+                    unblocked.cancel()
+
+            for task in done:
+                if task is unblocked:
+                    continue
+                node_id = running.pop(task)
+                result, error, ex = task.result()
+                if failure is not None:
+                    # Let the remaining nodes finish, but only report the first error
+                    continue
+                self.success = result != ExecutionResult.FAILURE
+                if result == ExecutionResult.FAILURE:
+                    failure = (error, ex)
+                elif result == ExecutionResult.PENDING:
+                    execution_list.unstage_node_execution(node_id)
+                else: # result == ExecutionResult.SUCCESS:
+                    execution_list.complete_node_execution(node_id)
+            self.caches.outputs.poll(ram_headroom=self.cache_args["ram"])
+
+        if failure is not None:
+            self.success = False
+            self.handle_execution_error(prompt_id, dynamic_prompt.original_prompt, current_outputs, executed, *failure)
+            return False
+        return True
+
 
 async def validate_inputs(prompt_id, prompt, item, validated):
     unique_id = item
@@ -1088,35 +1202,149 @@ async def validate_prompt(prompt_id, prompt, partial_execution_list: Union[list[
 
 MAXIMUM_HISTORY_SIZE = 10000
 
+def get_model_folder(class_type, input_name, name):
+    """
+    Returns the model folder a loader input lists name from: the folder holding name whose files are all options of
+    the combo input. None if the input isn't a combo or no folder matches.
+    """
+    class_def = nodes.NODE_CLASS_MAPPINGS.get(class_type, None)
+    if class_def is None:
+        return None
+    try:
+        input_type, _, extra_info = get_input_info(class_def, input_name)
+    except Exception:
+        return None
+    options = input_type if isinstance(input_type, list) else extra_info.get("options", None) if input_type == "COMBO" else None
+    if not options or name not in options:
+        return None
+    options = set(options)
+    for folder_name in folder_paths.folder_names_and_paths:
+        if folder_name in SKIPPED_FOLDERS:
+            continue
+        files = folder_paths.get_filename_list(folder_name)
+        if name in files and options.issuperset(files):
+            return folder_name
+    return None
+
+def get_prompt_models(prompt, folders=False):
+    """
+    Returns the model files a prompt refers to in its widget values. Prompt workers use this to pick queued prompts
+    that use the models they already have loaded. With folders=True (folder name, file name) pairs are returned, the
+    folder being the one given by get_model_folder.
+    """
+    models = set()
+    for node in prompt.values():
+        for input_name, value in node.get("inputs", {}).items():
+            if isinstance(value, str) and os.path.splitext(value)[1].lower() in folder_paths.supported_pt_extensions:
+                if folders:
+                    models.add((get_model_folder(node.get("class_type", None), input_name, value), value))
+                else:
+                    models.add(value)
+    return models
+
 class PromptQueue:
+    # Lanes are served in this order, a lane only runs when all lanes before it are empty.
+    LANES = ("interactive", "batch")
+    DEFAULT_LANE = "interactive"
+    # How many times the item at the front of a lane can be passed over for one that matches a worker's affinity
+    AFFINITY_WINDOW = 8
+
     def __init__(self, server):
         self.server = server
         self.mutex = threading.RLock()
         self.not_empty = threading.Condition(self.mutex)
         self.task_counter = 0
-        self.queue = []
+        # Each lane is a heap of [number, sequence, item, models, times passed over] entries. Deleted entries get
+        # their item set to None and are skipped when popped, so removing an item doesn't need a scan and re-heapify.
+        self.lanes = {lane: [] for lane in self.LANES}
+        # The same entries per lane and model file, for finding the first queued item that uses a model
+        self.model_lanes = {lane: {} for lane in self.LANES}
+        self.index = {}
+        self.queued_count = 0
+        self.sequence = 0
+        self.version = 0
+        self.snapshot = None
         self.currently_running = {}
-        self.history = {}
+        self.history = HistoryStore(MAXIMUM_HISTORY_SIZE)
         self.flags = {}
-
-    def put(self, item):
+        # Flags not read yet by each registered prompt worker, see add_worker
+        self.worker_flags = []
+
+    def _changed(self):
+        self.version += 1
+        self.snapshot = None
+        self.server.queue_updated()
+
+    def put(self, item, lane=None):
+        if lane is None:
+            lane = self.DEFAULT_LANE
+        if lane not in self.lanes:
+            raise ValueError("Unknown queue lane: {}".format(lane))
+        models = get_prompt_models(item[2])
         with self.mutex:
-            heapq.heappush(self.queue, item)
-            self.server.queue_updated()
+            entry = [item[0], self.sequence, item, models, 0]
+            self.sequence += 1
+            heapq.heappush(self.lanes[lane], entry)
+            for name in models:
+                heapq.heappush(self.model_lanes[lane].setdefault(name, []), entry)
+            self.index[item[1]] = entry
+            self.queued_count += 1
+            self._changed()
             self.not_empty.notify()
 
-    def get(self, timeout=None):
+    @staticmethod
+    def _drop_deleted(heap):
+        while len(heap) > 0 and heap[0][2] is None:
+            heapq.heappop(heap)
+
+    def _first_using(self, lane, models):
+        first = None
+        model_lane = self.model_lanes[lane]
+        for name in models:
+            heap = model_lane.get(name)
+            if heap is None:
+                continue
+            self._drop_deleted(heap)
+            if len(heap) == 0:
+                del model_lane[name]
+            elif first is None or heap[0] < first:
+                first = heap[0]
+        return first
+
+    def _pop(self, affinity=None):
+        for lane in self.LANES:
+            heap = self.lanes[lane]
+            self._drop_deleted(heap)
+            if len(heap) == 0:
+                continue
+            head = heap[0]
+            if affinity and head[4] < self.AFFINITY_WINDOW and affinity.isdisjoint(head[3]):
+                entry = self._first_using(lane, affinity)
+                if entry is not None:
+                    head[4] += 1
+                    return self._take_entry(entry)
+            return self._take_entry(heapq.heappop(heap))
+        return None
+
+    def get(self, timeout=None, affinity=None):
+        """
+        Takes the next item to execute. affinity is an optional set of model files, the first item of the lane that
+        uses one of them is taken instead of the item at the front, unless that one was already passed over
+        AFFINITY_WINDOW times.
+        """
         with self.not_empty:
-            while len(self.queue) == 0:
+            while self.queued_count == 0:
                 self.not_empty.wait(timeout=timeout)
-                if timeout is not None and len(self.queue) == 0:
+                if timeout is not None and self.queued_count == 0:
                     return None
-            item = heapq.heappop(self.queue)
+            item = self._pop(affinity)
             i = self.task_counter
-            self.currently_running[i] = copy.deepcopy(item)
+            self.currently_running[i] = item
             self.task_counter += 1
-            self.server.queue_updated()
-            return (item, i)
+            self._changed()
+        # Execution writes into the prompt graph (is_changed results), keep the queued item untouched for the
+        # history and copy outside the lock so readers of the queue aren't blocked.
+        return (item[:2] + (copy.deepcopy(item[2]),) + item[3:], i)
 
     class ExecutionStatus(NamedTuple):
         status_str: Literal['success', 'error']
@@ -1126,104 +1354,155 @@ class PromptQueue:
     def task_done(self, item_id, history_result,
                   status: Optional['PromptQueue.ExecutionStatus'], process_item=None):
         with self.mutex:
-            prompt = self.currently_running.pop(item_id)
-            if len(self.history) > MAXIMUM_HISTORY_SIZE:
-                self.history.pop(next(iter(self.history)))
+            prompt = self.currently_running[item_id]
 
-            status_dict: Optional[dict] = None
-            if status is not None:
-                status_dict = copy.deepcopy(status._asdict())
+        status_dict: Optional[dict] = None
+        if status is not None:
+            status_dict = copy.deepcopy(status._asdict())
 
-            if process_item is not None:
-                prompt = process_item(prompt)
+        if process_item is not None:
+            prompt = process_item(prompt)
 
-            self.history[prompt[1]] = {
-                "prompt": prompt,
-                "outputs": {},
-                'status': status_dict,
-            }
-            self.history[prompt[1]].update(history_result)
-            self.server.queue_updated()
+        entry = {
+            "prompt": prompt,
+            "outputs": {},
+            'status': status_dict,
+        }
+        entry.update(history_result)
+        # The history has its own lock and may write to the database, other workers can keep taking prompts meanwhile.
+        # The prompt stays in currently_running until it can be found in the history.
+        self.history.add(prompt[1], entry)
+        with self.mutex:
+            self.currently_running.pop(item_id)
+            self._changed()
 
-    # Note: slow
-    def get_current_queue(self):
+    def _get_snapshot(self):
+        with self.mutex:
+            if self.snapshot is not None:
+                return self.snapshot
+            version = self.version
+            running = list(self.currently_running.values())
+            lanes = [[(entry[0], entry[1], entry[2]) for entry in self.lanes[lane] if entry[2] is not None] for lane in self.LANES]
+        # Sorting happens outside the lock so the worker isn't held up by queue polling
+        queued = []
+        for entries in lanes:
+            queued += [entry[2] for entry in sorted(entries, key=lambda e: (e[0], e[1]))]
+        snapshot = (running, queued)
         with self.mutex:
-            out = []
-            for x in self.currently_running.values():
-                out += [x]
-            return (out, copy.deepcopy(self.queue))
+            if self.version == version:
+                self.snapshot = snapshot
+        return snapshot
+
+    # Queued and running items are never modified, so snapshots share them instead of copying.
+    # The lists are rebuilt only after the queue changes and pending items are in execution order.
+    def get_current_queue(self):
+        running, queued = self._get_snapshot()
+        return (list(running), list(queued))
 
-    # read-safe as long as queue items are immutable
     def get_current_queue_volatile(self):
-        with self.mutex:
-            running = [x for x in self.currently_running.values()]
-            queued = copy.copy(self.queue)
-            return (running, queued)
+        return self._get_snapshot()
 
     def get_tasks_remaining(self):
         with self.mutex:
-            return len(self.queue) + len(self.currently_running)
+            return self.queued_count + len(self.currently_running)
 
     def wipe_queue(self):
         with self.mutex:
-            self.queue = []
-            self.server.queue_updated()
+            self.lanes = {lane: [] for lane in self.LANES}
+            self.model_lanes = {lane: {} for lane in self.LANES}
+            self.index = {}
+            self.queued_count = 0
+            self._changed()
+
+    def _take_entry(self, entry):
+        item = entry[2]
+        entry[2] = None
+        if self.index.get(item[1]) is entry:
+            del self.index[item[1]]
+        self.queued_count -= 1
+        for lane in self.LANES:
+            # Drop deleted entries once they make up most of a lane
+            if len(self.lanes[lane]) > 2 * self.queued_count + 64:
+                self.lanes[lane] = [e for e in self.lanes[lane] if e[2] is not None]
+                heapq.heapify(self.lanes[lane])
+                model_lane = {}
+                for e in self.lanes[lane]:
+                    for name in e[3]:
+                        model_lane.setdefault(name, []).append(e)
+                for heap in model_lane.values():
+                    heapq.heapify(heap)
+                self.model_lanes[lane] = model_lane
+        return item
+
+    def _delete_entry(self, entry):
+        self._take_entry(entry)
+        self._changed()
+
+    def delete_queue_item_by_id(self, prompt_id):
+        with self.mutex:
+            entry = self.index.get(prompt_id)
+            if entry is None:
+                return False
+            self._delete_entry(entry)
+            return True
 
     def delete_queue_item(self, function):
         with self.mutex:
-            for x in range(len(self.queue)):
-                if function(self.queue[x]):
-                    if len(self.queue) == 1:
-                        self.wipe_queue()
-                    else:
-                        self.queue.pop(x)
-                        heapq.heapify(self.queue)
-                    self.server.queue_updated()
-                    return True
+            for lane in self.LANES:
+                for entry in self.lanes[lane]:
+                    if entry[2] is not None and function(entry[2]):
+                        self._delete_entry(entry)
+                        return True
         return False
 
     def get_history(self, prompt_id=None, max_items=None, offset=-1, map_function=None):
-        with self.mutex:
-            if prompt_id is None:
-                out = {}
-                i = 0
-                if offset < 0 and max_items is not None:
-                    offset = len(self.history) - max_items
-                for k in self.history:
-                    if i >= offset:
-                        p = self.history[k]
-                        if map_function is not None:
-                            p = map_function(p)
-                        out[k] = p
-                        if max_items is not None and len(out) >= max_items:
-                            break
-                    i += 1
-                return out
-            elif prompt_id in self.history:
-                p = self.history[prompt_id]
-                if map_function is None:
-                    p = copy.deepcopy(p)
-                else:
+        if prompt_id is None:
+            if offset < 0 and max_items is not None:
+                offset = len(self.history) - max_items
+            out = {}
+            for k, p in self.history.get_range(offset, max_items):
+                if map_function is not None:
                     p = map_function(p)
-                return {prompt_id: p}
-            else:
+                out[k] = p
+            return out
+        else:
+            p = self.history.get(prompt_id)
+            if p is None:
                 return {}
+            if map_function is not None:
+                p = map_function(p)
+            return {prompt_id: p}
 
     def wipe_history(self):
-        with self.mutex:
-            self.history = {}
+        self.history.clear()
 
     def delete_history_item(self, id_to_delete):
+        self.history.delete(id_to_delete)
+
+    def add_worker(self):
+        """
+        Registers a prompt worker and returns its id for get_flags. Every registered worker gets its own copy of the
+        flags set afterwards, so an unload or free memory request reaches the models and caches of all of them.
+        """
         with self.mutex:
-            self.history.pop(id_to_delete, None)
+            self.worker_flags.append({})
+            return len(self.worker_flags) - 1
 
     def set_flag(self, name, data):
         with self.mutex:
             self.flags[name] = data
-            self.not_empty.notify()
+            for flags in self.worker_flags:
+                flags[name] = data
+            self.not_empty.notify_all()
 
-    def get_flags(self, reset=True):
+    def get_flags(self, reset=True, worker=None):
         with self.mutex:
+            if worker is not None:
+                ret = self.worker_flags[worker]
+                if reset:
+                    self.worker_flags[worker] = {}
+                    return ret
+                return ret.copy()
             if reset:
                 ret = self.flags
                 self.flags = {}
@@ -2,12 +2,15 @@ from __future__ import annotations
 
 import os
 import time
+import threading
 import mimetypes
 import logging
 from typing import Literal, List
 from collections.abc import Collection
+from contextlib import contextmanager
 
 from comfy.cli_args import args
+from utils.directory_index import FolderIndex
 
 supported_pt_extensions: set[str] = {'.ckpt', '.pt', '.pt2', '.bin', '.pth', '.safetensors', '.pkl', '.sft'}
 
@@ -89,6 +92,75 @@ class CacheHelper:
 
 cache_helper = CacheHelper()
 
+folder_index: FolderIndex | None = None
+
+def get_folder_index() -> FolderIndex | None:
+    """
+    The watcher-driven index of the model folders if --index-model-folders is set. With it, file lists and full paths
+    are answered from memory instead of walking and checking the folders.
+    """
+    global folder_index
+    if folder_index is None and args.index_model_folders is not None:
+        folder_index = FolderIndex(mode=args.index_model_folders, poll_interval=args.index_poll_interval, excluded_dir_names=[".git"])
+    return folder_index
+
+dependency_recorder = threading.local()
+
+@contextmanager
+def record_dependencies():
+    """
+    Records the model folders and directories that are looked up through this module while active, in the calling
+    thread. The yielded dict can be passed to dependencies_changed() later to know if the files they contain changed.
+    """
+    dependencies = {}
+    previous = getattr(dependency_recorder, "dependencies", None)
+    dependency_recorder.dependencies = dependencies
+    try:
+        yield dependencies
+    finally:
+        dependency_recorder.dependencies = previous
+        if previous is not None:
+            previous.update(dependencies)
+
+def _record_dependency(key: tuple[str, str], get_state) -> None:
+    dependencies = getattr(dependency_recorder, "dependencies", None)
+    if dependencies is not None and key not in dependencies:
+        dependencies[key] = get_state()
+
+def directory_mtimes(directory: str) -> dict:
+    """
+    State of a directory that changes when files are added to or removed from it. With the folder index this is the
+    version of its index, which covers subdirectories too. Without it only the modification time of the directory
+    itself is checked, walking it on every /object_info request is too slow for large input and output directories.
+    Nodes list the top level of these directories, files in subdirectories show up once the directory changes.
+    """
+    index = get_folder_index()
+    if index is not None:
+        return index.versions([directory])
+    try:
+        return {directory: os.path.getmtime(directory)}
+    except OSError:
+        return {}
+
+def dependencies_changed(dependencies: dict, checked: dict | None = None) -> bool:
+    """
+    Checks dependencies recorded by record_dependencies(). checked can be shared between calls to only check each
+    folder once.
+    """
+    if checked is None:
+        checked = {}
+    for key, state in dependencies.items():
+        if key not in checked:
+            kind, name = key
+            if kind == "folder":
+                checked[key] = cached_filename_list_(name)
+            else:
+                checked[key] = directory_mtimes(name)
+        current = checked[key]
+        if current is not state and current != state:
+            return True
+    return False
+
 extension_mimetypes_cache = {
     "webp" : "image",
     "fbx" : "model",
@@ -119,14 +191,17 @@ def set_input_directory(input_dir: str) -> None:
 
 def get_output_directory() -> str:
     global output_directory
+    _record_dependency(("directory", output_directory), lambda: directory_mtimes(output_directory))
     return output_directory
 
 def get_temp_directory() -> str:
     global temp_directory
+    _record_dependency(("directory", temp_directory), lambda: directory_mtimes(temp_directory))
     return temp_directory
 
 def get_input_directory() -> str:
     global input_directory
+    _record_dependency(("directory", input_directory), lambda: directory_mtimes(input_directory))
     return input_directory
 
 def get_user_directory() -> str:
@@ -356,6 +431,12 @@ def get_full_path(folder_name: str, filename: str) -> str | None:
         return None
     folders = folder_names_and_paths[folder_name]
     filename = os.path.relpath(os.path.join("/", filename), "/")
+    index = get_folder_index()
+    if index is not None:
+        for x in folders[0]:
+            if index.contains(x, filename):
+                return os.path.join(x, filename)
+        return None
     for x in folders[0]:
         full_path = os.path.join(x, filename)
         if os.path.isfile(full_path):
@@ -381,6 +462,11 @@ def get_filename_list_(folder_name: str) -> tuple[list[str], dict[str, float], f
     global folder_names_and_paths
     output_list = set()
     folders = folder_names_and_paths[folder_name]
+    index = get_folder_index()
+    if index is not None:
+        # The versions of the indexes take the place of the directory mtimes
+        files, versions = index.list_files(folders[0])
+        return filter_files_extensions(files, folders[1]), versions, time.perf_counter()
     output_folders = {}
     for x in folders[0]:
         files, folders_all = recursive_search(x, excluded_dir_names=[".git"])
@@ -401,6 +487,12 @@ def cached_filename_list_(folder_name: str) -> tuple[list[str], dict[str, float]
         return None
     out = filename_list_cache[folder_name]
 
+    index = get_folder_index()
+    if index is not None:
+        if index.versions(folder_names_and_paths[folder_name][0]) != out[1]:
+            return None
+        return out
+
     for x in out[1]:
         time_modified = out[1][x]
         folder = x
@@ -423,6 +515,7 @@ def get_filename_list(folder_name: str) -> list[str]:
         global filename_list_cache
         filename_list_cache[folder_name] = out
     cache_helper.set(folder_name, out)
+    _record_dependency(("folder", folder_name), lambda: out)
     return list(out[0])
 
 def get_save_image_path(filename_prefix: str, output_dir: str, image_width=0, image_height=0) -> tuple[str, str, int, str, str]:
@@ -167,7 +167,8 @@ def cuda_malloc_warning():
             logging.warning("\nWARNING: this card most likely does not support cuda-malloc, if you get \"CUDA error\" please run ComfyUI with: --disable-cuda-malloc\n")
 
 
-def prompt_worker(q, server_instance):
+def prompt_worker(q, server_instance, device=None, use_affinity=False):
+    comfy.model_management.set_torch_device(device)
     current_time: float = 0.0
     cache_type = execution.CacheType.CLASSIC
     if args.cache_lru > 0:
@@ -177,72 +178,85 @@ def prompt_worker(q, server_instance):
     elif args.cache_none:
         cache_type = execution.CacheType.NONE
 
-    e = execution.PromptExecutor(server_instance, cache_type=cache_type, cache_args={ "lru" : args.cache_lru, "ram" : args.cache_ram } )
+    e = execution.PromptExecutor(server_instance, cache_type=cache_type, cache_args={ "lru" : args.cache_lru, "ram" : args.cache_ram, "disk" : args.cache_disk, "disk_size" : args.cache_disk_size }, parallel_threads=args.parallel_execution, device=device)
     last_gc_collect = 0
+    # Prefer queued prompts that use the models of the last prompt of this worker, they are likely still loaded on its device
+    last_models = set()
+    worker = q.add_worker()
     need_gc = False
     gc_collect_interval = 10.0
 
-    while True:
-        timeout = 1000.0
-        if need_gc:
-            timeout = max(gc_collect_interval - (current_time - last_gc_collect), 0.0)
-
-        queue_item = q.get(timeout=timeout)
-        if queue_item is not None:
-            item, item_id = queue_item
-            execution_start_time = time.perf_counter()
-            prompt_id = item[1]
-            server_instance.last_prompt_id = prompt_id
-
-            sensitive = item[5]
-            extra_data = item[3].copy()
-            for k in sensitive:
-                extra_data[k] = sensitive[k]
-
-            e.execute(item[2], prompt_id, extra_data, item[4])
-            need_gc = True
-
-            remove_sensitive = lambda prompt: prompt[:5] + prompt[6:]
-            q.task_done(item_id,
-                        e.history_result,
-                        status=execution.PromptQueue.ExecutionStatus(
-                            status_str='success' if e.success else 'error',
-                            completed=e.success,
-                            messages=e.status_messages), process_item=remove_sensitive)
-            if server_instance.client_id is not None:
-                server_instance.send_sync("executing", {"node": None, "prompt_id": prompt_id}, server_instance.client_id)
-
-            current_time = time.perf_counter()
-            execution_time = current_time - execution_start_time
-
-            # Log Time in a more readable way after 10 minutes
-            if execution_time > 600:
-                execution_time = time.strftime("%H:%M:%S", time.gmtime(execution_time))
-                logging.info(f"Prompt executed in {execution_time}")
-            else:
-                logging.info("Prompt executed in {:.2f} seconds".format(execution_time))
-
-        flags = q.get_flags()
-        free_memory = flags.get("free_memory", False)
-
-        if flags.get("unload_models", free_memory):
-            comfy.model_management.unload_all_models()
-            need_gc = True
-            last_gc_collect = 0
-
-        if free_memory:
-            e.reset()
-            need_gc = True
-            last_gc_collect = 0
-
-        if need_gc:
-            current_time = time.perf_counter()
-            if (current_time - last_gc_collect) > gc_collect_interval:
-                gc.collect()
-                comfy.model_management.soft_empty_cache()
-                last_gc_collect = current_time
-                need_gc = False
-                hook_breaker_ac10a0.restore_functions()
+    try:
+        while True:
+            timeout = 1000.0
+            if need_gc:
+                timeout = max(gc_collect_interval - (current_time - last_gc_collect), 0.0)
+
+            queue_item = q.get(timeout=timeout, affinity=last_models if use_affinity else None)
+            if queue_item is not None:
+                item, item_id = queue_item
+                execution_start_time = time.perf_counter()
+                prompt_id = item[1]
+                server_instance.last_prompt_id = prompt_id
+
+                sensitive = item[5]
+                extra_data = item[3].copy()
+                for k in sensitive:
+                    extra_data[k] = sensitive[k]
+                server_instance.client_id = extra_data.get("client_id")
+
+                if use_affinity:
+                    last_models = execution.get_prompt_models(item[2])
+
+                e.execute(item[2], prompt_id, extra_data, item[4])
+                need_gc = True
+
+                remove_sensitive = lambda prompt: prompt[:5] + prompt[6:]
+                q.task_done(item_id,
+                            e.history_result,
+                            status=execution.PromptQueue.ExecutionStatus(
+                                status_str='success' if e.success else 'error',
+                                completed=e.success,
+                                messages=e.status_messages), process_item=remove_sensitive)
+                if server_instance.client_id is not None:
+                    server_instance.send_sync("executing", {"node": None, "prompt_id": prompt_id}, server_instance.client_id)
+
+                current_time = time.perf_counter()
+                execution_time = current_time - execution_start_time
+
+                # Log Time in a more readable way after 10 minutes
+                if execution_time > 600:
+                    execution_time = time.strftime("%H:%M:%S", time.gmtime(execution_time))
+                    logging.info(f"Prompt executed in {execution_time}")
+                else:
+                    logging.info("Prompt executed in {:.2f} seconds".format(execution_time))
+
+            flags = q.get_flags(worker=worker)
+            free_memory = flags.get("free_memory", False)
+
+            if flags.get("unload_models", free_memory):
+                # Every worker gets the flags, each one unloads the models of its own device
+                comfy.model_management.unload_all_models(device)
+                need_gc = True
+                last_gc_collect = 0
+
+            if free_memory:
+                # Also drops the connections the API nodes keep open between prompts
+                e.close()
+                e.reset()
+                need_gc = True
+                last_gc_collect = 0
+
+            if need_gc:
+                current_time = time.perf_counter()
+                if (current_time - last_gc_collect) > gc_collect_interval:
+                    gc.collect()
+                    comfy.model_management.soft_empty_cache()
+                    last_gc_collect = current_time
+                    need_gc = False
+                    hook_breaker_ac10a0.restore_functions()
+    finally:
+        e.close()
 
 
 async def run(server_instance, address='', port=8188, verbose=True, call_on_start=None):
@@ -336,7 +350,28 @@ def start_comfyui(asyncio_loop=None):
     prompt_server.add_routes()
     hijack_progress(prompt_server)
 
-    threading.Thread(target=prompt_worker, daemon=True, args=(prompt_server.prompt_queue, prompt_server,)).start()
+    prompt_workers = args.prompt_workers
+    if prompt_workers > 1:
+        devices = comfy.model_management.get_all_torch_devices()
+        if devices[0].type == "cpu":
+            # Models are never unloaded to make room on the cpu, so any number of workers can share it
+            devices = devices * prompt_workers
+        elif prompt_workers > len(devices):
+            # Workers that share a GPU would unload the models another one is sampling with to make room for theirs
+            logging.warning("--prompt-workers {} is more than the {} available devices, starting {} prompt workers.".format(prompt_workers, len(devices), len(devices)))
+            prompt_workers = len(devices)
+
+    if prompt_workers > 1:
+        for i in range(prompt_workers):
+            device = devices[i]
+            logging.info("Starting prompt worker {} on {}".format(i, device))
+            threading.Thread(target=prompt_worker, daemon=True, name="prompt_worker_{}".format(i), args=(prompt_server.prompt_queue, prompt_server, device, True)).start()
+    else:
+        threading.Thread(target=prompt_worker, daemon=True, args=(prompt_server.prompt_queue, prompt_server,)).start()
+
+    if args.prefetch_models > 0:
+        from comfy_execution.prefetch import ModelPrefetcher
+        ModelPrefetcher(prompt_server.prompt_queue, execution.get_prompt_models, depth=args.prefetch_models).start()
 
     if args.quick_test_for_ci:
         exit(0)
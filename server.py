@@ -3,6 +3,7 @@ import sys
 import asyncio
 import traceback
 import time
+import contextvars
 
 import nodes
 import folder_paths
@@ -15,9 +16,8 @@ import struct
 import ssl
 import socket
 import ipaddress
-from PIL import Image, ImageOps
+from PIL import Image
 from PIL.PngImagePlugin import PngInfo
-from io import BytesIO
 
 import aiohttp
 from aiohttp import web
@@ -37,6 +37,9 @@ from app.user_manager import UserManager
 from app.model_manager import ModelFileManager
 from app.custom_node_manager import CustomNodeManager
 from app.subgraph_manager import SubgraphManager
+from app.object_info_cache import ObjectInfoCache, etag_matches
+from app.preview_stream import PreviewStream, encode_preview_image, encode_preview_image_with_metadata
+from app.view_cache import ViewCache
 from typing import Optional, Union
 from api_server.routes.internal.internal_routes import InternalRoutes
 from protocol import BinaryEventTypes
@@ -180,7 +183,33 @@ def create_block_external_middleware():
     return block_external_middleware
 
 
+class ExecutionStateAttribute:
+    """
+    Server attribute describing the prompt that is executing (client_id, last_node_id, ...).
+    Every prompt worker sees the value it set last, code outside of a worker sees the last value set by any of them.
+    """
+    def __set_name__(self, owner, name):
+        self.shared_name = "_shared_" + name
+        self.var = contextvars.ContextVar(name)
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        value = self.var.get(self)
+        if value is self:
+            return getattr(instance, self.shared_name, None)
+        return value
+
+    def __set__(self, instance, value):
+        self.var.set(value)
+        setattr(instance, self.shared_name, value)
+
+
 class PromptServer():
+    client_id = ExecutionStateAttribute()
+    last_node_id = ExecutionStateAttribute()
+    last_prompt_id = ExecutionStateAttribute()
+
     def __init__(self, loop):
         PromptServer.instance = self
 
@@ -216,6 +245,8 @@ class PromptServer():
         self.app = web.Application(client_max_size=max_upload_size, middlewares=middlewares)
         self.sockets = dict()
         self.sockets_metadata = dict()
+        self.preview_stream = PreviewStream(self, max_fps=args.preview_max_fps)
+        self.view_cache = ViewCache(round(args.view_cache_size * 1024 * 1024))
         self.web_root = (
             FrontendManager.init_frontend(args.front_end_version)
             if args.front_end_root is None
@@ -287,6 +318,7 @@ class PromptServer():
             finally:
                 self.sockets.pop(sid, None)
                 self.sockets_metadata.pop(sid, None)
+                self.preview_stream.remove(sid)
             return ws
 
         @routes.get("/")
@@ -488,61 +520,29 @@ class PromptServer():
 
                 if os.path.isfile(file):
                     if 'preview' in request.rel_url.query:
-                        with Image.open(file) as img:
-                            preview_info = request.rel_url.query['preview'].split(';')
-                            image_format = preview_info[0]
-                            if image_format not in ['webp', 'jpeg'] or 'a' in request.rel_url.query.get('channel', ''):
-                                image_format = 'webp'
-
-                            quality = 90
-                            if preview_info[-1].isdigit():
-                                quality = int(preview_info[-1])
+                        preview_info = request.rel_url.query['preview'].split(';')
+                        image_format = preview_info[0]
+                        if image_format not in ['webp', 'jpeg'] or 'a' in request.rel_url.query.get('channel', ''):
+                            image_format = 'webp'
 
-                            buffer = BytesIO()
-                            if image_format in ['jpeg'] or request.rel_url.query.get('channel', '') == 'rgb':
-                                img = img.convert("RGB")
-                            img.save(buffer, format=image_format, quality=quality)
-                            buffer.seek(0)
+                        quality = 90
+                        if preview_info[-1].isdigit():
+                            quality = int(preview_info[-1])
 
-                            return web.Response(body=buffer.read(), content_type=f'image/{image_format}',
-                                                headers={"Content-Disposition": f"filename=\"{filename}\""})
+                        derivative = await self.view_cache.get(file, "preview", image_format=image_format, quality=quality,
+                                                               channel=request.rel_url.query.get('channel', ''))
+                        return web.FileResponse(derivative, headers={"Content-Disposition": f"filename=\"{filename}\"",
+                                                                     "Content-Type": f'image/{image_format}'})
 
                     if 'channel' not in request.rel_url.query:
                         channel = 'rgba'
                     else:
                         channel = request.rel_url.query["channel"]
 
-                    if channel == 'rgb':
-                        with Image.open(file) as img:
-                            if img.mode == "RGBA":
-                                r, g, b, a = img.split()
-                                new_img = Image.merge('RGB', (r, g, b))
-                            else:
-                                new_img = img.convert("RGB")
-
-                            buffer = BytesIO()
-                            new_img.save(buffer, format='PNG')
-                            buffer.seek(0)
-
-                            return web.Response(body=buffer.read(), content_type='image/png',
-                                                headers={"Content-Disposition": f"filename=\"{filename}\""})
-
-                    elif channel == 'a':
-                        with Image.open(file) as img:
-                            if img.mode == "RGBA":
-                                _, _, _, a = img.split()
-                            else:
-                                a = Image.new('L', img.size, 255)
-
-                            # alpha img
-                            alpha_img = Image.new('RGBA', img.size)
-                            alpha_img.putalpha(a)
-                            alpha_buffer = BytesIO()
-                            alpha_img.save(alpha_buffer, format='PNG')
-                            alpha_buffer.seek(0)
-
-                            return web.Response(body=alpha_buffer.read(), content_type='image/png',
-                                                headers={"Content-Disposition": f"filename=\"{filename}\""})
+                    if channel in ('rgb', 'a'):
+                        derivative = await self.view_cache.get(file, channel)
+                        return web.FileResponse(derivative, headers={"Content-Disposition": f"filename=\"{filename}\"",
+                                                                     "Content-Type": 'image/png'})
                     else:
                         # Get content type from mimetype, defaulting to 'application/octet-stream'
                         content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
@@ -668,24 +668,29 @@ class PromptServer():
                 info['api_node'] = obj_class.API_NODE
             return info
 
+        self.object_info_cache = ObjectInfoCache(node_info)
+
         @routes.get("/object_info")
         async def get_object_info(request):
-            with folder_paths.cache_helper:
-                out = {}
-                for x in nodes.NODE_CLASS_MAPPINGS:
-                    try:
-                        out[x] = node_info(x)
-                    except Exception:
-                        logging.error(f"[ERROR] An error occurred while retrieving information for the '{x}' node.")
-                        logging.error(traceback.format_exc())
-                return web.json_response(out)
+            body = self.object_info_cache.get_body(nodes.NODE_CLASS_MAPPINGS)
+            etag = '"{}"'.format(self.object_info_cache.etag)
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+            if etag_matches(request.headers.get("If-None-Match"), etag):
+                return web.Response(status=304, headers=headers)
+            return web.Response(text=body, content_type="application/json", headers=headers)
+
+        @routes.get("/object_info/diff")
+        async def get_object_info_diff(request):
+            since = self.object_info_cache.parse_etag(request.rel_url.query.get("since", None))
+            return web.json_response(self.object_info_cache.get_diff(since, nodes.NODE_CLASS_MAPPINGS))
 
         @routes.get("/object_info/{node_class}")
         async def get_object_info_node(request):
             node_class = request.match_info.get("node_class", None)
             out = {}
-            if (node_class is not None) and (node_class in nodes.NODE_CLASS_MAPPINGS):
-                out[node_class] = node_info(node_class)
+            info = self.object_info_cache.get_node(node_class, nodes.NODE_CLASS_MAPPINGS)
+            if info is not None:
+                out[node_class] = info
             return web.json_response(out)
 
         @routes.get("/history")
@@ -736,6 +741,16 @@ class PromptServer():
                 prompt = json_data["prompt"]
                 prompt_id = str(json_data.get("prompt_id", uuid.uuid4()))
 
+                lane = json_data.get("lane", execution.PromptQueue.DEFAULT_LANE)
+                if lane not in execution.PromptQueue.LANES:
+                    error = {
+                        "type": "invalid_lane",
+                        "message": "Invalid queue lane",
+                        "details": f"Lane must be one of {', '.join(execution.PromptQueue.LANES)}",
+                        "extra_info": {}
+                    }
+                    return web.json_response({"error": error, "node_errors": {}}, status=400)
+
                 partial_execution_targets = None
                 if "partial_execution_targets" in json_data:
                     partial_execution_targets = json_data["partial_execution_targets"]
@@ -754,7 +769,7 @@ class PromptServer():
                         if sensitive_val in extra_data:
                             sensitive[sensitive_val] = extra_data.pop(sensitive_val)
                     extra_data["create_time"] = int(time.time() * 1000)  # timestamp in milliseconds
-                    self.prompt_queue.put((number, prompt_id, prompt, extra_data, outputs_to_execute, sensitive))
+                    self.prompt_queue.put((number, prompt_id, prompt, extra_data, outputs_to_execute, sensitive), lane=lane)
                     response = {"prompt_id": prompt_id, "number": number, "node_errors": valid[3]}
                     return web.json_response(response)
                 else:
@@ -778,8 +793,7 @@ class PromptServer():
             if "delete" in json_data:
                 to_delete = json_data['delete']
                 for id_to_delete in to_delete:
-                    delete_func = lambda a: a[1] == id_to_delete
-                    self.prompt_queue.delete_queue_item(delete_func)
+                    self.prompt_queue.delete_queue_item_by_id(id_to_delete)
 
             return web.Response(status=200)
 
@@ -805,13 +819,15 @@ class PromptServer():
                         break
 
                 if should_interrupt:
-                    nodes.interrupt_processing()
+                    nodes.interrupt_processing(prompt_id=prompt_id)
                 else:
                     logging.info(f"Prompt {prompt_id} is not currently running, skipping interrupt")
             else:
-                # No prompt_id provided, do a global interrupt
+                # No prompt_id provided, do a global interrupt of every running prompt
                 logging.info("Global interrupt (no prompt_id specified)")
-                nodes.interrupt_processing()
+                currently_running, _ = self.prompt_queue.get_current_queue()
+                for item in currently_running:
+                    nodes.interrupt_processing(prompt_id=item[1])
 
             return web.Response(status=200)
 
@@ -913,12 +929,12 @@ class PromptServer():
         return prompt_info
 
     async def send(self, event, data, sid=None):
-        if event == BinaryEventTypes.UNENCODED_PREVIEW_IMAGE:
-            await self.send_image(data, sid=sid)
-        elif event == BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA:
-            # data is (preview_image, metadata)
-            preview_image, metadata = data
-            await self.send_image_with_metadata(preview_image, metadata, sid=sid)
+        if event in (BinaryEventTypes.UNENCODED_PREVIEW_IMAGE, BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA):
+            # Only the latest preview of a client is kept, encoded off the loop and sent at the rate the client keeps up with
+            self.preview_stream.submit(event, data, sid)
+        elif event in ("executing", "executed"):
+            self.preview_stream.drop(sid)
+            await self.send_json(event, data, sid)
         elif isinstance(data, (bytes, bytearray)):
             await self.send_bytes(event, data, sid)
         else:
@@ -934,64 +950,11 @@ class PromptServer():
         return message
 
     async def send_image(self, image_data, sid=None):
-        image_type = image_data[0]
-        image = image_data[1]
-        max_size = image_data[2]
-        if max_size is not None:
-            if hasattr(Image, 'Resampling'):
-                resampling = Image.Resampling.BILINEAR
-            else:
-                resampling = Image.Resampling.LANCZOS
-
-            image = ImageOps.contain(image, (max_size, max_size), resampling)
-        type_num = 1
-        if image_type == "JPEG":
-            type_num = 1
-        elif image_type == "PNG":
-            type_num = 2
-
-        bytesIO = BytesIO()
-        header = struct.pack(">I", type_num)
-        bytesIO.write(header)
-        image.save(bytesIO, format=image_type, quality=95, compress_level=1)
-        preview_bytes = bytesIO.getvalue()
+        preview_bytes = await asyncio.to_thread(encode_preview_image, image_data)
         await self.send_bytes(BinaryEventTypes.PREVIEW_IMAGE, preview_bytes, sid=sid)
 
     async def send_image_with_metadata(self, image_data, metadata=None, sid=None):
-        image_type = image_data[0]
-        image = image_data[1]
-        max_size = image_data[2]
-        if max_size is not None:
-            if hasattr(Image, 'Resampling'):
-                resampling = Image.Resampling.BILINEAR
-            else:
-                resampling = Image.Resampling.LANCZOS
-
-            image = ImageOps.contain(image, (max_size, max_size), resampling)
-
-        mimetype = "image/png" if image_type == "PNG" else "image/jpeg"
-
-        # Prepare metadata
-        if metadata is None:
-            metadata = {}
-        metadata["image_type"] = mimetype
-
-        # Serialize metadata as JSON
-        import json
-        metadata_json = json.dumps(metadata).encode('utf-8')
-        metadata_length = len(metadata_json)
-
-        # Prepare image data
-        bytesIO = BytesIO()
-        image.save(bytesIO, format=image_type, quality=95, compress_level=1)
-        image_bytes = bytesIO.getvalue()
-
-        # Combine metadata and image
-        combined_data = bytearray()
-        combined_data.extend(struct.pack(">I", metadata_length))
-        combined_data.extend(metadata_json)
-        combined_data.extend(image_bytes)
-
+        combined_data = await asyncio.to_thread(encode_preview_image_with_metadata, image_data, metadata)
         await self.send_bytes(BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA, combined_data, sid=sid)
 
     async def send_bytes(self, event, data, sid=None):
@@ -0,0 +1,73 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database.models import Base
+from app.history_store import HistoryStore
+
+
+def make_entry(i):
+    return {"prompt": (i, str(i), {}, {}, []), "outputs": {"9": {"images": [{"filename": f"{i}.png"}]}}, "status": None}
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture(params=["database", "memory"])
+def store(request, session_factory):
+    if request.param == "database":
+        return HistoryStore(max_size=8, hot_size=3, session_factory=session_factory)
+    return HistoryStore(max_size=8)
+
+
+def ids(pairs):
+    return [prompt_id for prompt_id, _ in pairs]
+
+
+def test_range_spans_memory_and_database(store):
+    for i in range(6):
+        store.add(str(i), make_entry(i))
+    assert len(store) == 6
+    assert ids(store.get_range(0)) == ["0", "1", "2", "3", "4", "5"]
+    assert ids(store.get_range(1, 3)) == ["1", "2", "3"]
+    assert ids(store.get_range(4, 10)) == ["4", "5"]
+    assert store.get_range(6, 1) == []
+    assert store.get("1")["outputs"]["9"]["images"][0]["filename"] == "1.png"
+    assert store.get("missing") is None
+
+
+def test_size_limit_drops_oldest(store):
+    for i in range(10):
+        store.add(str(i), make_entry(i))
+    assert len(store) == 8
+    assert ids(store.get_range(0)) == [str(i) for i in range(2, 10)]
+    assert "1" not in store and "2" in store
+
+
+def test_delete_and_replace(store):
+    for i in range(5):
+        store.add(str(i), make_entry(i))
+    store.delete("1")
+    store.delete("4")
+    store.add("0", make_entry(10))
+    assert ids(store.get_range(0)) == ["2", "3", "0"]
+    assert store.get("0")["prompt"][0] == 10
+    store.clear()
+    assert len(store) == 0
+    assert store.get_range(0) == []
+
+
+def test_get_returns_copy(store):
+    store.add("0", make_entry(0))
+    store.get("0")["outputs"].clear()
+    assert store.get("0")["outputs"] != {}
+
+
+def test_store_starts_empty(session_factory):
+    HistoryStore(max_size=8, hot_size=1, session_factory=session_factory).add("0", make_entry(0))
+    assert HistoryStore(max_size=8, session_factory=session_factory).get("0") is None
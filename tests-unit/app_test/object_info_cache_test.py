@@ -0,0 +1,129 @@
+import json
+import os
+
+import pytest
+
+import folder_paths
+from app.object_info_cache import ObjectInfoCache, etag_matches
+
+
+class StaticNode:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"value": ("INT",)}}
+
+
+class ModelNode:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"required": {"model": (folder_paths.get_filename_list("object_info_test"),)}}
+
+
+class InputNode:
+    @classmethod
+    def INPUT_TYPES(cls):
+        files = sorted(os.listdir(folder_paths.get_input_directory()))
+        return {"required": {"file": (files,)}}
+
+
+@pytest.fixture
+def folders(tmp_path):
+    models = tmp_path / "models"
+    inputs = tmp_path / "input"
+    models.mkdir()
+    (inputs / "sub").mkdir(parents=True)
+    previous_input = folder_paths.get_input_directory()
+    folder_paths.add_model_folder_path("object_info_test", str(models))
+    folder_paths.set_input_directory(str(inputs))
+    yield models, inputs
+    folder_paths.set_input_directory(previous_input)
+    folder_paths.folder_names_and_paths.pop("object_info_test", None)
+    folder_paths.filename_list_cache.pop("object_info_test", None)
+
+
+@pytest.fixture
+def cache():
+    calls = []
+
+    def node_info(node_class):
+        calls.append(node_class)
+        return {"input": node_classes[node_class].INPUT_TYPES()}
+
+    cache = ObjectInfoCache(node_info)
+    cache.calls = calls
+    return cache
+
+
+node_classes = {"StaticNode": StaticNode, "ModelNode": ModelNode, "InputNode": InputNode}
+
+
+def touch_later(path, directory):
+    path.write_text("")
+    # Make sure the directory mtime moves even on filesystems with a coarse timestamp resolution
+    mtime = os.path.getmtime(directory) + 5
+    os.utime(directory, (mtime, mtime))
+
+
+def test_unchanged_nodes_are_not_regenerated(folders, cache):
+    body = json.loads(cache.get_body(node_classes))
+    assert set(body.keys()) == set(node_classes.keys())
+    etag = cache.etag
+    cache.calls.clear()
+    assert cache.get_body(node_classes) is cache.get_body(node_classes)
+    assert cache.calls == []
+    assert cache.etag == etag
+
+
+def test_folder_changes_invalidate_dependent_nodes(folders, cache):
+    models, inputs = folders
+    cache.get_body(node_classes)
+    version = cache.parse_etag(cache.etag)
+
+    touch_later(models / "a.safetensors", models)
+    cache.calls.clear()
+    body = json.loads(cache.get_body(node_classes))
+    assert cache.calls == ["ModelNode"]
+    assert body["ModelNode"]["input"]["required"]["model"][0] == ["a.safetensors"]
+
+    # Without the folder index only the top level of the input directory is checked
+    touch_later(inputs / "sub" / "b.png", inputs / "sub")
+    cache.calls.clear()
+    cache.get_body(node_classes)
+    assert cache.calls == []
+
+    touch_later(inputs / "c.png", inputs)
+    cache.calls.clear()
+    diff = cache.get_diff(version, node_classes)
+    assert cache.calls == ["InputNode"]
+    assert not diff["full"]
+    assert list(diff["nodes"].keys()) == ["ModelNode", "InputNode"]
+    assert diff["nodes"]["InputNode"]["input"]["required"]["file"][0] == ["c.png", "sub"]
+
+
+def test_diff_reports_added_and_removed_nodes(folders, cache):
+    cache.get_body(node_classes)
+    etag = cache.etag
+    smaller = {k: v for k, v in node_classes.items() if k != "StaticNode"}
+    diff = cache.get_diff(cache.parse_etag(etag), smaller)
+    assert diff["nodes"] == {} and diff["removed"] == ["StaticNode"]
+
+    diff = cache.get_diff(cache.parse_etag(diff["version"]), node_classes)
+    assert list(diff["nodes"].keys()) == ["StaticNode"] and diff["removed"] == []
+
+    assert cache.parse_etag("00000000-1") is None
+    assert cache.get_diff(None, node_classes)["full"]
+
+
+def test_etag_matches():
+    assert etag_matches('"abc-1"', '"abc-1"')
+    assert etag_matches('W/"abc-1"', '"abc-1"')
+    assert etag_matches('"xyz-3", W/"abc-1"', '"abc-1"')
+    assert etag_matches("*", '"abc-1"')
+    assert not etag_matches('"abc-2", "abc-12"', '"abc-1"')
+    assert not etag_matches(None, '"abc-1"')
+    assert not etag_matches("", '"abc-1"')
+
+
+def test_parse_weak_etag(folders, cache):
+    cache.get_body(node_classes)
+    assert cache.parse_etag("W/" + cache.etag) == cache.parse_etag(cache.etag)
@@ -0,0 +1,105 @@
+import asyncio
+import struct
+
+from PIL import Image
+
+from app import preview_stream
+from app.preview_stream import PreviewStream
+from protocol import BinaryEventTypes
+
+
+class FakeSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.messages = []
+
+    async def send_bytes(self, message):
+        await asyncio.sleep(self.delay)
+        self.messages.append(bytes(message))
+
+
+class FakeServer:
+    def __init__(self, sockets):
+        self.sockets = sockets
+
+    def encode_bytes(self, event, data):
+        return struct.pack(">I", event) + bytes(data)
+
+
+def preview(color):
+    return ("JPEG", Image.new("RGB", (64, 64), color), None)
+
+
+def test_stale_frames_are_dropped():
+    async def run():
+        ws = FakeSocket(delay=0.05)
+        stream = PreviewStream(FakeServer({"a": ws}), max_fps=0)
+        stream.submit(BinaryEventTypes.UNENCODED_PREVIEW_IMAGE, preview("red"), "a")
+        await asyncio.sleep(0.01)
+        # Submitted while the first frame is being sent, only the last one is kept
+        for color in ("green", "blue", "white"):
+            stream.submit(BinaryEventTypes.UNENCODED_PREVIEW_IMAGE, preview(color), "a")
+        await asyncio.sleep(0.5)
+        stream.remove("a")
+        return ws.messages
+
+    messages = asyncio.run(run())
+    assert len(messages) == 2
+    for message in messages:
+        assert struct.unpack(">I", message[:4])[0] == BinaryEventTypes.PREVIEW_IMAGE
+
+
+def test_pending_frames_are_dropped_when_the_node_changes():
+    async def run():
+        ws = FakeSocket()
+        stream = PreviewStream(FakeServer({"a": ws}), max_fps=0)
+        stream.submit(BinaryEventTypes.UNENCODED_PREVIEW_IMAGE, preview("red"), "a")
+        # The frame is being encoded when the next node starts
+        await asyncio.sleep(0)
+        stream.drop("a")
+        await asyncio.sleep(0.2)
+        stream.submit(BinaryEventTypes.UNENCODED_PREVIEW_IMAGE, preview("blue"), "a")
+        await asyncio.sleep(0.2)
+        stream.remove("a")
+        return ws.messages
+
+    assert len(asyncio.run(run())) == 1
+
+
+def test_broadcast_is_encoded_once(monkeypatch):
+    encodes = []
+    encode = preview_stream.encode_preview_image_with_metadata
+
+    def counting_encode(*args, **kwargs):
+        encodes.append(kwargs.get("quality"))
+        return encode(*args, **kwargs)
+
+    monkeypatch.setattr(preview_stream, "encode_preview_image_with_metadata", counting_encode)
+
+    async def run():
+        sockets = {"a": FakeSocket(), "b": FakeSocket()}
+        stream = PreviewStream(FakeServer(sockets), max_fps=0)
+        stream.submit(BinaryEventTypes.PREVIEW_IMAGE_WITH_METADATA, (preview("red"), {"node_id": "1"}))
+        await asyncio.sleep(0.2)
+        stream.remove("a")
+        stream.remove("b")
+        return sockets
+
+    sockets = asyncio.run(run())
+    assert encodes == [95]
+    assert sockets["a"].messages == sockets["b"].messages
+    assert len(sockets["a"].messages) == 1
+
+
+def test_slow_client_gets_lower_quality_and_rate():
+    stream = PreviewStream(FakeServer({}), max_fps=30)
+    state = preview_stream.ClientPreviewState()
+
+    stream._adapt(state, 0.3, 10.0)
+    assert state.level == 1
+    assert state.next_send == 10.0 + preview_stream.MAX_FRAME_INTERVAL
+
+    for _ in range(20):
+        stream._adapt(state, 0.001, 10.0)
+    assert state.level == 0
+    assert abs(state.next_send - (10.0 + 1.0 / 30)) < 1e-6
@@ -0,0 +1,65 @@
+import asyncio
+import os
+
+import pytest
+from PIL import Image
+
+import folder_paths
+from app import view_cache
+from app.view_cache import ViewCache
+
+
+@pytest.fixture
+def image_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(folder_paths, "get_temp_directory", lambda: str(tmp_path / "temp"))
+    path = str(tmp_path / "image.png")
+    Image.new("RGBA", (32, 32), (255, 0, 0, 128)).save(path)
+    return path
+
+
+def test_derivative_is_rendered_once(image_file, monkeypatch):
+    renders = []
+    render = view_cache.render_derivative
+
+    def counting_render(*args, **kwargs):
+        renders.append(args[2])
+        return render(*args, **kwargs)
+
+    monkeypatch.setattr(view_cache, "render_derivative", counting_render)
+    cache = ViewCache(1024 * 1024)
+
+    async def run():
+        return await asyncio.gather(*[cache.get(image_file, "preview", image_format="jpeg", quality=80) for _ in range(4)])
+
+    paths = asyncio.run(run())
+    assert len(set(paths)) == 1
+    assert renders == ["preview"]
+    assert os.stat(paths[0]).st_mtime_ns == os.stat(image_file).st_mtime_ns
+    with Image.open(paths[0]) as img:
+        assert img.format == "JPEG"
+        assert img.mode == "RGB"
+
+    assert asyncio.run(cache.get(image_file, "preview", image_format="jpeg", quality=80)) == paths[0]
+    assert renders == ["preview"]
+
+
+def test_changed_source_is_rendered_again(image_file):
+    cache = ViewCache(1024 * 1024)
+    first = asyncio.run(cache.get(image_file, "a"))
+
+    Image.new("RGB", (16, 16)).save(image_file)
+    os.utime(image_file, ns=(0, 10**9))
+    second = asyncio.run(cache.get(image_file, "a"))
+    assert first != second
+    with Image.open(second) as img:
+        assert img.size == (16, 16)
+        assert img.mode == "RGBA"
+
+
+def test_least_recently_used_derivatives_are_removed(image_file):
+    cache = ViewCache(1)
+    first = asyncio.run(cache.get(image_file, "rgb"))
+    second = asyncio.run(cache.get(image_file, "a"))
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+    assert list(cache.entries) == [os.path.basename(second)]
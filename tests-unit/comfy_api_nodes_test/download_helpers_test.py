@@ -0,0 +1,78 @@
+import gc
+import os
+from io import BytesIO
+
+import pytest
+from aiohttp import web
+
+import folder_paths
+from comfy_api_nodes.util.download_helpers import download_url_to_bytesio, download_url_to_video_output
+from comfy_api_nodes.util.session_pool import close_session
+
+pytestmark = (
+    pytest.mark.asyncio
+)  # This applies the asyncio mark to all test functions in the module
+
+BODY = bytes(range(256)) * 64
+
+
+async def start_server(aiohttp_server):
+    requests = []
+
+    async def full(request):
+        requests.append(request.path)
+        return web.Response(body=BODY)
+
+    async def dropped_once(request):
+        # The first attempt sends part of the body and then loses the connection
+        requests.append(request.path)
+        if len(requests) > 1:
+            return web.Response(body=BODY)
+        response = web.StreamResponse()
+        response.content_length = len(BODY)
+        await response.prepare(request)
+        await response.write(BODY[:1000])
+        request.transport.close()
+        return response
+
+    app = web.Application()
+    app.router.add_get("/video.mp4", full)
+    app.router.add_get("/dropped.mp4", dropped_once)
+    server = await aiohttp_server(app)
+    server.requests = requests
+    return server
+
+
+async def test_video_is_streamed_to_a_temp_file(aiohttp_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(folder_paths, "temp_directory", str(tmp_path))
+    server = await start_server(aiohttp_server)
+    video = await download_url_to_video_output(str(server.make_url("/video.mp4")))
+    await close_session()
+    path = video.get_stream_source()
+    assert os.path.dirname(path) == os.path.join(str(tmp_path), "api_files")
+    assert path.endswith(".mp4")
+    with open(path, "rb") as f:
+        assert f.read() == BODY
+
+    # Consumers may only hold on to the path, the file stays until the temp directory is cleaned up
+    del video
+    gc.collect()
+    assert os.path.exists(path)
+
+
+async def test_retry_drops_the_partial_body(aiohttp_server):
+    server = await start_server(aiohttp_server)
+    dest = BytesIO()
+    dest.write(b"prefix")
+    await download_url_to_bytesio(str(server.make_url("/dropped.mp4")), dest, retry_delay=0.01)
+    await close_session()
+    assert len(server.requests) == 2
+    assert dest.getvalue() == b"prefix" + BODY
+
+
+async def test_retry_rewrites_the_file(aiohttp_server, tmp_path):
+    server = await start_server(aiohttp_server)
+    path = tmp_path / "out.mp4"
+    await download_url_to_bytesio(str(server.make_url("/dropped.mp4")), str(path), retry_delay=0.01)
+    await close_session()
+    assert path.read_bytes() == BODY
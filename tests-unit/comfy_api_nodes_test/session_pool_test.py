@@ -0,0 +1,56 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+from comfy_api_nodes.util._helpers import parse_retry_after
+from comfy_api_nodes.util.session_pool import close_session, get_session
+
+
+def test_session_is_shared_within_a_loop():
+    async def run():
+        first = get_session()
+        second = get_session()
+        assert first is second
+        await close_session()
+        assert first.closed
+        third = get_session()
+        assert third is not first
+        await close_session()
+        return first
+
+    loop_a = asyncio.new_event_loop()
+    loop_b = asyncio.new_event_loop()
+    try:
+        session_a = loop_a.run_until_complete(run())
+        session_b = loop_b.run_until_complete(run())
+        assert session_a is not session_b
+    finally:
+        loop_a.close()
+        loop_b.close()
+
+
+def test_parse_retry_after_seconds():
+    assert parse_retry_after({"Retry-After": "7"}) == 7.0
+    assert parse_retry_after({"retry-after": "2.5"}) == 2.5
+    assert parse_retry_after({"Retry-After": "-3"}) == 0.0
+    assert parse_retry_after({"Retry-After": "9999"}) == 300.0
+
+
+def test_parse_retry_after_minimum():
+    assert parse_retry_after({"Retry-After": "0"}, min_seconds=5.0) == 5.0
+    assert parse_retry_after({"Retry-After": "0.01"}, min_seconds=5.0) == 5.0
+    assert parse_retry_after({"Retry-After": "8"}, min_seconds=5.0) == 8.0
+    assert parse_retry_after({"Retry-After": "nan"}, min_seconds=5.0) is None
+    assert parse_retry_after({}, min_seconds=5.0) is None
+
+
+def test_parse_retry_after_date():
+    delay = parse_retry_after({"Retry-After": formatdate(time.time() + 30, usegmt=True)})
+    assert 25.0 <= delay <= 30.0
+
+
+def test_parse_retry_after_missing_or_invalid():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after({}) is None
+    assert parse_retry_after({"Content-Type": "application/json"}) is None
+    assert parse_retry_after({"Retry-After": "soon"}) is None
@@ -0,0 +1,70 @@
+import gc
+
+import torch
+
+import comfy.controlnet
+from comfy.controlnet import HintCache
+
+
+def test_hint_cache_needs_the_same_objects():
+    cache = HintCache(max_entries=2)
+    image = torch.zeros(1, 3, 8, 8)
+    sources = [image, None]
+    key = (id(image), None, 8, 8)
+    cache.put(key, sources, "hint")
+    assert cache.get(key, sources) == "hint"
+
+    # A new image that gets the id of the freed one isn't mistaken for it
+    del image, sources
+    gc.collect()
+    assert cache.get(key, [torch.zeros(1, 3, 8, 8), None]) is None
+    assert key not in cache.entries
+
+
+def test_hint_cache_is_bounded():
+    cache = HintCache(max_entries=2)
+    images = [torch.zeros(1) for _ in range(3)]
+    for i, image in enumerate(images):
+        cache.put(i, [image], i)
+    assert list(cache.entries) == [1, 2]
+
+
+def test_shared_input_is_converted_once():
+    comfy.controlnet.SHARED_INPUTS.clear()
+    context = torch.ones(1, 4)
+    calls = []
+
+    def convert():
+        calls.append(1)
+        return context.half()
+
+    first = comfy.controlnet.shared_input(("context", "cpu", torch.float16), [context], convert)
+    second = comfy.controlnet.shared_input(("context", "cpu", torch.float16), [context], convert)
+    assert first is second
+    assert len(calls) == 1
+
+    comfy.controlnet.shared_input(("context", "cpu", torch.float16), [torch.ones(1, 4)], convert)
+    assert len(calls) == 2
+    comfy.controlnet.SHARED_INPUTS.clear()
+
+
+def test_hint_cache_key_survives_new_views():
+    image = torch.rand(1, 8, 8, 3)
+
+    def control_net():
+        return comfy.controlnet.ControlNet(concat_mask=True)
+
+    # The apply nodes make a new view of the IMAGE every time they run
+    first = control_net().set_cond_hint(image.movedim(-1, 1))
+    second = control_net().set_cond_hint(image.movedim(-1, 1))
+    key, sources = first.hint_cache_key(64, 64)
+    assert second.hint_cache_key(64, 64)[0] == key
+
+    cache = HintCache()
+    cache.put(key, sources, "hint")
+    assert cache.get(*second.hint_cache_key(64, 64)) == "hint"
+
+    # A different view of the same image or a changed image is a different hint
+    assert control_net().set_cond_hint(image.permute(0, 3, 2, 1)).hint_cache_key(64, 64)[0] != key
+    image.add_(1)
+    assert second.hint_cache_key(64, 64)[0] != key
@@ -0,0 +1,60 @@
+import threading
+
+import torch
+
+from comfy import sd1_clip
+from comfy.sd1_clip import EmbeddingCache
+
+
+class FakeEncoder:
+    layer = "last"
+    layer_idx = None
+    return_projected_pooled = True
+    encode = sd1_clip.SDClipModel.encode
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, tokens):
+        self.calls.append(len(tokens))
+        z = torch.tensor(tokens, dtype=torch.float32).unsqueeze(-1).repeat(1, 1, 4)
+        return z, z[:, 0], {"attention_mask": torch.ones(z.shape[:2], dtype=torch.long)}
+
+
+def test_chunks_are_encoded_once():
+    encoder = FakeEncoder()
+    cache = EmbeddingCache(1024 * 1024)
+    with sd1_clip.use_embedding_cache(cache, "weights"):
+        first = encoder.encode([[1, 2, 3], [4, 5, 6]])
+        second = encoder.encode([[4, 5, 6], [7, 8, 9]])
+
+    assert encoder.calls == [2, 1]
+    assert torch.equal(second[0][0], first[0][1])
+    assert torch.equal(second[0][1], torch.tensor([7.0, 8.0, 9.0]).unsqueeze(-1).repeat(1, 4))
+    assert second[2]["attention_mask"].shape == (2, 3)
+
+    # Other patches and no active cache run the encoder
+    with sd1_clip.use_embedding_cache(cache, "other weights"):
+        encoder.encode([[1, 2, 3]])
+    encoder.encode([[1, 2, 3]])
+    assert encoder.calls == [2, 1, 1, 1]
+
+
+def test_active_cache_is_local_to_the_thread():
+    encoder = FakeEncoder()
+    cache = EmbeddingCache(1024 * 1024)
+    with sd1_clip.use_embedding_cache(cache, "weights"):
+        thread = threading.Thread(target=encoder.encode, args=([[1, 2, 3]],))
+        thread.start()
+        thread.join()
+    assert len(cache.entries) == 0
+
+
+def test_least_recently_used_chunks_are_removed():
+    cache = EmbeddingCache(2 * 16)
+    cache.put("a", (torch.zeros(4), None))
+    cache.put("b", (torch.zeros(4), None))
+    cache.get("a")
+    cache.put("c", (torch.zeros(4), None))
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.total_size == 32
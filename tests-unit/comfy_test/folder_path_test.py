@@ -106,6 +106,24 @@ def test_get_filename_list(mock_folder_names_and_paths, mock_recursive_search):
     mock_recursive_search.return_value = (["file1.txt", "file2.jpg"], {})
     assert folder_paths.get_filename_list("test_folder") == ["file1.txt"]
 
+def test_get_filename_list_with_folder_index(temp_dir, clear_folder_paths):
+    from utils.directory_index import FolderIndex
+    folder_paths.folder_index = FolderIndex(mode="poll", poll_interval=60)
+    folder_paths.folder_names_and_paths["test_folder"] = ([temp_dir], {".txt"})
+    os.makedirs(os.path.join(temp_dir, "subdir"))
+    open(os.path.join(temp_dir, "file1.txt"), "w").close()
+    open(os.path.join(temp_dir, "file2.jpg"), "w").close()
+
+    assert folder_paths.get_filename_list("test_folder") == ["file1.txt"]
+    assert folder_paths.get_full_path("test_folder", "file1.txt") == os.path.join(temp_dir, "file1.txt")
+    assert folder_paths.get_full_path("test_folder", "missing.txt") is None
+
+    # Answered from the index until it sees the change
+    open(os.path.join(temp_dir, "subdir", "file3.txt"), "w").close()
+    assert folder_paths.get_filename_list("test_folder") == ["file1.txt"]
+    folder_paths.folder_index._on_change(os.path.join(temp_dir, "subdir"))
+    assert folder_paths.get_filename_list("test_folder") == ["file1.txt", os.path.join("subdir", "file3.txt")]
+
 def test_get_save_image_path(temp_dir):
     with patch("folder_paths.output_directory", temp_dir):
         full_output_folder, filename, counter, subfolder, filename_prefix = folder_paths.get_save_image_path("test", temp_dir, 100, 100)
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+import torch
+import safetensors.torch
+
+import comfy.utils
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    sd = {
+        "a.weight": torch.randn(16, 8),
+        "a.bias": torch.randn(8, dtype=torch.float16),
+        "b.weight": torch.randn(4, 4).to(torch.bfloat16),
+        "b.count": torch.arange(10, dtype=torch.int64),
+        "empty": torch.zeros(0, 3),
+        "mask": torch.tensor([True, False, True]),
+    }
+    path = os.path.join(tmp_path, "model.safetensors")
+    safetensors.torch.save_file(sd, path, metadata={"format": "pt"})
+    return path, sd
+
+
+@pytest.mark.parametrize("chunk_size", [comfy.utils.PARALLEL_LOAD_CHUNK_SIZE, 7])
+def test_parallel_load_matches_safetensors(checkpoint, chunk_size, monkeypatch):
+    path, expected = checkpoint
+    monkeypatch.setattr(comfy.utils, "PARALLEL_LOAD_CHUNK_SIZE", chunk_size)
+    sd, metadata = comfy.utils.load_safetensors_parallel(path, num_threads=4)
+    assert metadata == {"format": "pt"}
+    assert sd.keys() == expected.keys()
+    for k, v in expected.items():
+        assert sd[k].dtype == v.dtype
+        assert sd[k].shape == v.shape
+        assert torch.equal(sd[k], v)
+
+
+def test_parallel_load_converts_dtype(checkpoint):
+    path, expected = checkpoint
+    sd, _ = comfy.utils.load_safetensors_parallel(path, dtype=torch.float32, num_threads=2)
+    assert sd["b.weight"].dtype == torch.float32
+    assert torch.equal(sd["b.weight"], expected["b.weight"].to(torch.float32))
+    assert sd["b.count"].dtype == torch.int64
+
+
+def test_load_torch_file_uses_parallel_loader(checkpoint, monkeypatch):
+    path, expected = checkpoint
+    monkeypatch.setattr(comfy.utils, "PARALLEL_LOAD_THREADS", 2)
+    sd, metadata = comfy.utils.load_torch_file(path, return_metadata=True)
+    assert metadata == {"format": "pt"}
+    assert torch.equal(sd["a.weight"], expected["a.weight"])
+
+
+def test_parallel_load_truncated_file(checkpoint, monkeypatch):
+    path, _ = checkpoint
+    with open(path, "rb+") as f:
+        f.truncate(os.path.getsize(path) - 4)
+    monkeypatch.setattr(comfy.utils, "PARALLEL_LOAD_THREADS", 2)
+    with pytest.raises(ValueError, match="corrupt/incomplete"):
+        comfy.utils.load_torch_file(path)
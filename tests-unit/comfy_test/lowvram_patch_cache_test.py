@@ -0,0 +1,34 @@
+import torch
+
+from comfy.model_patcher import LowVramPatchCache
+
+
+def test_cached_weight_is_a_copy():
+    cache = LowVramPatchCache(1024)
+    weight = torch.ones(4, 4)
+    cache.put(("a", "w", torch.float32), weight)
+    weight += 1
+    assert torch.equal(cache.get(("a", "w", torch.float32)), torch.ones(4, 4))
+    assert cache.get(("a", "w", torch.float16)) is None
+
+
+def test_other_patches_are_evicted_first():
+    cache = LowVramPatchCache(2 * 64)
+    cache.put(("old", "w1", torch.float32), torch.zeros(16))
+    cache.put(("new", "w1", torch.float32), torch.zeros(16))
+    cache.put(("new", "w2", torch.float32), torch.zeros(16))
+    assert list(cache.entries) == [("new", "w1", torch.float32), ("new", "w2", torch.float32)]
+
+    # Entries of the current patches don't evict each other
+    cache.put(("new", "w3", torch.float32), torch.zeros(16))
+    assert cache.get(("new", "w3", torch.float32)) is None
+    assert cache.total_size == 2 * 64
+
+
+def test_remove_patches_of_unloaded_model():
+    cache = LowVramPatchCache(1024)
+    cache.put(("a", "w", torch.float32), torch.zeros(4))
+    cache.put(("b", "w", torch.float32), torch.zeros(4))
+    cache.remove_patches("a")
+    assert list(cache.entries) == [("b", "w", torch.float32)]
+    assert cache.total_size == 16
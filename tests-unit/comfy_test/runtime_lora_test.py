@@ -0,0 +1,55 @@
+import pytest
+import torch
+
+import comfy.lora
+import comfy.ops
+from comfy.weight_adapter import LoRAAdapter
+
+
+def make_layer(layer):
+    # The weight functions of CastWeightBiasOp are class level lists that other tests may append to
+    layer.weight_function = []
+    layer.bias_function = []
+    return layer
+
+
+def merged_output(layer, adapter, strength, x):
+    weight = comfy.lora.calculate_weight([(strength, adapter, 1.0, None, None)], layer.weight.detach().clone(), "test.weight")
+    if isinstance(layer, torch.nn.Linear):
+        return torch.nn.functional.linear(x, weight, layer.bias)
+    return layer._conv_forward(x, weight, layer.bias)
+
+
+@pytest.mark.parametrize("strength", [1.0, 0.4])
+def test_linear_branch_matches_merged_weight(strength):
+    torch.manual_seed(0)
+    layer = make_layer(comfy.ops.disable_weight_init.Linear(16, 8))
+    layer.weight.data = torch.randn(8, 16)
+    layer.bias.data = torch.randn(8)
+    adapter = LoRAAdapter(set(), (torch.randn(8, 4), torch.randn(4, 16), 2.0, None, None, None))
+    x = torch.randn(2, 3, 16)
+
+    expected = merged_output(layer, adapter, strength, x)
+    layer.lora_branches = [adapter.runtime_branch(layer.weight, strength)]
+    assert torch.allclose(layer(x), expected, atol=1e-4)
+
+
+def test_conv_branch_matches_merged_weight():
+    torch.manual_seed(0)
+    layer = make_layer(comfy.ops.disable_weight_init.Conv2d(6, 5, 3, padding=1, stride=2))
+    layer.weight.data = torch.randn(5, 6, 3, 3)
+    layer.bias.data = torch.randn(5)
+    adapter = LoRAAdapter(set(), (torch.randn(5, 2, 1, 1), torch.randn(2, 6, 3, 3), None, None, None, None))
+    x = torch.randn(2, 6, 9, 9)
+
+    expected = merged_output(layer, adapter, 0.7, x)
+    layer.lora_branches = [adapter.runtime_branch(layer.weight, 0.7)]
+    assert torch.allclose(layer(x), expected, atol=1e-4)
+
+
+def test_unsupported_lora_is_merged():
+    weight = torch.randn(8, 16)
+    dora = LoRAAdapter(set(), (torch.randn(8, 4), torch.randn(4, 16), None, None, torch.ones(8, 1), None))
+    assert dora.runtime_branch(weight, 1.0) is None
+    mismatched = LoRAAdapter(set(), (torch.randn(8, 4), torch.randn(4, 12), None, None, None, None))
+    assert mismatched.runtime_branch(weight, 1.0) is None
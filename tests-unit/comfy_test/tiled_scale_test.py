@@ -0,0 +1,39 @@
+import pytest
+import torch
+
+import comfy.utils
+
+
+def upscale(x):
+    return torch.nn.functional.interpolate(x, scale_factor=2, mode="nearest")
+
+
+@pytest.mark.parametrize("tile_batch_size", [1, 3, lambda shape: 64])
+def test_tiles_blend_back_to_the_full_result(tile_batch_size):
+    samples = torch.rand(2, 3, 40, 56)
+    calls = []
+
+    def function(x):
+        calls.append(x.shape[0])
+        return upscale(x)
+
+    out = comfy.utils.tiled_scale(samples, function, tile_x=16, tile_y=16, overlap=4, upscale_amount=2, tile_batch_size=tile_batch_size)
+    assert torch.allclose(out, upscale(samples), atol=1e-5)
+
+    tiles = samples.shape[0] * comfy.utils.get_tiled_scale_steps(56, 40, 16, 16, 4)
+    assert sum(calls) == tiles
+    if tile_batch_size != 1:
+        assert len(calls) < tiles
+
+
+def test_single_tile_inputs_are_batched():
+    samples = torch.rand(5, 3, 8, 8)
+    calls = []
+
+    def function(x):
+        calls.append(x.shape[0])
+        return upscale(x)
+
+    out = comfy.utils.tiled_scale(samples, function, tile_x=16, tile_y=16, overlap=4, upscale_amount=2, tile_batch_size=2)
+    assert torch.equal(out, upscale(samples))
+    assert calls == [2, 2, 1]
@@ -0,0 +1,165 @@
+import asyncio
+import os
+from typing import NamedTuple
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import folder_paths
+import nodes
+from comfy_execution.caching import DiskCache, NullCache, pack_value, signature_digest, to_hashable, unpack_value
+from comfy_execution.graph import DynamicPrompt
+from execution import get_model_folder, get_prompt_models
+
+
+class Entry(NamedTuple):
+    ui: dict
+    outputs: list
+
+
+class StubPersistentNode:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {"value": ("FLOAT",)},
+            "optional": {"ckpt_name": (folder_paths.get_filename_list("checkpoints"),)},
+        }
+
+    RETURN_TYPES = ("LATENT",)
+    FUNCTION = "run"
+    PERSISTENT_CACHE = True
+
+
+class StubIsChangedCache:
+    async def get(self, node_id):
+        return False
+
+
+@pytest.fixture
+def stub_node():
+    nodes.NODE_CLASS_MAPPINGS["StubPersistentNode"] = StubPersistentNode
+    yield
+    del nodes.NODE_CLASS_MAPPINGS["StubPersistentNode"]
+
+
+def make_cache(directory, value, max_size=1024 ** 3, **inputs):
+    prompt = {"1": {"class_type": "StubPersistentNode", "inputs": {"value": value, **inputs}}}
+    cache = DiskCache(NullCache(), str(directory), max_size=max_size, entry_class=Entry, get_prompt_models=get_prompt_models)
+    asyncio.run(cache.set_prompt(DynamicPrompt(prompt), prompt.keys(), StubIsChangedCache()))
+    return cache
+
+
+def test_signature_digest_is_stable():
+    signature = to_hashable([["CLIPTextEncode", False, ("text", "a cat")], {"b": 1, "a": 2.5}])
+    assert signature_digest(signature) == signature_digest(to_hashable([["CLIPTextEncode", False, ("text", "a cat")], {"a": 2.5, "b": 1}]))
+    assert signature_digest(signature) != signature_digest(to_hashable([["CLIPTextEncode", False, ("text", "a dog")], {"a": 2.5, "b": 1}]))
+    # True and 1 hash the same in python but must not collide on disk
+    assert signature_digest(to_hashable([True])) != signature_digest(to_hashable([1]))
+
+
+def test_signature_digest_rejects_unreproducible_keys():
+    assert signature_digest(to_hashable(["node", float("NaN")])) is None
+    assert signature_digest(to_hashable(["node", object()])) is None
+
+
+def test_pack_roundtrip():
+    samples = torch.randn(1, 4, 8, 8)
+    value = [[{"samples": samples, "batch_index": [0]}], ("text", 1.5, None, True)]
+    tensors = {}
+    packed = pack_value(value, tensors)
+    assert len(tensors) == 1
+    result = unpack_value(packed, tensors)
+    assert result[0][0]["samples"] is samples
+    assert result[0][0]["batch_index"] == [0]
+    assert result[1] == ("text", 1.5, None, True)
+
+
+def test_disk_cache_survives_new_instance(tmp_path, stub_node):
+    samples = torch.randn(1, 4, 8, 8)
+    cache = make_cache(tmp_path, 0.5)
+    assert cache.get("1") is None
+    cache.set("1", Entry(ui={}, outputs=[[{"samples": samples}]]))
+    cache.flush()
+
+    restored = make_cache(tmp_path, 0.5).get("1")
+    assert restored is not None
+    assert torch.equal(restored.outputs[0][0]["samples"], samples)
+
+    assert make_cache(tmp_path, 0.25).get("1") is None
+
+
+def test_disk_cache_skips_unsupported_outputs(tmp_path, stub_node):
+    cache = make_cache(tmp_path, 0.5)
+    cache.set("1", Entry(ui={}, outputs=[[object()]]))
+    cache.flush()
+    assert os.listdir(tmp_path) == []
+
+
+def test_disk_cache_evicts_oldest(tmp_path, stub_node):
+    entry_size = None
+    written = set()
+    for i in range(4):
+        max_size = 1024 ** 3 if entry_size is None else entry_size * 2.5
+        cache = make_cache(tmp_path, float(i), max_size=max_size)
+        cache.set("1", Entry(ui={}, outputs=[[torch.zeros(4, 64, 64)]]))
+        cache.flush()
+        for name in set(os.listdir(tmp_path)) - written:
+            path = os.path.join(tmp_path, name)
+            entry_size = os.path.getsize(path)
+            # Give every entry a distinct age
+            os.utime(path, (1000 + i, 1000 + i))
+            written.add(name)
+    assert len(os.listdir(tmp_path)) == 2
+    assert make_cache(tmp_path, 3.0).get("1") is not None
+    assert make_cache(tmp_path, 2.0).get("1") is not None
+    assert make_cache(tmp_path, 0.0).get("1") is None
+
+
+@pytest.fixture
+def model_folders(tmp_path, monkeypatch):
+    folders = {}
+    for folder_name in ("checkpoints", "loras"):
+        folder = tmp_path / folder_name
+        folder.mkdir()
+        (folder / "model.safetensors").write_bytes(b"1234")
+        monkeypatch.setitem(folder_paths.folder_names_and_paths, folder_name, ([str(folder)], folder_paths.supported_pt_extensions))
+        folders[folder_name] = folder
+    return folders
+
+
+def test_disk_cache_misses_after_model_file_changes(tmp_path, stub_node, model_folders):
+    directory = tmp_path / "cache"
+    cache = make_cache(directory, 0.5, ckpt_name="model.safetensors")
+    cache.set("1", Entry(ui={}, outputs=[[torch.zeros(4)]]))
+    cache.flush()
+    assert make_cache(directory, 0.5, ckpt_name="model.safetensors").get("1") is not None
+
+    # A file with the same name in a folder the loader doesn't list from doesn't matter
+    (model_folders["loras"] / "model.safetensors").write_bytes(b"123456")
+    assert make_cache(directory, 0.5, ckpt_name="model.safetensors").get("1") is not None
+
+    (model_folders["checkpoints"] / "model.safetensors").write_bytes(b"123456")
+    assert make_cache(directory, 0.5, ckpt_name="model.safetensors").get("1") is None
+
+
+def test_get_model_folder(stub_node, model_folders):
+    assert get_model_folder("StubPersistentNode", "ckpt_name", "model.safetensors") == "checkpoints"
+    assert get_model_folder("StubPersistentNode", "ckpt_name", "missing.safetensors") is None
+    assert get_model_folder("StubPersistentNode", "value", "model.safetensors") is None
+    prompt = {"1": {"class_type": "StubPersistentNode", "inputs": {"value": 0.5, "ckpt_name": "model.safetensors"}}}
+    assert get_prompt_models(prompt, folders=True) == {("checkpoints", "model.safetensors")}
+
+
+def test_disk_cache_has_doesnt_load_entries(tmp_path, stub_node, monkeypatch):
+    cache = make_cache(tmp_path, 0.5)
+    assert not cache.has("1")
+    cache.set("1", Entry(ui={}, outputs=[[torch.zeros(4)]]))
+    cache.flush()
+
+    cache = make_cache(tmp_path, 0.5)
+    monkeypatch.setattr(cache, "entry_class", None)
+    assert cache.has("1")
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+import folder_paths
+from comfy_execution.prefetch import ModelPrefetcher
+
+
+class StubQueue:
+    def __init__(self, queued):
+        self.queued = queued
+        self.version = 0
+
+    def get_current_queue_volatile(self):
+        return [], self.queued
+
+
+def prompt_models(prompt):
+    return {value for node in prompt.values() for value in node["inputs"].values()}
+
+
+def make_item(number, *models):
+    inputs = {"model_{}".format(i): m for i, m in enumerate(models)}
+    return (number, str(number), {"1": {"class_type": "Loader", "inputs": inputs}}, {}, ["1"], {})
+
+
+@pytest.fixture
+def model_folders(tmp_path, monkeypatch):
+    checkpoints = tmp_path / "checkpoints"
+    loras = tmp_path / "loras"
+    checkpoints.mkdir()
+    loras.mkdir()
+    (checkpoints / "a.safetensors").write_bytes(b"a" * 100)
+    (checkpoints / "b.safetensors").write_bytes(b"b" * 100)
+    (loras / "l.safetensors").write_bytes(b"l" * 100)
+    monkeypatch.setattr(folder_paths, "folder_names_and_paths", {
+        "checkpoints": ([str(checkpoints)], folder_paths.supported_pt_extensions),
+        "loras": ([str(loras)], folder_paths.supported_pt_extensions),
+    })
+    return tmp_path
+
+
+def test_pending_files_only_looks_at_the_next_prompts(model_folders):
+    queue = StubQueue([
+        make_item(0, "a.safetensors", "l.safetensors", "missing.safetensors"),
+        make_item(1, "a.safetensors"),
+        make_item(2, "b.safetensors"),
+    ])
+    prefetcher = ModelPrefetcher(queue, prompt_models, depth=2)
+    assert prefetcher.pending_files() == [
+        os.path.join(model_folders, "checkpoints", "a.safetensors"),
+        os.path.join(model_folders, "loras", "l.safetensors"),
+    ]
+
+
+def test_warm_reads_each_file_once(model_folders):
+    prefetcher = ModelPrefetcher(StubQueue([]), prompt_models)
+    path = os.path.join(model_folders, "checkpoints", "a.safetensors")
+    assert prefetcher.warm(path)
+    assert not prefetcher.warm(path)
+
+    # A replaced file is read again
+    with open(path, "wb") as f:
+        f.write(b"c" * 200)
+    assert prefetcher.warm(path)
+    assert not prefetcher.warm(os.path.join(model_folders, "missing.safetensors"))
+
+
+
+class ChangingQueue(StubQueue):
+    """A prompt gets queued while the first chunk of a file is read."""
+    def __init__(self):
+        super().__init__([])
+        self.checks = 0
+
+    @property
+    def version(self):
+        self.checks += 1
+        return 0 if self.checks == 1 else 1
+
+    @version.setter
+    def version(self, value):
+        pass
+
+
+def test_warm_continues_after_the_queue_changed(model_folders):
+    prefetcher = ModelPrefetcher(ChangingQueue(), prompt_models)
+    prefetcher.READ_SIZE = 40
+    path = os.path.join(model_folders, "checkpoints", "a.safetensors")
+    assert not prefetcher.warm(path, version=0)
+    assert list(prefetcher.partial.values()) == [40]
+    assert len(prefetcher.warmed) == 0
+
+    assert prefetcher.warm(path, version=1)
+    assert len(prefetcher.partial) == 0
+    assert len(prefetcher.warmed) == 1
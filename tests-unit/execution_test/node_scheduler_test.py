@@ -0,0 +1,152 @@
+import asyncio
+import contextvars
+import threading
+
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import nodes
+from comfy_execution.graph import DynamicPrompt, ExecutionList
+from comfy_execution.scheduling import NodeScheduler
+
+
+class ImageNode:
+    RETURN_TYPES = ("IMAGE",)
+    FUNCTION = "run"
+
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {"optional": {"a": ("IMAGE",), "b": ("IMAGE",)}}
+
+    def run(self, a=None, b=None):
+        return (threading.current_thread().name,)
+
+
+class CpuNode(ImageNode):
+    CPU_BOUND = True
+
+
+class OutputNode(ImageNode):
+    OUTPUT_NODE = True
+
+
+class AsyncNode(ImageNode):
+    async def run(self, a=None, b=None):
+        return (None,)
+
+
+class NoCache:
+    def get(self, node_id):
+        return None
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = NodeScheduler(2)
+    yield scheduler
+    scheduler.cpu_pool.shutdown()
+    scheduler.device_lane.shutdown()
+
+
+@pytest.fixture
+def stub_nodes(monkeypatch):
+    for class_def in (ImageNode, CpuNode, OutputNode, AsyncNode):
+        monkeypatch.setitem(nodes.NODE_CLASS_MAPPINGS, "Test" + class_def.__name__, class_def)
+
+
+def test_unknown_nodes_run_on_the_device_lane(scheduler):
+    assert not scheduler.is_cpu_bound(ImageNode, "TestImageNode")
+
+
+def test_cpu_bound_attribute_wins(scheduler):
+    assert scheduler.is_cpu_bound(CpuNode, "TestCpuNode")
+
+    class NotCpuBound(ImageNode):
+        CPU_BOUND = False
+    assert not scheduler.is_cpu_bound(NotCpuBound, "ImageInvert")
+
+
+def test_core_allowlist(scheduler):
+    assert scheduler.is_cpu_bound(nodes.NODE_CLASS_MAPPINGS["ImageInvert"], "ImageInvert")
+    # A custom node registered under a core name doesn't inherit the core node's lane
+    assert not scheduler.is_cpu_bound(ImageNode, "ImageInvert")
+
+
+def test_node_executor_lanes(scheduler):
+    assert scheduler.get_node_executor(AsyncNode, "TestAsyncNode") is None
+
+    async def call(class_def):
+        run = scheduler.get_node_executor(class_def, "Test" + class_def.__name__)
+        return await run(lambda: class_def().run()[0])
+    assert asyncio.run(call(CpuNode)).startswith("comfy_cpu")
+    assert asyncio.run(call(ImageNode)).startswith("comfy_device")
+
+
+def test_node_executor_copies_context(scheduler):
+    var = contextvars.ContextVar("var", default=None)
+
+    async def call():
+        var.set("prompt")
+        run = scheduler.get_node_executor(CpuNode, "TestCpuNode")
+        return await run(var.get)
+    assert asyncio.run(call()) == "prompt"
+
+
+def make_execution_list(prompt):
+    execution_list = ExecutionList(DynamicPrompt(prompt), NoCache())
+    for node_id in prompt:
+        execution_list.add_node(node_id)
+    return execution_list
+
+
+def test_stage_ready_nodes(stub_nodes):
+    prompt = {
+        "1": {"class_type": "TestImageNode", "inputs": {}},
+        "2": {"class_type": "TestImageNode", "inputs": {}},
+        "3": {"class_type": "TestImageNode", "inputs": {"a": ["1", 0], "b": ["2", 0]}},
+        "4": {"class_type": "TestOutputNode", "inputs": {"a": ["3", 0]}},
+    }
+    execution_list = make_execution_list(prompt)
+
+    async def run():
+        staged = []
+        ready, error, _ = await execution_list.stage_ready_nodes()
+        assert error is None
+        staged.append(sorted(ready))
+        # Already staged nodes aren't returned again while they run
+        staged.append((await execution_list.stage_ready_nodes(in_flight=True))[0])
+        execution_list.complete_node_execution("1")
+        staged.append((await execution_list.stage_ready_nodes(in_flight=True))[0])
+        execution_list.complete_node_execution("2")
+        staged.append((await execution_list.stage_ready_nodes(in_flight=False))[0])
+        execution_list.complete_node_execution("3")
+        staged.append((await execution_list.stage_ready_nodes())[0])
+        execution_list.complete_node_execution("4")
+        staged.append((await execution_list.stage_ready_nodes())[0])
+        return staged
+    assert asyncio.run(run()) == [["1", "2"], [], [], ["3"], ["4"], []]
+
+
+def test_stage_ready_nodes_prefers_output_and_async_nodes(stub_nodes):
+    prompt = {
+        "1": {"class_type": "TestImageNode", "inputs": {}},
+        "2": {"class_type": "TestOutputNode", "inputs": {}},
+        "3": {"class_type": "TestAsyncNode", "inputs": {}},
+    }
+    ready, _, _ = asyncio.run(make_execution_list(prompt).stage_ready_nodes())
+    assert ready[-1] == "1"
+    assert sorted(ready[:2]) == ["2", "3"]
+
+
+def test_unstaged_nodes_are_staged_again(stub_nodes):
+    execution_list = make_execution_list({"1": {"class_type": "TestImageNode", "inputs": {}}})
+
+    async def run():
+        first = (await execution_list.stage_ready_nodes())[0]
+        execution_list.unstage_node_execution("1")
+        return first, (await execution_list.stage_ready_nodes(in_flight=True))[0]
+    assert asyncio.run(run()) == (["1"], ["1"])
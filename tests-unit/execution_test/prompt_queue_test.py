@@ -0,0 +1,120 @@
+import pytest
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+from execution import PromptQueue, get_prompt_models
+
+
+class StubServer:
+    def __init__(self):
+        self.updates = 0
+
+    def queue_updated(self):
+        self.updates += 1
+
+
+def make_item(number, prompt_id):
+    return (number, prompt_id, {"1": {"class_type": "Stub", "inputs": {}}}, {}, ["1"], {})
+
+
+@pytest.fixture
+def queue():
+    return PromptQueue(StubServer())
+
+
+def test_interactive_lane_runs_before_batch(queue):
+    queue.put(make_item(0, "batch-0"), lane="batch")
+    queue.put(make_item(2, "interactive-2"))
+    queue.put(make_item(1, "interactive-1"), lane="interactive")
+
+    order = []
+    for _ in range(3):
+        item, item_id = queue.get()
+        order.append(item[1])
+        queue.task_done(item_id, {}, None)
+    assert order == ["interactive-1", "interactive-2", "batch-0"]
+    assert queue.get(timeout=0.01) is None
+
+
+def test_unknown_lane(queue):
+    with pytest.raises(ValueError):
+        queue.put(make_item(0, "a"), lane="urgent")
+
+
+def test_delete_by_id(queue):
+    for i in range(5):
+        queue.put(make_item(i, str(i)), lane="batch" if i % 2 else "interactive")
+    assert queue.delete_queue_item_by_id("2")
+    assert queue.delete_queue_item_by_id("3")
+    assert not queue.delete_queue_item_by_id("3")
+    assert queue.delete_queue_item(lambda item: item[1] == "4")
+    assert queue.get_tasks_remaining() == 2
+    assert [x[1] for x in queue.get_current_queue_volatile()[1]] == ["0", "1"]
+    assert [queue.get()[0][1] for _ in range(2)] == ["0", "1"]
+
+
+def test_snapshot_shares_items_and_updates(queue):
+    item = make_item(0, "a")
+    queue.put(item)
+    running, queued = queue.get_current_queue_volatile()
+    assert running == [] and queued[0] is item
+    assert queue.get_current_queue_volatile()[1] is queued
+
+    executing, item_id = queue.get()
+    executing[2]["1"]["is_changed"] = [True]
+    running, queued = queue.get_current_queue()
+    assert queued == []
+    assert running[0] is item
+    assert "is_changed" not in item[2]["1"]
+
+
+def make_model_item(number, prompt_id, model):
+    return (number, prompt_id, {"1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": model}}}, {}, ["1"], {})
+
+
+def test_affinity_picks_first_item_using_the_models(queue):
+    queue.AFFINITY_WINDOW = 2
+    for i, model in enumerate(["a.safetensors", "b.safetensors", "c.safetensors", "b.safetensors", "c.safetensors"]):
+        queue.put(make_model_item(i, str(i), model))
+    queue.put(make_model_item(0, "batch", "d.safetensors"), lane="batch")
+
+    assert queue.get(affinity={"c.safetensors", "d.safetensors"})[0][1] == "2"
+    assert queue.delete_queue_item_by_id("4")
+    # Deleted items and items in a later lane are not considered
+    assert queue.get(affinity={"c.safetensors", "d.safetensors"})[0][1] == "0"
+    assert queue.get(affinity={"b.safetensors"})[0][1] == "1"
+    assert queue.get(affinity={"b.safetensors"})[0][1] == "3"
+    assert queue.get_tasks_remaining() == 5
+    assert [x[1] for x in queue.get_current_queue_volatile()[1]] == ["batch"]
+
+
+def test_affinity_passes_over_the_front_a_limited_number_of_times(queue):
+    queue.AFFINITY_WINDOW = 2
+    queue.put(make_model_item(0, "front", "a.safetensors"))
+    for i in range(1, 4):
+        queue.put(make_model_item(i, str(i), "b.safetensors"))
+
+    assert [queue.get(affinity={"b.safetensors"})[0][1] for _ in range(4)] == ["1", "2", "front", "3"]
+
+
+def test_get_prompt_models():
+    prompt = {
+        "1": {"class_type": "CheckpointLoaderSimple", "inputs": {"ckpt_name": "sd15/model.safetensors"}},
+        "2": {"class_type": "LoraLoader", "inputs": {"lora_name": "style.PT", "strength_model": 1.0, "model": ["1", 0]}},
+        "3": {"class_type": "CLIPTextEncode", "inputs": {"text": "a cat", "clip": ["2", 1]}},
+    }
+    assert get_prompt_models(prompt) == {"sd15/model.safetensors", "style.PT"}
+
+
+def test_flags_reach_every_worker(queue):
+    workers = [queue.add_worker(), queue.add_worker()]
+    queue.set_flag("free_memory", True)
+
+    assert queue.get_flags(worker=workers[0]) == {"free_memory": True}
+    assert queue.get_flags(worker=workers[0]) == {}
+    assert queue.get_flags(reset=False, worker=workers[1]) == {"free_memory": True}
+    assert queue.get_flags(worker=workers[1]) == {"free_memory": True}
+    assert queue.get_flags(worker=workers[1]) == {}
@@ -0,0 +1,51 @@
+import asyncio
+from types import SimpleNamespace
+
+import torch
+
+from comfy.cli_args import args
+if not torch.cuda.is_available():
+    args.cpu = True
+
+import comfy_execution.caching as caching
+from comfy_execution.caching import CacheKeySetID, RAMPressureCache, get_value_size
+from comfy_execution.graph import DynamicPrompt
+
+
+class RamUsageObject:
+    def get_ram_usage(self):
+        return 1000
+
+
+def test_value_size_counts_nested_outputs():
+    samples = torch.zeros(2, 4, 8, 8)
+    pooled = torch.zeros(1, 16)
+    latent = [{"samples": samples}]
+    conditioning = [[[samples[:1], {"pooled_output": pooled}]]]
+    assert get_value_size(latent) == samples.numel() * samples.element_size()
+    # The view shares its storage with samples, so it is only counted once
+    assert get_value_size([latent, conditioning]) == (samples.numel() + pooled.numel()) * 4
+    assert get_value_size([[RamUsageObject()], "text", 5]) == 1000
+
+
+def test_poll_evicts_largest_entries_until_headroom(monkeypatch):
+    prompt = {str(i): {"class_type": "Stub", "inputs": {}} for i in range(4)}
+    cache = RAMPressureCache(CacheKeySetID)
+    asyncio.run(cache.set_prompt(DynamicPrompt(prompt), prompt.keys(), None))
+    sizes = {"0": 1, "1": 300, "2": 100, "3": 200}
+    for node_id, size in sizes.items():
+        cache.set(node_id, ([], [[torch.zeros(size * 1024 ** 2, dtype=torch.uint8)]]))
+
+    available = {"gb": 0.5}
+    def virtual_memory():
+        return SimpleNamespace(available=available["gb"] * 1024 ** 3)
+    monkeypatch.setattr(caching.psutil, "virtual_memory", virtual_memory)
+    def collect():
+        available["gb"] = 0.5 + sum(s for k, s in sizes.items() if cache.get(k) is None) / 1024
+    monkeypatch.setattr(caching.gc, "collect", collect)
+
+    cache.poll(ram_headroom=0.75)
+    assert cache.get("1") is None
+    assert cache.get("3") is None
+    assert cache.get("2") is not None
+    assert cache.get("0") is not None
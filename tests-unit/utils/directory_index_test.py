@@ -0,0 +1,95 @@
+import os
+import time
+
+import pytest
+
+from utils.directory_index import DirectoryIndex, FolderIndex
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("test")
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    root = str(tmp_path / "models")
+    touch(os.path.join(root, "a.safetensors"))
+    touch(os.path.join(root, "sub", "b.safetensors"))
+    touch(os.path.join(root, "sub", "deep", "c.ckpt"))
+    touch(os.path.join(root, ".git", "config"))
+    return root
+
+
+def test_scan_skips_excluded_dirs(model_dir):
+    index = DirectoryIndex(model_dir, [".git"])
+    index.scan()
+    files, _ = index.get_files()
+    assert sorted(files) == sorted(["a.safetensors", os.path.join("sub", "b.safetensors"), os.path.join("sub", "deep", "c.ckpt")])
+
+
+def test_update_only_relists_changed_directory(model_dir):
+    index = DirectoryIndex(model_dir, [".git"])
+    index.scan()
+    version = index.version
+
+    touch(os.path.join(model_dir, "sub", "new.safetensors"))
+    added, removed = index.update(os.path.join(model_dir, "sub"))
+    assert added == [] and removed == []
+    assert index.contains(os.path.join("sub", "new.safetensors"))
+    assert index.version == version + 1
+
+    # Nothing changed, the version stays the same
+    index.update(os.path.join(model_dir, "sub"))
+    assert index.version == version + 1
+
+
+def test_update_adds_and_removes_subtrees(model_dir):
+    index = DirectoryIndex(model_dir, [".git"])
+    index.scan()
+
+    touch(os.path.join(model_dir, "other", "nested", "d.pt"))
+    added, _ = index.update(model_dir)
+    assert sorted(added) == sorted([os.path.join(model_dir, "other"), os.path.join(model_dir, "other", "nested")])
+    assert index.contains(os.path.join("other", "nested", "d.pt"))
+
+    os.rename(os.path.join(model_dir, "sub"), os.path.join(model_dir, "moved"))
+    added, removed = index.update(model_dir)
+    assert sorted(removed) == sorted([os.path.join(model_dir, "sub"), os.path.join(model_dir, "sub", "deep")])
+    assert not index.contains(os.path.join("sub", "b.safetensors"))
+    assert index.contains(os.path.join("moved", "deep", "c.ckpt"))
+
+
+@pytest.mark.parametrize("mode", ["poll", "auto"])
+def test_folder_index_picks_up_changes(model_dir, mode):
+    folder_index = FolderIndex(mode=mode, poll_interval=0.05)
+    assert folder_index.contains(model_dir, "a.safetensors")
+    _, versions = folder_index.list_files([model_dir])
+
+    # Make sure the mtime changes on filesystems with a coarse resolution
+    time.sleep(0.05)
+    touch(os.path.join(model_dir, "sub", "deep", "e.safetensors"))
+    assert wait_for(lambda: folder_index.contains(model_dir, os.path.join("sub", "deep", "e.safetensors")))
+    assert folder_index.versions([model_dir]) != versions
+
+    os.remove(os.path.join(model_dir, "a.safetensors"))
+    assert wait_for(lambda: not folder_index.contains(model_dir, "a.safetensors"))
+
+
+def test_folder_index_missing_root_is_indexed_once_created(tmp_path):
+    folder_index = FolderIndex(mode="poll", poll_interval=0.05)
+    root = str(tmp_path / "later")
+    assert folder_index.list_files([root])[0] == []
+
+    touch(os.path.join(root, "f.safetensors"))
+    assert folder_index.list_files([root])[0] == ["f.safetensors"]
@@ -0,0 +1,113 @@
+"""
+Compares the load times of safetensors files with safe_open (mmap) and with load_safetensors_parallel (--parallel-load).
+
+Every mode is timed with a cold page cache, the file is dropped from it with posix_fadvise before each run, and with a
+warm one, the file is read once before the runs. Loads end with the tensors materialized on the target device, for the
+mmap mode on the cpu this means copying them out of the mapping the same way --disable-mmap does.
+
+    python tests/benchmarks/safetensors_load.py models/checkpoints/model.safetensors --device cuda --threads 4 8 16
+
+Dropping the page cache without root only works on Linux, on other systems the cold runs are skipped.
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", ".."))
+
+import safetensors  # noqa: E402
+import torch  # noqa: E402
+
+import comfy.utils  # noqa: E402
+
+READ_SIZE = 64 * 1024 * 1024
+
+
+def drop_page_cache(path):
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fdatasync(fd)
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return True
+
+
+def warm_page_cache(path):
+    with open(path, "rb", buffering=0) as f:
+        while f.read(READ_SIZE):
+            pass
+
+
+def synchronize(device):
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+def load_mmap(path, device):
+    sd = {}
+    with safetensors.safe_open(path, framework="pt", device="cpu") as f:
+        for k in f.keys():
+            sd[k] = f.get_tensor(k).to(device=device, copy=True)
+    return sd
+
+
+def load_parallel(path, device, num_threads, pin_memory):
+    sd, _ = comfy.utils.load_safetensors_parallel(path, num_threads=num_threads, pin_memory=pin_memory)
+    if device.type != "cpu":
+        sd = {k: v.to(device, non_blocking=pin_memory) for k, v in sd.items()}
+    return sd
+
+
+def run(path, load, device, cold, repeats):
+    times = []
+    for _ in range(repeats):
+        if cold:
+            drop_page_cache(path)
+        else:
+            warm_page_cache(path)
+        start = time.perf_counter()
+        sd = load()
+        synchronize(device)
+        times.append(time.perf_counter() - start)
+        del sd
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--threads", type=int, nargs="+", default=[8])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--pin-memory", action="store_true", help="Read into pinned memory in the parallel modes.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    device = torch.device(args.device)
+    caches = ["warm"]
+    if hasattr(os, "posix_fadvise"):
+        caches.insert(0, "cold")
+    else:
+        logging.info("posix_fadvise isn't available, only measuring with a warm page cache.")
+
+    modes = [("mmap", lambda path: load_mmap(path, device))]
+    for num_threads in args.threads:
+        modes.append(("parallel-load {}".format(num_threads), lambda path, n=num_threads: load_parallel(path, device, n, args.pin_memory)))
+
+    logging.info("{:<40} {:<20} {:>6} {:>10} {:>10}".format("file", "mode", "cache", "seconds", "GB/s"))
+    for path in args.files:
+        size = os.path.getsize(path)
+        for cache in caches:
+            for name, load in modes:
+                seconds = run(path, lambda: load(path), device, cache == "cold", args.repeats)
+                logging.info("{:<40} {:<20} {:>6} {:>10.3f} {:>10.2f}".format(os.path.basename(path)[:40], name, cache, seconds, size / seconds / 1024 ** 3))
+
+
+if __name__ == "__main__":
+    main()
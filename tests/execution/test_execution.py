@@ -156,6 +156,7 @@ class TestExecution:
         { "extra_args" : ["--cache-lru", 0], "should_cache_results" : True },
         { "extra_args" : ["--cache-lru", 100], "should_cache_results" : True },
         { "extra_args" : ["--cache-none"], "should_cache_results" : False },
+        { "extra_args" : ["--parallel-execution", 4], "should_cache_results" : True },
     ])
     def server(self, args_pytest, request):
         # Start server
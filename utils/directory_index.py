@@ -0,0 +1,353 @@
+"""
+In-memory index of the files below a set of directories, kept up to date by a watcher.
+
+When a directory changes only that directory is listed again, so lookups never touch the filesystem and a change in a
+folder with tens of thousands of files doesn't trigger a full walk. Changes are picked up with inotify on Linux and by
+polling the modification time of every directory otherwise. inotify doesn't see changes made by other machines on
+network filesystems, use polling for those.
+"""
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable
+
+
+class DirectoryIndex:
+    """Files below root as paths relative to it, directories named in excluded_dir_names are skipped."""
+    def __init__(self, root: str, excluded_dir_names: list[str]):
+        self.root = root
+        self.excluded_dir_names = excluded_dir_names
+        self.lock = threading.Lock()
+        # directory -> (file names, subdirectory names)
+        self.dirs: dict[str, tuple[set[str], set[str]]] = {}
+        self.files: set[str] = set()
+        self.version = 0
+
+    def _list(self, directory: str) -> tuple[set[str], set[str]] | None:
+        files = set()
+        subdirs = set()
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    try:
+                        # Both follow symlinks, broken links are neither
+                        if entry.is_dir():
+                            if entry.name not in self.excluded_dir_names:
+                                subdirs.add(entry.name)
+                        elif entry.is_file():
+                            files.add(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        return files, subdirs
+
+    def _relative(self, directory: str, name: str) -> str:
+        return os.path.relpath(os.path.join(directory, name), self.root)
+
+    def _add_tree(self, directory: str, added: list[str], seen: set[str]):
+        real_path = os.path.realpath(directory)
+        if real_path in seen:
+            # Symlink loop
+            return
+        seen.add(real_path)
+        listing = self._list(directory)
+        if listing is None:
+            return
+        files, subdirs = listing
+        self.dirs[directory] = listing
+        self.files.update(self._relative(directory, f) for f in files)
+        added.append(directory)
+        for d in subdirs:
+            self._add_tree(os.path.join(directory, d), added, seen)
+
+    def _remove_tree(self, directory: str, removed: list[str]):
+        listing = self.dirs.pop(directory, None)
+        if listing is None:
+            return
+        files, subdirs = listing
+        self.files.difference_update(self._relative(directory, f) for f in files)
+        removed.append(directory)
+        for d in subdirs:
+            self._remove_tree(os.path.join(directory, d), removed)
+
+    def scan(self) -> list[str]:
+        """Indexes everything below root, returns the directories that were found."""
+        with self.lock:
+            self.dirs = {}
+            self.files = set()
+            added = []
+            if os.path.isdir(self.root):
+                self._add_tree(self.root, added, set())
+            self.version += 1
+            return added
+
+    def update(self, directory: str) -> tuple[list[str], list[str]]:
+        """Lists directory again after it changed, returns the directories that were added and removed."""
+        added = []
+        removed = []
+        with self.lock:
+            old = self.dirs.get(directory)
+            if old is None and directory != self.root:
+                # Not indexed (yet), its parent will pick it up
+                return added, removed
+            listing = self._list(directory) if os.path.isdir(directory) else None
+            if listing is None:
+                self._remove_tree(directory, removed)
+            else:
+                if old is None:
+                    old = (set(), set())
+                files, subdirs = listing
+                if listing == old:
+                    return added, removed
+                self.files.difference_update(self._relative(directory, f) for f in old[0] - files)
+                self.files.update(self._relative(directory, f) for f in files - old[0])
+                self.dirs[directory] = listing
+                for d in old[1] - subdirs:
+                    self._remove_tree(os.path.join(directory, d), removed)
+                for d in subdirs - old[1]:
+                    self._add_tree(os.path.join(directory, d), added, set())
+            self.version += 1
+        return added, removed
+
+    def contains(self, relative_path: str) -> bool:
+        with self.lock:
+            return relative_path in self.files
+
+    def get_files(self) -> tuple[list[str], int]:
+        with self.lock:
+            return list(self.files), self.version
+
+
+class PollingWatcher:
+    """Calls on_change(directory) from a background thread when the modification time of a watched directory changes."""
+    def __init__(self, on_change: Callable[[str], None], interval: float):
+        self.on_change = on_change
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.mtimes: dict[str, float | None] = {}
+        self.thread = None
+
+    def watch(self, directory: str) -> bool:
+        try:
+            mtime = os.path.getmtime(directory)
+        except OSError:
+            mtime = None
+        with self.lock:
+            self.mtimes[directory] = mtime
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True, name="directory_index_poll")
+                self.thread.start()
+        return True
+
+    def unwatch(self, directory: str):
+        with self.lock:
+            self.mtimes.pop(directory, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                directories = list(self.mtimes.items())
+            for directory, mtime in directories:
+                try:
+                    current = os.path.getmtime(directory)
+                except OSError:
+                    current = None
+                if current != mtime:
+                    with self.lock:
+                        if directory in self.mtimes:
+                            self.mtimes[directory] = current
+                    self.on_change(directory)
+
+
+class InotifyWatcher:
+    """Calls on_change(directory) from a background thread when entries of a watched directory are added or removed."""
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_MOVE_SELF = 0x800
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    IN_ONLYDIR = 0x1000000
+    WATCH_MASK = IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+    EVENT_HEADER = struct.Struct("iIII")
+
+    @staticmethod
+    def load_libc():
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            libc.inotify_init1
+            libc.inotify_add_watch
+            return libc
+        except (OSError, AttributeError):
+            return None
+
+    def __init__(self, on_change: Callable[[str], None], on_overflow: Callable[[], None], libc):
+        self.on_change = on_change
+        self.on_overflow = on_overflow
+        self.libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.lock = threading.Lock()
+        self.watches: dict[int, str] = {}
+        self.watch_descriptors: dict[str, int] = {}
+        self.thread = threading.Thread(target=self._run, daemon=True, name="directory_index_inotify")
+        self.thread.start()
+
+    def watch(self, directory: str) -> bool:
+        """Returns False if the directory can't be watched, for example when the inotify watch limit is reached."""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.WATCH_MASK)
+        if wd < 0:
+            return False
+        with self.lock:
+            self.watches[wd] = directory
+            self.watch_descriptors[directory] = wd
+        return True
+
+    def unwatch(self, directory: str):
+        with self.lock:
+            wd = self.watch_descriptors.pop(directory, None)
+            if wd is not None and self.watches.get(wd) == directory:
+                del self.watches[wd]
+                self.libc.inotify_rm_watch(self.fd, wd)
+
+    def _run(self):
+        buffer = b""
+        while True:
+            select.select([self.fd], [], [])
+            try:
+                buffer += os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            changed = {}
+            overflow = False
+            while len(buffer) >= self.EVENT_HEADER.size:
+                wd, mask, _cookie, length = self.EVENT_HEADER.unpack_from(buffer)
+                if len(buffer) < self.EVENT_HEADER.size + length:
+                    break
+                buffer = buffer[self.EVENT_HEADER.size + length:]
+                if mask & self.IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                with self.lock:
+                    directory = self.watches.get(wd)
+                    if mask & self.IN_IGNORED and directory is not None:
+                        del self.watches[wd]
+                        if self.watch_descriptors.get(directory) == wd:
+                            del self.watch_descriptors[directory]
+                if directory is not None:
+                    changed[directory] = None
+            if overflow:
+                self.on_overflow()
+                continue
+            for directory in changed:
+                self.on_change(directory)
+
+
+class FolderIndex:
+    """
+    Indexes of several root directories sharing one watcher. mode is "inotify", "poll" or "auto" (inotify when it's
+    available). Directories inotify can't watch are polled.
+    """
+    def __init__(self, mode: str = "auto", poll_interval: float = 5.0, excluded_dir_names: list[str] | None = None):
+        self.excluded_dir_names = excluded_dir_names if excluded_dir_names is not None else [".git"]
+        self.lock = threading.Lock()
+        self.roots: dict[str, DirectoryIndex] = {}
+        # Watched directory -> index it belongs to
+        self.directories: dict[str, DirectoryIndex] = {}
+        self.poller = PollingWatcher(self._on_change, poll_interval)
+        self.inotify = None
+        if mode in ("auto", "inotify"):
+            libc = InotifyWatcher.load_libc()
+            if libc is not None:
+                try:
+                    self.inotify = InotifyWatcher(self._on_change, self._on_overflow, libc)
+                except OSError as e:
+                    logging.warning("inotify is not available, model folders will be polled: {}".format(e))
+            elif mode == "inotify":
+                logging.warning("inotify is not available on this system, model folders will be polled.")
+        self.inotify_full = False
+
+    def _watch(self, index: DirectoryIndex, directories: list[str]):
+        for directory in directories:
+            with self.lock:
+                self.directories[directory] = index
+            if self.inotify is not None and self.inotify.watch(directory):
+                continue
+            if self.inotify is not None and not self.inotify_full:
+                self.inotify_full = True
+                logging.warning("Can't watch {} with inotify (raise fs.inotify.max_user_watches), polling the rest of the model folders.".format(directory))
+            self.poller.watch(directory)
+
+    def _unwatch(self, directories: list[str]):
+        for directory in directories:
+            with self.lock:
+                self.directories.pop(directory, None)
+            if self.inotify is not None:
+                self.inotify.unwatch(directory)
+            self.poller.unwatch(directory)
+
+    def _on_change(self, directory: str):
+        with self.lock:
+            index = self.directories.get(directory)
+        if index is None:
+            return
+        added, removed = index.update(directory)
+        self._unwatch(removed)
+        self._watch(index, added)
+
+    def _on_overflow(self):
+        logging.warning("Too many changes in the model folders at once, indexing them again.")
+        with self.lock:
+            indexes = list(self.roots.values())
+        for index in indexes:
+            self._rescan(index)
+
+    def _rescan(self, index: DirectoryIndex):
+        with self.lock:
+            old = [d for d, i in self.directories.items() if i is index]
+        self._unwatch(old)
+        self._watch(index, index.scan())
+
+    def get_index(self, root: str) -> DirectoryIndex:
+        with self.lock:
+            index = self.roots.get(root)
+            if index is None:
+                index = DirectoryIndex(root, self.excluded_dir_names)
+                self.roots[root] = index
+                new = True
+            else:
+                new = False
+        if new or (root not in self.directories and os.path.isdir(root)):
+            # Roots that don't exist can't be watched, they are checked again on every lookup until they do
+            self._rescan(index)
+        return index
+
+    def list_files(self, roots: list[str]) -> tuple[list[str], dict[str, int]]:
+        """All files below roots and the versions of their indexes."""
+        files = set()
+        versions = {}
+        for root in roots:
+            root_files, versions[root] = self.get_index(root).get_files()
+            files.update(root_files)
+        return list(files), versions
+
+    def versions(self, roots: list[str]) -> dict[str, int]:
+        return {root: self.get_index(root).version for root in roots}
+
+    def contains(self, root: str, relative_path: str) -> bool:
+        return self.get_index(root).contains(relative_path)